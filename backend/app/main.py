@@ -1,8 +1,10 @@
+import asyncio
+import os
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from app.routers import chat, recipes, nutrition
+from app.routers import chat, recipes, nutrition, admin
 
 
 @asynccontextmanager
@@ -11,24 +13,60 @@ async def lifespan(app: FastAPI):
     print("Starting AI Recipe Assistant (LangChain + RAG)...")
     print("=" * 50)
     
-    print("\n[1/3] Loading vector database...")
+    print("\n[1/4] Loading vector database...")
     from app.services.vector_store import vector_store
-    recipe_count = vector_store.collection.count()
+    recipe_count = vector_store.count()
     print(f"      Loaded {recipe_count} recipes to vector store")
+    missing_fields = vector_store.missing_filter_fields()
+    if missing_fields:
+        # 旧版本建立的索引缺少预过滤字段，带条件的检索会全部落空，先增量同步一次
+        print(f"      Vector index is missing filter fields ({', '.join(missing_fields[:3])}...), resyncing")
+        from app.services.catalog import iter_recipe_records
+        from app.services.recipe_matcher import recipe_service
+        report = await asyncio.to_thread(
+            vector_store.sync_recipes, iter_recipe_records(recipe_service.data_path)
+        )
+        print(f"      Resynced {report['added'] + report['updated']} recipes")
     
-    print("\n[2/3] Initializing LangChain NLP service...")
+    print("\n[2/4] Initializing LangChain NLP service...")
     from app.services.langchain_nlp import langchain_nlp_service
-    print("      LangChain NLP service ready")
+    from app.services.nlp_service import nlp_service
+    await nlp_service.start()
+    from app.services.intent_parser import intent_parser
+    print(f"      LangChain NLP service ready (shared HTTP client started, "
+          f"{len(intent_parser.parser.automaton)} intent patterns)")
     
-    print("\n[3/3] Initializing conversation manager...")
+    print("\n[3/4] Initializing conversation manager...")
     from app.services.enhanced_conversation import enhanced_conversation_manager
     print("      Conversation manager ready")
     
+    print("\n[4/4] Pre-encoding recipe responses...")
+    from app.routers.recipes import warm_response_cache
+    print(f"      Cached {warm_response_cache()} responses")
+    
+    watcher = None
+    watch_interval = float(os.getenv("CATALOG_WATCH_INTERVAL", "0"))
+    if watch_interval > 0:
+        from app.services.catalog import CatalogWatcher
+        from app.services.recipe_matcher import recipe_service
+        watcher = CatalogWatcher(recipe_service, watch_interval)
+        watcher.start()
+        print(f"\n      Watching recipe catalog every {watch_interval}s")
+    
     print("\n" + "=" * 50)
     print("All services initialized successfully!")
     print("=" * 50)
     
     yield
+    
+    if watcher:
+        await watcher.stop()
+    
+    from app.services.search_executor import search_executor
+    await asyncio.to_thread(search_executor.shutdown)
+    await nlp_service.close()
+    from app.services.intent_cache import intent_cache
+    intent_cache.close()
     print("\nService shutdown")
 
 
@@ -45,11 +83,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Total-Count"],
 )
 
 app.include_router(chat.router, prefix="/api/chat", tags=["对话"])
 app.include_router(recipes.router, prefix="/api/recipes", tags=["菜谱"])
 app.include_router(nutrition.router, prefix="/api/nutrition", tags=["营养"])
+app.include_router(admin.router, prefix="/api/admin", tags=["管理"])
 
 
 @app.get("/")
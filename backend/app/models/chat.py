@@ -31,6 +31,14 @@ class ChatResponse(BaseModel):
     nutrition_info: Optional[dict] = None
 
 
+class SemanticBatchSearchRequest(BaseModel):
+    queries: List[str]
+    top_k: int = 5
+    restrictions: Optional[List[str]] = None
+    category: Optional[str] = None
+    max_calories: Optional[float] = None
+
+
 class ConversationContext(BaseModel):
     conversation_id: str
     messages: List[ChatMessage]
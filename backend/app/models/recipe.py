@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 from enum import Enum
 
@@ -39,4 +39,25 @@ class RecipeListItem(BaseModel):
     difficulty: str
     time: str
     tags: List[str]
-    match_score: Optional[float] = None
\ No newline at end of file
+    match_score: Optional[float] = None
+
+
+class IngredientQuery(BaseModel):
+    ingredients: List[str]
+    restrictions: List[str] = []
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[IngredientQuery]
+    top_k: int = 5
+
+
+class NutritionRange(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+class NutritionQuery(BaseModel):
+    ranges: Dict[str, NutritionRange] = {}
+    diet_type: Optional[str] = None
+    limit: int = Field(50, ge=1, le=500)
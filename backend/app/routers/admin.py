@@ -0,0 +1,60 @@
+import hmac
+import os
+import time
+from fastapi import APIRouter, HTTPException, Header
+from typing import Optional
+from app.services.recipe_matcher import recipe_service
+
+router = APIRouter()
+
+
+def _check_admin_token(token: Optional[str]):
+    """校验请求头 X-Admin-Token；未设置 ADMIN_TOKEN 环境变量时管理接口一律拒绝"""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="管理接口未启用，请设置 ADMIN_TOKEN")
+    if not token or not hmac.compare_digest(token, expected):
+        raise HTTPException(status_code=403, detail="无权限")
+
+
+@router.post("/reload")
+async def reload_catalog(
+    force: bool = False,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    热加载菜谱目录
+    """
+    _check_admin_token(x_admin_token)
+    
+    previous_version = recipe_service.version
+    start = time.perf_counter()
+    try:
+        reloaded = await recipe_service.reload(force=force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"菜谱目录加载失败: {e}")
+    
+    return {
+        "reloaded": reloaded,
+        "previous_version": previous_version,
+        "version": recipe_service.version,
+        "recipe_count": len(recipe_service.recipes),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+
+
+@router.get("/stats")
+async def get_stats(x_admin_token: Optional[str] = Header(None)):
+    """
+    运行时缓存与检索线程池统计
+    """
+    _check_admin_token(x_admin_token)
+    
+    from app.services.embedding_service import embedding_service
+    from app.services.intent_cache import intent_cache
+    from app.services.search_executor import search_executor
+    return {
+        "embedding_cache": embedding_service.query_cache.stats(),
+        "intent_cache": intent_cache.stats(),
+        "vector_search": search_executor.stats()
+    }
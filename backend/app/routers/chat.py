@@ -1,6 +1,8 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Optional
-from app.models.chat import ChatRequest, ChatResponse, ChatMessage
+import json
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
+from app.models.chat import ChatRequest, ChatResponse, ChatMessage, SemanticBatchSearchRequest
 from app.services.langchain_nlp import langchain_nlp_service
 from app.services.recipe_matcher import recipe_service
 from app.services.enhanced_conversation import enhanced_conversation_manager
@@ -8,152 +10,177 @@ from app.services.vector_store import vector_store
 
 router = APIRouter()
 
+# 批量搜索单次请求的查询数上限
+MAX_BATCH_QUERIES = 1000
 
-@router.post("/message", response_model=ChatResponse)
-async def chat_message(request: ChatRequest):
+
+async def _prepare_turn(message: str, conversation_id: Optional[str]) -> Dict[str, Any]:
     """
-    处理用户对话消息 - LangChain + RAG 版本
+    一轮对话中生成回复之前的部分：解析意图、记录用户消息、检索菜谱、查询营养信息
     """
-    try:
-        # 获取或创建对话ID
-        conversation_id = request.conversation_id
-        if not conversation_id:
-            conversation_id = enhanced_conversation_manager.create_conversation()
-        
-        # 获取对话上下文和 Memory
-        context = enhanced_conversation_manager.get_recent_context(conversation_id)
-        user_context = enhanced_conversation_manager.get_user_context_for_prompt(conversation_id)
-        
-        # 使用 LangChain 解析用户意图
-        parsed_intent = await langchain_nlp_service.parse_user_intent(request.message)
-        
-        # 提取信息
-        ingredients = parsed_intent.get("ingredients", [])
-        restrictions = parsed_intent.get("restrictions", [])
-        target_dish = parsed_intent.get("target_dish")
-        intent = parsed_intent.get("intent", "other")
-        
-        print(f"Intent: {intent}, Ingredients: {ingredients}, Restrictions: {restrictions}")
-        
-        # 更新对话上下文
-        enhanced_conversation_manager.add_message(
-            conversation_id=conversation_id,
-            role="user",
-            content=request.message,
-            ingredients=ingredients,
-            restrictions=restrictions
-        )
-        
-        # 根据意图处理
-        suggested_recipes = []
-        nutrition_info = None
-        
-        if intent == "recommend_by_ingredients":
-            # 使用 RAG 向量搜索 + 传统匹配
-            if ingredients:
-                # 方法1: RAG 语义搜索
-                rag_results = await langchain_nlp_service.search_recipes_with_rag(
-                    query=request.message,
-                    ingredients=ingredients,
-                    restrictions=restrictions,
-                    top_k=5
-                )
-                
-                # 转换为前端需要的格式
-                suggested_recipes = [
-                    {
+    # 获取或创建对话ID
+    if not conversation_id:
+        conversation_id = enhanced_conversation_manager.create_conversation()
+    
+    # 获取对话上下文和 Memory
+    context = enhanced_conversation_manager.get_recent_context(conversation_id)
+    user_context = enhanced_conversation_manager.get_user_context_for_prompt(conversation_id)
+    
+    # 使用 LangChain 解析用户意图
+    parsed_intent = await langchain_nlp_service.parse_user_intent(message)
+    
+    # 提取信息
+    ingredients = parsed_intent.get("ingredients", [])
+    restrictions = parsed_intent.get("restrictions", [])
+    target_dish = parsed_intent.get("target_dish")
+    intent = parsed_intent.get("intent", "other")
+    
+    print(f"Intent: {intent}, Ingredients: {ingredients}, Restrictions: {restrictions}")
+    
+    # 更新对话上下文
+    enhanced_conversation_manager.add_message(
+        conversation_id=conversation_id,
+        role="user",
+        content=message,
+        ingredients=ingredients,
+        restrictions=restrictions
+    )
+    
+    # 根据意图处理
+    suggested_recipes = []
+    nutrition_info = None
+    
+    if intent == "recommend_by_ingredients":
+        # 使用 RAG 向量搜索 + 传统匹配
+        if ingredients:
+            # 方法1: RAG 语义搜索
+            rag_results = await langchain_nlp_service.search_recipes_with_rag(
+                query=message,
+                ingredients=ingredients,
+                restrictions=restrictions,
+                top_k=5
+            )
+            
+            # 转换为前端需要的格式
+            suggested_recipes = [
+                {
+                    "recipe": {
+                        "id": r["recipe"].id,
+                        "name": r["recipe"].name,
+                        "name_en": r["recipe"].name_en,
+                        "category": r["recipe"].category,
+                        "difficulty": r["recipe"].difficulty,
+                        "time": r["recipe"].time,
+                        "servings": r["recipe"].servings,
+                        "nutrition": {
+                            "calories": r["recipe"].nutrition.calories,
+                            "protein": r["recipe"].nutrition.protein,
+                            "fat": r["recipe"].nutrition.fat,
+                            "carbs": r["recipe"].nutrition.carbs,
+                            "fiber": r["recipe"].nutrition.fiber
+                        },
+                        "tags": r["recipe"].tags,
+                        "steps": r["recipe"].steps,
+                        "tips": r["recipe"].tips
+                    },
+                    "match_score": r["match_score"],
+                    "matched_ingredients": r["matched_ingredients"],
+                    "missing_ingredients": r["missing_ingredients"]
+                }
+                for r in rag_results
+            ]
+        else:
+            # 如果没有提取到食材，使用向量搜索
+            vector_results = await vector_store.asearch(
+                message,
+                n_results=3,
+                filters=recipe_service.vector_filters(restrictions)
+            )
+            recipes_by_id = {
+                r.id: r for r in recipe_service.get_recipes_by_ids(vr['id'] for vr in vector_results)
+            }
+            for vr in vector_results:
+                full_recipe = recipes_by_id.get(vr['id'])
+                if full_recipe:
+                    suggested_recipes.append({
                         "recipe": {
-                            "id": r["recipe"].id,
-                            "name": r["recipe"].name,
-                            "name_en": r["recipe"].name_en,
-                            "category": r["recipe"].category,
-                            "difficulty": r["recipe"].difficulty,
-                            "time": r["recipe"].time,
-                            "servings": r["recipe"].servings,
+                            "id": full_recipe.id,
+                            "name": full_recipe.name,
+                            "name_en": full_recipe.name_en,
+                            "category": full_recipe.category,
+                            "difficulty": full_recipe.difficulty,
+                            "time": full_recipe.time,
+                            "servings": full_recipe.servings,
                             "nutrition": {
-                                "calories": r["recipe"].nutrition.calories,
-                                "protein": r["recipe"].nutrition.protein,
-                                "fat": r["recipe"].nutrition.fat,
-                                "carbs": r["recipe"].nutrition.carbs,
-                                "fiber": r["recipe"].nutrition.fiber
+                                "calories": full_recipe.nutrition.calories,
+                                "protein": full_recipe.nutrition.protein,
+                                "fat": full_recipe.nutrition.fat,
+                                "carbs": full_recipe.nutrition.carbs,
+                                "fiber": full_recipe.nutrition.fiber
                             },
-                            "tags": r["recipe"].tags,
-                            "steps": r["recipe"].steps,
-                            "tips": r["recipe"].tips
+                            "tags": full_recipe.tags,
+                            "steps": full_recipe.steps,
+                            "tips": full_recipe.tips
                         },
-                        "match_score": r["match_score"],
-                        "matched_ingredients": r["matched_ingredients"],
-                        "missing_ingredients": r["missing_ingredients"]
-                    }
-                    for r in rag_results
-                ]
-            else:
-                # 如果没有提取到食材，使用向量搜索
-                vector_results = vector_store.search(request.message, n_results=3)
-                for vr in vector_results:
-                    full_recipe = recipe_service.get_recipe_by_id(vr['id'])
-                    if full_recipe:
-                        suggested_recipes.append({
-                            "recipe": {
-                                "id": full_recipe.id,
-                                "name": full_recipe.name,
-                                "name_en": full_recipe.name_en,
-                                "category": full_recipe.category,
-                                "difficulty": full_recipe.difficulty,
-                                "time": full_recipe.time,
-                                "servings": full_recipe.servings,
-                                "nutrition": {
-                                    "calories": full_recipe.nutrition.calories,
-                                    "protein": full_recipe.nutrition.protein,
-                                    "fat": full_recipe.nutrition.fat,
-                                    "carbs": full_recipe.nutrition.carbs,
-                                    "fiber": full_recipe.nutrition.fiber
-                                },
-                                "tags": full_recipe.tags,
-                                "steps": full_recipe.steps,
-                                "tips": full_recipe.tips
-                            },
-                            "match_score": vr['similarity'],
-                            "matched_ingredients": [],
-                            "missing_ingredients": []
-                        })
+                        "match_score": vr['similarity'],
+                        "matched_ingredients": [],
+                        "missing_ingredients": []
+                    })
+    
+    elif intent == "nutrition_query" and target_dish:
+        # 查询营养信息
+        recipe = None
+        for r in recipe_service.summaries:
+            if target_dish in r.name or r.name in target_dish:
+                recipe = recipe_service.get_recipe_by_id(r.id)
+                break
         
-        elif intent == "nutrition_query" and target_dish:
-            # 查询营养信息
-            recipe = None
-            for r in recipe_service.recipes:
-                if target_dish in r.name or r.name in target_dish:
-                    recipe = r
-                    break
-            
-            if recipe:
-                from app.services.nutrition_calc import nutrition_calculator
-                nutrition_info = nutrition_calculator.analyze_meal_nutrition(
-                    recipe.nutrition, 
-                    recipe.servings
-                )
+        if recipe:
+            from app.services.nutrition_calc import nutrition_calculator
+            nutrition_info = nutrition_calculator.analyze_meal_nutrition(
+                recipe.nutrition, 
+                recipe.servings
+            )
+    
+    return {
+        "conversation_id": conversation_id,
+        "context": context,
+        "ingredients": ingredients,
+        "restrictions": restrictions,
+        "suggested_recipes": suggested_recipes,
+        "nutrition_info": nutrition_info
+    }
+
+
+@router.post("/message", response_model=ChatResponse)
+async def chat_message(request: ChatRequest):
+    """
+    处理用户对话消息 - LangChain + RAG 版本
+    """
+    try:
+        turn = await _prepare_turn(request.message, request.conversation_id)
         
         # 使用 LangChain 生成 AI 回复
         ai_response = await langchain_nlp_service.generate_response(
             user_message=request.message,
-            history=context,
-            recipes=suggested_recipes
+            history=turn["context"],
+            recipes=turn["suggested_recipes"]
         )
         
         # 记录助手回复到 Memory
         enhanced_conversation_manager.add_message(
-            conversation_id=conversation_id,
+            conversation_id=turn["conversation_id"],
             role="assistant",
             content=ai_response
         )
         
         return ChatResponse(
             message=ai_response,
-            conversation_id=conversation_id,
-            suggested_recipes=suggested_recipes,
-            detected_ingredients=ingredients,
-            detected_restrictions=restrictions,
-            nutrition_info=nutrition_info
+            conversation_id=turn["conversation_id"],
+            suggested_recipes=turn["suggested_recipes"],
+            detected_ingredients=turn["ingredients"],
+            detected_restrictions=turn["restrictions"],
+            nutrition_info=turn["nutrition_info"]
         )
         
     except Exception as e:
@@ -163,6 +190,59 @@ async def chat_message(request: ChatRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    流式对话（Server-Sent Events）
+    检索完成后立即发送 context 事件（识别出的食材、饮食限制与推荐菜谱），
+    之后逐段发送 token 事件，最后发送 done 事件；回复结束后写入对话 Memory
+    """
+    try:
+        turn = await _prepare_turn(request.message, request.conversation_id)
+    except Exception as e:
+        print(f"Error in chat stream: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def events():
+        yield _sse("context", {
+            "conversation_id": turn["conversation_id"],
+            "detected_ingredients": turn["ingredients"],
+            "detected_restrictions": turn["restrictions"],
+            "suggested_recipes": turn["suggested_recipes"],
+            "nutrition_info": turn["nutrition_info"]
+        })
+        
+        parts = []
+        try:
+            async for chunk in langchain_nlp_service.stream_response(
+                user_message=request.message,
+                history=turn["context"],
+                recipes=turn["suggested_recipes"]
+            ):
+                parts.append(chunk)
+                yield _sse("token", {"text": chunk})
+            
+            yield _sse("done", {"conversation_id": turn["conversation_id"], "message": "".join(parts)})
+        finally:
+            # 客户端中途断开时也记录已生成的部分，保证用户消息后有对应的助手回复
+            if parts:
+                enhanced_conversation_manager.add_message(
+                    conversation_id=turn["conversation_id"],
+                    role="assistant",
+                    content="".join(parts)
+                )
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/new")
 async def new_conversation():
     """
@@ -201,15 +281,48 @@ async def get_conversation_history(conversation_id: str):
 
 
 @router.post("/search")
-async def semantic_search(query: str, top_k: int = 5):
+async def semantic_search(
+    query: str,
+    top_k: int = 5,
+    restrictions: Optional[List[str]] = Query(None),
+    category: Optional[str] = None,
+    max_calories: Optional[float] = None
+):
     """
     语义搜索菜谱（RAG 演示）
+    饮食限制、分类、每份热量上限在向量库内预过滤
     """
     try:
-        results = vector_store.search(query, n_results=top_k)
+        filters = recipe_service.vector_filters(restrictions, category, max_calories)
+        results = await vector_store.asearch(query, n_results=top_k, filters=filters, include_metadata=True)
         return {
             "query": query,
             "results": results
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/search/batch")
+async def semantic_search_batch(request: SemanticBatchSearchRequest):
+    """
+    批量语义搜索：全部查询一次向量化、一次检索，条件对所有查询生效
+    """
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"单次最多 {MAX_BATCH_QUERIES} 个查询")
+    
+    try:
+        filters = recipe_service.vector_filters(
+            request.restrictions, request.category, request.max_calories
+        )
+        batch = await vector_store.asearch_many(
+            request.queries, n_results=request.top_k, filters=filters, include_metadata=True
+        )
+        return {
+            "results": [
+                {"query": query, "results": results}
+                for query, results in zip(request.queries, batch)
+            ]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
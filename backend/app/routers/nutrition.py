@@ -1,4 +1,6 @@
 from fastapi import APIRouter, HTTPException
+import numpy as np
+from app.models.recipe import NutritionQuery
 from app.services.nutrition_calc import nutrition_calculator
 from app.services.recipe_matcher import recipe_service
 
@@ -52,6 +54,45 @@ async def check_diet_suitability(recipe_id: int, diet_type: str):
     }
 
 
+@router.post("/query")
+async def query_nutrition(query: NutritionQuery):
+    """
+    按营养范围筛选菜谱，如 {"ranges": {"calories_per_serving": {"max": 300}, "protein": {"min": 20}}}
+    """
+    snapshot = recipe_service.snapshot
+    table = snapshot.nutrition_table
+    ranges = {
+        column: (bounds.min, bounds.max)
+        for column, bounds in query.ranges.items()
+    }
+    
+    try:
+        mask = table.query(ranges)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"不支持的营养字段: {e.args[0]}")
+    
+    if query.diet_type:
+        if query.diet_type not in nutrition_calculator.DIET_CRITERIA:
+            raise HTTPException(status_code=400, detail=f"不支持的饮食类型: {query.diet_type}")
+        mask &= table.diet_mask(query.diet_type)
+    
+    positions = np.flatnonzero(mask)
+    
+    results = []
+    for pos in positions[:query.limit].tolist():
+        summary = snapshot.summaries[pos]
+        results.append({
+            "recipe_id": summary.id,
+            "recipe_name": summary.name,
+            "nutrition_per_serving": table.per_serving(pos)
+        })
+    
+    return {
+        "total": len(positions),
+        "results": results
+    }
+
+
 @router.get("/daily-needs")
 async def get_daily_nutrition_needs(
     weight: float = 60,
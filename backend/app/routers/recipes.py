@@ -1,40 +1,50 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import List, Optional
-from app.models.recipe import Recipe, RecipeListItem
+from app.models.recipe import Recipe, RecipeListItem, BatchSearchRequest
 from app.services.recipe_matcher import recipe_service
 from app.services.nlp_service import nlp_service
+from app.services.response_cache import CachedResponse, response_cache, cached_response, encode_json
 
 router = APIRouter()
 
+# 列表接口分页大小
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 
 @router.get("/list", response_model=List[RecipeListItem])
 async def get_recipes(
+    request: Request,
     tag: Optional[str] = None,
-    difficulty: Optional[str] = None
+    difficulty: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
 ):
     """
-    获取菜谱列表
+    获取菜谱列表（分页）
+    下一页游标在响应头 X-Next-Cursor 中，没有下一页时不返回；满足条件的总数在 X-Total-Count 中
     """
-    recipes = recipe_service.get_all_recipes()
-    
-    if tag:
-        recipes = [r for r in recipes if tag in r.tags]
-    
-    if difficulty:
-        recipes = [r for r in recipes if r.difficulty == difficulty]
-    
-    return recipes
+    entry = response_cache.get(
+        recipe_service.version,
+        ("list", tag, difficulty, cursor, limit),
+        lambda: _build_recipe_page(tag, difficulty, cursor, limit)
+    )
+    return cached_response(request, entry)
 
 
 @router.get("/{recipe_id}", response_model=Recipe)
-async def get_recipe(recipe_id: int):
+async def get_recipe(recipe_id: int, request: Request):
     """
     获取菜谱详情
     """
+    # 先读取版本再取数据，热加载期间不会把旧数据缓存到新版本下
+    version = recipe_service.version
     recipe = recipe_service.get_recipe_by_id(recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="菜谱不存在")
-    return recipe
+    
+    entry = response_cache.get(version, ("recipe", recipe_id), lambda: recipe)
+    return cached_response(request, entry)
 
 
 @router.post("/search")
@@ -52,31 +62,52 @@ async def search_recipes(
         top_k=top_k
     )
     
+    return {
+        "results": [_format_match(m) for m in matches]
+    }
+
+
+@router.post("/search/batch")
+async def search_recipes_batch(request: BatchSearchRequest):
+    """
+    批量基于食材搜索菜谱，每个查询的结果与 /search 相同
+    """
+    batch = recipe_service.search_by_ingredients_batch(
+        ingredient_lists=[q.ingredients for q in request.queries],
+        restrictions=[q.restrictions for q in request.queries],
+        top_k=request.top_k
+    )
+    
     return {
         "results": [
-            {
-                "recipe": {
-                    "id": m["recipe"].id,
-                    "name": m["recipe"].name,
-                    "name_en": m["recipe"].name_en,
-                    "category": m["recipe"].category,
-                    "difficulty": m["recipe"].difficulty,
-                    "time": m["recipe"].time,
-                    "servings": m["recipe"].servings,
-                    "nutrition": m["recipe"].nutrition.dict(),
-                    "tags": m["recipe"].tags,
-                    "steps": m["recipe"].steps,
-                    "tips": m["recipe"].tips
-                },
-                "match_score": m["match_score"],
-                "matched_ingredients": m["matched_ingredients"],
-                "missing_ingredients": m["missing_ingredients"]
-            }
-            for m in matches
+            [_format_match(m) for m in matches]
+            for matches in batch
         ]
     }
 
 
+def _format_match(m: dict) -> dict:
+    """把匹配结果转换为接口返回格式"""
+    return {
+        "recipe": {
+            "id": m["recipe"].id,
+            "name": m["recipe"].name,
+            "name_en": m["recipe"].name_en,
+            "category": m["recipe"].category,
+            "difficulty": m["recipe"].difficulty,
+            "time": m["recipe"].time,
+            "servings": m["recipe"].servings,
+            "nutrition": m["recipe"].nutrition.dict(),
+            "tags": m["recipe"].tags,
+            "steps": m["recipe"].steps,
+            "tips": m["recipe"].tips
+        },
+        "match_score": m["match_score"],
+        "matched_ingredients": m["matched_ingredients"],
+        "missing_ingredients": m["missing_ingredients"]
+    }
+
+
 @router.get("/{recipe_id}/substitutions/{ingredient_name}")
 async def get_ingredient_substitutions(recipe_id: int, ingredient_name: str):
     """
@@ -106,10 +137,53 @@ async def get_ingredient_substitutions(recipe_id: int, ingredient_name: str):
     }
 
 
-@router.get("/tags/{tag}")
-async def get_recipes_by_tag(tag: str):
+@router.get("/tags/{tag}", response_model=List[RecipeListItem])
+async def get_recipes_by_tag(
+    tag: str,
+    request: Request,
+    cursor: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    根据标签获取菜谱（分页，游标规则同 /list）
+    """
+    entry = response_cache.get(
+        recipe_service.version,
+        ("list", tag, None, cursor, limit),
+        lambda: _build_recipe_page(tag, None, cursor, limit)
+    )
+    return cached_response(request, entry)
+
+
+def _build_recipe_page(
+    tag: Optional[str],
+    difficulty: Optional[str],
+    cursor: Optional[int],
+    limit: int
+) -> CachedResponse:
+    """生成一页菜谱列表，分页信息放在响应头中"""
+    try:
+        page = recipe_service.list_recipes(tag, difficulty, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    headers = {"X-Total-Count": str(page["total"])}
+    if page["next_cursor"] is not None:
+        headers["X-Next-Cursor"] = str(page["next_cursor"])
+    return CachedResponse(encode_json(page["items"]), headers)
+
+
+def warm_response_cache() -> int:
     """
-    根据标签获取菜谱
+    目录加载后预先编码列表和各标签的第一页响应，返回缓存条目数
+    菜谱详情在首次请求时才构建完整模型，随后进入缓存
     """
-    recipes = recipe_service.get_recipes_by_tag(tag)
-    return recipes
\ No newline at end of file
+    snapshot = recipe_service.snapshot
+    version = snapshot.version
+    for tag in [None] + snapshot.summaries.tags.values:
+        response_cache.get(
+            version,
+            ("list", tag, None, None, DEFAULT_PAGE_SIZE),
+            lambda: _build_recipe_page(tag, None, None, DEFAULT_PAGE_SIZE)
+        )
+    return len(response_cache)
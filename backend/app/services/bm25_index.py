@@ -0,0 +1,166 @@
+"""
+BM25 词法索引 - 菜名、食材、标签上的内存 BM25 检索
+中文按字的一元、二元组切分，英文和数字按单词切分；
+词项权重在建索引时预先计算为 词项 x 菜谱 的稀疏矩阵，查询是一次稀疏向量乘积
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.services.recipe_records import RecipeColumns
+
+
+# BM25 参数
+K1 = 1.5
+B = 0.75
+
+_TOKEN = re.compile(r"[㐀-䶿一-鿿豈-﫿]+|[a-z0-9]+")
+_CJK = re.compile(r"[㐀-䶿一-鿿豈-﫿]")
+
+
+def tokenize(text: str) -> List[str]:
+    """CJK 连续片段切为单字和相邻二字，其余按字母数字单词切分"""
+    tokens = []
+    for run in _TOKEN.findall(text.lower()):
+        if _CJK.match(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class _Vocabulary:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+
+    def encode(self, tokens: Iterable[str]) -> List[int]:
+        return [self.ids.setdefault(token, len(self.ids)) for token in tokens]
+
+
+def _tokenize_table(values: List[str], vocabulary: _Vocabulary) -> Tuple[np.ndarray, np.ndarray]:
+    """把驻留表中的每个字符串切词，返回 CSR 形式的 (offsets, 词项ID)"""
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    term_ids: List[int] = []
+    for i, value in enumerate(values):
+        term_ids.extend(vocabulary.encode(tokenize(value)))
+        offsets[i + 1] = len(term_ids)
+    return offsets, np.asarray(term_ids, dtype=np.int64)
+
+
+def _expand(
+    offsets: np.ndarray,
+    term_ids: np.ndarray,
+    item_ids: np.ndarray,
+    item_positions: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """把 (条目ID, 菜谱位置) 展开为 (菜谱位置, 词项ID)，条目的词项来自 _tokenize_table"""
+    lengths = (offsets[1:] - offsets[:-1])[item_ids]
+    total = int(lengths.sum())
+    starts = np.repeat(offsets[item_ids] - (np.cumsum(lengths) - lengths), lengths)
+    return np.repeat(item_positions, lengths), term_ids[starts + np.arange(total)]
+
+
+class BM25Index:
+    """菜谱 BM25 索引
+
+    菜谱以其在目录中的位置编号，与其他目录索引一致。
+    """
+
+    def __init__(self, columns: RecipeColumns):
+        n = len(columns)
+        vocabulary = _Vocabulary()
+
+        # 菜名逐条切词；食材、标签是驻留字符串，每个只切一次再按出现位置展开
+        name_offsets, name_terms = _tokenize_table(columns.names, vocabulary)
+        ingredient_offsets, ingredient_terms = _tokenize_table(
+            columns.ingredient_names.values, vocabulary
+        )
+        tag_offsets, tag_terms = _tokenize_table(columns.tags.values, vocabulary)
+
+        positions = np.arange(n, dtype=np.int64)
+        parts = [
+            _expand(name_offsets, name_terms, positions, positions),
+            _expand(
+                ingredient_offsets, ingredient_terms,
+                columns.column("ingredient_ids").astype(np.int64),
+                columns.ingredient_positions().astype(np.int64)
+            ),
+            _expand(
+                tag_offsets, tag_terms,
+                columns.column("tag_ids").astype(np.int64),
+                columns.tag_positions().astype(np.int64)
+            ),
+        ]
+        docs = np.concatenate([p[0] for p in parts])
+        terms = np.concatenate([p[1] for p in parts])
+
+        self.vocabulary = vocabulary.ids
+        self.size = n
+        self.matrix = self._build_matrix(docs, terms, len(self.vocabulary), n)
+
+    @staticmethod
+    def _build_matrix(docs: np.ndarray, terms: np.ndarray, vocab_size: int, n: int) -> sparse.csr_matrix:
+        """构建 词项 x 菜谱 的 BM25 权重矩阵"""
+        stride = max(n, 1)
+        keys, tf = np.unique(terms * stride + docs, return_counts=True)
+        rows = keys // stride
+        cols = keys % stride
+
+        doc_len = np.bincount(docs, minlength=n).astype(np.float32)
+        avg_len = float(doc_len.mean()) if n else 0.0
+        df = np.bincount(rows, minlength=vocab_size).astype(np.float32)
+        idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+
+        tf = tf.astype(np.float32)
+        norm = K1 * (1 - B + B * doc_len[cols] / max(avg_len, 1e-9))
+        weights = idf[rows] * tf * (K1 + 1) / (tf + norm)
+
+        return sparse.csr_matrix(
+            (weights.astype(np.float32), (rows, cols)),
+            shape=(vocab_size, n)
+        )
+
+    def scores(self, query: str) -> np.ndarray:
+        """每个菜谱的 BM25 分数，查询中重复的词项按次数累加"""
+        term_ids = [self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary]
+        if not term_ids:
+            return np.zeros(self.size, dtype=np.float32)
+        # 只取查询词项对应的行，按出现次数加权求和
+        terms, counts = np.unique(term_ids, return_counts=True)
+        return np.asarray(counts.astype(np.float32) @ self.matrix[terms]).ravel()
+
+    def top_k(
+        self,
+        query: str,
+        top_k: int = 10,
+        allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        返回 BM25 分数最高的 top_k 个菜谱
+
+        Args:
+            query: 查询文本
+            top_k: 返回数量
+            allowed: 可选的布尔数组，只在为 True 的菜谱中检索
+
+        Returns:
+            [(菜谱位置, 分数)]，分数降序；只包含分数大于 0 的菜谱，同分按目录顺序
+        """
+        scores = self.scores(query)
+        candidates = np.flatnonzero(scores > 0)
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+
+        k = min(top_k, len(candidates))
+        if k <= 0:
+            return []
+        candidate_scores = scores[candidates]
+        if k < len(candidates):
+            top = np.argpartition(-candidate_scores, k - 1)[:k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.lexsort((top, -candidate_scores[top]))]
+        return list(zip(candidates[top].tolist(), candidate_scores[top].tolist()))
@@ -0,0 +1,312 @@
+"""
+菜谱目录快照 - 菜谱数据与全部索引打包为一个不可变快照
+热加载时在后台构建新快照，再整体替换引用；进行中的请求继续使用旧快照
+
+菜谱文件按记录流式读取，只保留摘要和每条记录的位置；读取的同时把原文复制到快照私有的临时文件，
+完整的 Recipe 模型（步骤、技巧、替代方案）在首次访问某个菜谱时从该副本构建，
+原文件之后被改写不影响已加载的快照。快照及其菜谱序列都不再被引用时自动关闭副本。
+支持两种格式：
+- JSON Lines (.jsonl / .ndjson)：每行一个菜谱
+- JSON：{"recipes": [...]}，增量解析数组元素
+"""
+import asyncio
+import codecs
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import weakref
+from array import array
+from collections.abc import Sequence as SequenceABC
+from functools import lru_cache
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
+
+from app.models.recipe import Recipe
+from app.services.recipe_records import IdIndex, RecipeColumns
+from app.services.ingredient_index import IngredientIndex
+from app.services.dietary_index import RestrictionIndex
+from app.services.nutrition_table import NutritionTable
+from app.services.facet_index import FacetIndex
+from app.services.bm25_index import BM25Index
+from app.services.intent_parser import RuleIntentParser
+
+
+DEFAULT_DATA_PATH = os.getenv(
+    "RECIPE_DATA_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'recipes.json')
+)
+
+# 已构建的完整 Recipe 模型缓存条数
+RECIPE_CACHE_SIZE = int(os.getenv("RECIPE_CACHE_SIZE", "10000"))
+
+CHUNK_SIZE = 1 << 20
+
+_ARRAY_START = re.compile(r'"recipes"\s*:\s*\[')
+
+
+class LazyRecipeList(SequenceABC):
+    """按位置访问的只读菜谱序列，元素在首次访问时构建"""
+
+    def __init__(self, size: int, load: Callable[[int], Recipe]):
+        self._size = size
+        self._load = load
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self._load(i) for i in range(*pos.indices(self._size))]
+        if pos < 0:
+            pos += self._size
+        if not 0 <= pos < self._size:
+            raise IndexError("recipe position out of range")
+        return self._load(pos)
+
+
+class CatalogSnapshot:
+    """不可变的目录快照，构建完成后不再修改"""
+
+    def __init__(
+        self,
+        columns: RecipeColumns,
+        version: str,
+        load_recipe: Callable[[int], Recipe],
+        close: Optional[Callable[[], None]] = None
+    ):
+        self.summaries = columns
+        self.version = version
+        self.recipes = LazyRecipeList(
+            len(columns),
+            lru_cache(maxsize=RECIPE_CACHE_SIZE)(load_recipe)
+        )
+        self.id_to_position = IdIndex(columns.column("ids"))
+        self.ingredient_index = IngredientIndex(columns)
+        self.restriction_index = RestrictionIndex(columns)
+        self.nutrition_table = NutritionTable(columns)
+        self.facet_index = FacetIndex(columns)
+        self.bm25_index = BM25Index(columns)
+        self.intent_parser = RuleIntentParser(columns.ingredient_names.values, columns.names)
+        self._close = close
+
+    def close(self):
+        """立即释放快照持有的记录副本；已构建的菜谱缓存仍可使用，不调用时在快照不再被引用后自动释放"""
+        if self._close is not None:
+            self._close()
+
+
+class _HashingReader:
+    """读取文件的同时计算内容哈希并写入副本，保证版本号、解析内容与副本一致"""
+
+    def __init__(self, f: BinaryIO, copy: Optional[BinaryIO] = None):
+        self._f = f
+        self._copy = copy
+        self.hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self.hash.update(data)
+        if self._copy is not None:
+            self._copy.write(data)
+        return data
+
+    def __iter__(self) -> Iterator[bytes]:
+        for line in self._f:
+            self.hash.update(line)
+            if self._copy is not None:
+                self._copy.write(line)
+            yield line
+
+
+def _iter_jsonl(f) -> Iterator[Tuple[dict, int, int]]:
+    """逐行解析 JSON Lines，产出 (记录, 字节偏移, 字节长度)"""
+    offset = 0
+    for line in f:
+        if line.strip():
+            yield json.loads(line), offset, len(line)
+        offset += len(line)
+
+
+def _iter_json_array(f) -> Iterator[Tuple[dict, int, int]]:
+    """增量解析 {"recipes": [...]}，产出 (记录, 字节偏移, 字节长度)"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    eof = False
+
+    def read_more() -> str:
+        nonlocal eof
+        chunk = f.read(CHUNK_SIZE)
+        eof = not chunk
+        return utf8.decode(chunk, final=eof)
+
+    # 定位 recipes 数组起点
+    match = _ARRAY_START.search(buffer)
+    while match is None:
+        if eof:
+            raise ValueError('菜谱文件缺少 "recipes" 数组')
+        buffer += read_more()
+        match = _ARRAY_START.search(buffer)
+
+    pos = match.end()
+    byte_pos = len(buffer[:pos].encode('utf-8'))
+
+    while True:
+        # 跳过元素之间的空白和逗号（均为单字节字符）
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+            byte_pos += 1
+
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+
+        try:
+            if pos >= len(buffer):
+                raise json.JSONDecodeError("need more data", buffer, pos)
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # 记录被数据块截断，读入更多数据后重试
+            if eof:
+                raise
+            buffer = buffer[pos:] + read_more()
+            pos = 0
+            continue
+
+        length = len(buffer[pos:end].encode('utf-8'))
+        yield record, byte_pos, length
+        byte_pos += length
+        pos = end
+
+
+def _iter_records(f, data_path: str) -> Iterator[Tuple[dict, int, int]]:
+    """按扩展名选择解析方式"""
+    if data_path.endswith(('.jsonl', '.ndjson')):
+        return _iter_jsonl(f)
+    return _iter_json_array(f)
+
+
+def iter_recipe_records(data_path: str = DEFAULT_DATA_PATH) -> Iterator[dict]:
+    """流式读取菜谱文件中的原始记录"""
+    with open(data_path, 'rb') as f:
+        for record, _, _ in _iter_records(f, data_path):
+            yield record
+
+
+def file_version(data_path: str) -> str:
+    """以文件内容哈希作为目录版本"""
+    digest = hashlib.sha256()
+    with open(data_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class _RecordFile:
+    """快照私有的菜谱文件副本，按偏移读取单条记录"""
+
+    def __init__(self, f: BinaryIO, offsets: array, lengths: array):
+        self._f = f
+        self._lock = threading.Lock()
+        self._offsets = offsets
+        self._lengths = lengths
+        # 进行中的请求与 SSE 流持有快照或其 recipes 序列时都会引用本对象，引用全部释放后才关闭副本
+        self._finalizer = weakref.finalize(self, f.close)
+
+    def load(self, pos: int) -> Recipe:
+        with self._lock:
+            if self._f.closed:
+                raise RuntimeError("目录快照已释放")
+            self._f.seek(self._offsets[pos])
+            raw = self._f.read(self._lengths[pos])
+        return Recipe(**json.loads(raw))
+
+    def close(self):
+        with self._lock:
+            self._finalizer()
+
+
+def load_catalog(
+    data_path: str = DEFAULT_DATA_PATH,
+    skip_version: Optional[str] = None
+) -> Optional[CatalogSnapshot]:
+    """
+    流式加载菜谱文件并构建快照
+
+    Args:
+        data_path: 菜谱文件路径
+        skip_version: 文件版本与之相同时不再解析，直接返回 None
+    """
+    if skip_version is not None and file_version(data_path) == skip_version:
+        return None
+
+    # 副本在关闭或进程退出时由系统删除
+    copy = tempfile.TemporaryFile(prefix="recipes-")
+    try:
+        with open(data_path, 'rb') as f:
+            reader = _HashingReader(f, copy)
+            records = _iter_records(reader, data_path)
+
+            columns = RecipeColumns()
+            offsets = array('q')
+            lengths = array('q')
+            for record, offset, length in records:
+                columns.append(record)
+                offsets.append(offset)
+                lengths.append(length)
+
+            # 读完剩余内容，使哈希与副本覆盖整个文件
+            for _ in iter(lambda: reader.read(CHUNK_SIZE), b''):
+                pass
+        copy.flush()
+    except Exception:
+        copy.close()
+        raise
+
+    version = reader.hash.hexdigest()[:16]
+    records_file = _RecordFile(copy, offsets, lengths)
+    return CatalogSnapshot(columns, version, records_file.load, records_file.close)
+
+
+class CatalogWatcher:
+    """按修改时间轮询菜谱文件，变化时触发热加载"""
+
+    def __init__(self, service, interval: float):
+        self.service = service
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def _mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.service.data_path).st_mtime
+        except OSError:
+            return None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        last_mtime = self._mtime()
+        while True:
+            await asyncio.sleep(self.interval)
+            mtime = self._mtime()
+            if mtime is None or mtime == last_mtime:
+                continue
+            last_mtime = mtime
+            try:
+                if await self.service.reload():
+                    print(f"Catalog reloaded, version {self.service.version}")
+            except Exception as e:
+                # 新文件解析失败时继续使用旧快照
+                print(f"Error reloading catalog: {e}")
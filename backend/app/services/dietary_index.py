@@ -0,0 +1,171 @@
+"""
+饮食限制位图索引 - 目录加载时把每道菜违反的饮食限制预编译为位掩码
+菜谱匹配 (RecipeService) 与 RAG 检索 (LangChainNLPService) 共用
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from app.services.recipe_records import RecipeColumns
+
+
+@dataclass(frozen=True)
+class RestrictionRule:
+    """饮食限制规则
+
+    categories: 命中食材分类或菜谱标签即视为违反
+    ingredients: 食材名包含任一关键字即视为违反（用于过敏原）
+    """
+    categories: Tuple[str, ...] = ()
+    ingredients: Tuple[str, ...] = ()
+
+
+# 饮食限制 -> 规则，顺序决定位编号
+RESTRICTION_RULES: Dict[str, RestrictionRule] = {
+    "素食": RestrictionRule(categories=("肉类", "水产")),
+    "纯素": RestrictionRule(categories=("肉类", "水产", "蛋奶")),
+    "无海鲜": RestrictionRule(categories=("水产",)),
+    "无辣": RestrictionRule(categories=("辣",)),
+    "低碳水": RestrictionRule(categories=("主食",)),
+    "减肥": RestrictionRule(categories=("高热量",)),
+    # 过敏原
+    "花生过敏": RestrictionRule(ingredients=("花生",)),
+    "坚果过敏": RestrictionRule(categories=("坚果",)),
+    "海鲜过敏": RestrictionRule(categories=("水产",)),
+    "鸡蛋过敏": RestrictionRule(ingredients=("鸡蛋",)),
+    "大豆过敏": RestrictionRule(categories=("豆制品",), ingredients=("黄豆", "豆豉", "豆瓣酱")),
+    "芝麻过敏": RestrictionRule(ingredients=("芝麻",)),
+}
+
+MAX_RESTRICTIONS = 64
+
+
+def register_restriction(
+    name: str,
+    categories: Iterable[str] = (),
+    ingredients: Iterable[str] = ()
+):
+    """注册新的饮食限制（如新的过敏原），需在构建索引之前调用"""
+    if name not in RESTRICTION_RULES and len(RESTRICTION_RULES) >= MAX_RESTRICTIONS:
+        raise ValueError(f"最多支持 {MAX_RESTRICTIONS} 种饮食限制")
+    RESTRICTION_RULES[name] = RestrictionRule(
+        categories=tuple(categories),
+        ingredients=tuple(ingredients)
+    )
+
+
+def _ingredient_violates(name: str, category: str, rule: RestrictionRule) -> bool:
+    """检查单个食材是否违反某条规则"""
+    return category in rule.categories or any(keyword in name for keyword in rule.ingredients)
+
+
+def restriction_field(bit: int) -> str:
+    """向量库元数据中表示是否违反第 bit 种饮食限制的字段名"""
+    return f"violates_{bit}"
+
+
+def recipe_restriction_mask(recipe: Dict, rules: Dict[str, RestrictionRule] = None) -> int:
+    """按原始菜谱记录计算违反的饮食限制掩码，位编号与 RestrictionIndex 一致"""
+    if rules is None:
+        rules = RESTRICTION_RULES
+
+    mask = 0
+    tags = set(recipe.get('tags', []))
+    for bit, rule in enumerate(rules.values()):
+        if tags.intersection(rule.categories) or any(
+            _ingredient_violates(i['name'], i.get('category', ''), rule)
+            for i in recipe.get('ingredients', [])
+        ):
+            mask |= 1 << bit
+    return mask
+
+
+def _segment_or(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """按 CSR 区间对条目掩码做按位或，空区间结果为 0"""
+    result = np.zeros(len(offsets) - 1, dtype=np.uint64)
+    starts = offsets[:-1]
+    nonempty = offsets[1:] > starts
+    if nonempty.any():
+        result[nonempty] = np.bitwise_or.reduceat(values, starts[nonempty])
+    return result
+
+
+class RestrictionIndex:
+    """饮食限制位图索引
+
+    菜谱以其在目录中的位置编号；masks[pos] 的第 i 位表示违反第 i 种限制。
+    """
+
+    def __init__(
+        self,
+        columns: RecipeColumns,
+        rules: Dict[str, RestrictionRule] = None
+    ):
+        if rules is None:
+            rules = RESTRICTION_RULES
+
+        self.flags: Dict[str, int] = {
+            name: 1 << bit for bit, name in enumerate(rules)
+        }
+
+        # 每种 (食材名, 食材分类) 组合、每个标签只计算一次掩码
+        names = columns.ingredient_names.values
+        categories = columns.ingredient_categories.values
+        stride = max(len(categories), 1)
+        pairs, inverse = np.unique(
+            columns.column("ingredient_ids").astype(np.int64) * stride
+            + columns.column("ingredient_category_ids"),
+            return_inverse=True
+        )
+        pair_masks = np.array(
+            [
+                self._mask_of(rules, lambda rule: _ingredient_violates(
+                    names[pair // stride], categories[pair % stride], rule
+                ))
+                for pair in pairs.tolist()
+            ],
+            dtype=np.uint64
+        )
+        tag_masks = np.array(
+            [
+                self._mask_of(rules, lambda rule: tag in rule.categories)
+                for tag in columns.tags.values
+            ],
+            dtype=np.uint64
+        )
+
+        masks = _segment_or(
+            pair_masks[inverse.ravel()], columns.column("ingredient_offsets")
+        )
+        masks |= _segment_or(
+            tag_masks[columns.column("tag_ids")], columns.column("tag_offsets")
+        )
+
+        # Python int 列表用于逐个候选判断，uint64 数组用于整表向量化过滤
+        self._masks: List[int] = masks.tolist()
+        self.masks = masks
+
+    def _mask_of(self, rules: Dict[str, RestrictionRule], violates) -> int:
+        mask = 0
+        for name, rule in rules.items():
+            if violates(rule):
+                mask |= self.flags[name]
+        return mask
+
+    def query_mask(self, restrictions: Iterable[str]) -> int:
+        """把饮食限制列表编译为查询掩码，未知限制忽略"""
+        mask = 0
+        for restriction in restrictions or ():
+            mask |= self.flags.get(restriction, 0)
+        return mask
+
+    def violates(self, pos: int, mask: int) -> bool:
+        """候选菜谱是否违反查询掩码中的任一限制"""
+        return (self._masks[pos] & mask) != 0
+
+    def allowed_mask(self, mask: int) -> np.ndarray:
+        """整表向量化过滤，返回每个菜谱是否满足全部限制的布尔数组"""
+        if not mask:
+            return np.ones(len(self._masks), dtype=bool)
+        return (self.masks & np.uint64(mask)) == 0
@@ -1,46 +1,301 @@
 """
-Embedding 服务 - 使用简单的本地向量方法
+Embedding 服务 - 本地离线向量化，不依赖网络
+- tfidf: 字符 n-gram TF-IDF + 截断 SVD，在菜谱语料上拟合，模型保存到磁盘（默认）
+- hash: 基于 SHA-256 的简单向量，与语义无关，仅作对照
+通过环境变量 EMBEDDING_METHOD 选择
+
+查询文本的向量经过 LRU 缓存，模型变化时缓存自动失效
 """
+import json
 import os
-from typing import List
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 import hashlib
 import numpy as np
+from scipy import sparse
+
+
+EMBEDDING_DIM = 384
+
+# 批量向量化时每批的文本数，限制中间结果占用的内存
+EMBED_BATCH_SIZE = 8192
+
+EMBEDDING_METHOD = os.getenv("EMBEDDING_METHOD", "tfidf")
+EMBEDDING_MODEL_PATH = os.getenv("EMBEDDING_MODEL_PATH", "./embedding_model.npz")
+
+# 字符 n-gram 范围与词表上限
+NGRAM_RANGE = (1, 3)
+MAX_FEATURES = 100000
+
+# 查询向量缓存条数
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """查询文本规范化：全角转半角、去除首尾空白、连续空白合并、转小写"""
+    text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+class TfidfSvdModel:
+    """字符 n-gram TF-IDF + 截断 SVD
+    
+    输出维度固定为 EMBEDDING_DIM；语料较小、SVD 维度不足时其余维度补零。
+    """
+    
+    def __init__(self, vocabulary: Dict[str, int], idf: np.ndarray, components: np.ndarray):
+        from sklearn.feature_extraction.text import CountVectorizer
+        
+        self.vocabulary = vocabulary
+        self.idf = idf.astype(np.float32)
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(json.dumps(vocabulary, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        digest.update(self.idf.tobytes())
+        digest.update(self.components.tobytes())
+        self.fingerprint = "tfidf-" + digest.hexdigest()
+        
+        self._counter = CountVectorizer(
+            analyzer="char",
+            ngram_range=NGRAM_RANGE,
+            vocabulary=vocabulary
+        )
+    
+    @classmethod
+    def fit(cls, documents: List[str]) -> "TfidfSvdModel":
+        """在语料上拟合模型"""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.decomposition import TruncatedSVD
+        
+        vectorizer = TfidfVectorizer(
+            analyzer="char",
+            ngram_range=NGRAM_RANGE,
+            max_features=MAX_FEATURES,
+            dtype=np.float32
+        )
+        tfidf = vectorizer.fit_transform(documents)
+        
+        n_components = min(EMBEDDING_DIM, tfidf.shape[0] - 1, tfidf.shape[1] - 1)
+        svd = TruncatedSVD(n_components=n_components, random_state=0)
+        svd.fit(tfidf)
+        
+        vocabulary = {term: int(col) for term, col in vectorizer.vocabulary_.items()}
+        return cls(vocabulary, vectorizer.idf_, svd.components_)
+    
+    @classmethod
+    def load(cls, path: str) -> "TfidfSvdModel":
+        with np.load(path, allow_pickle=False) as data:
+            vocabulary = json.loads(data["vocabulary"].tobytes().decode("utf-8"))
+            return cls(vocabulary, data["idf"], data["components"])
+    
+    def save(self, path: str):
+        """写入临时文件后替换"""
+        vocabulary = json.dumps(self.vocabulary, ensure_ascii=False).encode("utf-8")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                vocabulary=np.frombuffer(vocabulary, dtype=np.uint8),
+                idf=self.idf,
+                components=self.components
+            )
+        os.replace(tmp_path, path)
+    
+    def transform(self, texts: List[str]) -> np.ndarray:
+        """返回 (len(texts), EMBEDDING_DIM) 的 float32 数组，每行已归一化"""
+        counts = self._counter.transform(texts).astype(np.float32)
+        tfidf = counts @ sparse.diags(self.idf)
+        
+        vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        vectors[:, :len(self.components)] = tfidf @ self.components.T
+        
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+
+
+class QueryEmbeddingCache:
+    """查询向量 LRU 缓存，按条目数限制容量
+
+    缓存与模型标识绑定，标识变化时整体清空。
+    """
+    
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.model_id: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, model_id: str, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            if model_id != self.model_id:
+                self._entries.clear()
+                self.model_id = model_id
+            
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+    
+    def put(self, model_id: str, key: str, vector: np.ndarray):
+        with self._lock:
+            # 计算期间模型已变化，丢弃旧模型的结果
+            if model_id != self.model_id or self.max_entries <= 0:
+                return
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.model_id = None
+    
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "model_id": self.model_id
+        }
 
 
 class EmbeddingService:
     """文本向量化服务"""
     
-    def __init__(self):
-        print("Embedding service initialized (using simple hash method)")
+    def __init__(self, method: str = EMBEDDING_METHOD, model_path: str = EMBEDDING_MODEL_PATH):
+        if method not in ("tfidf", "hash"):
+            raise ValueError(f"未知的向量化方法: {method}")
+        self.method = method
+        self.model_path = model_path
+        self._model: Optional[TfidfSvdModel] = None
+        self._model_stat: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self.query_cache = QueryEmbeddingCache()
+        
+        # 与文本无关的部分只计算一次：每一维取哪个 hash 字节、基于位置的变换
+        self._byte_index = np.arange(EMBEDDING_DIM) % hashlib.sha256().digest_size
+        self._position_offset = np.sin(np.arange(EMBEDDING_DIM) * 0.1) * 0.1
+        print(f"Embedding service initialized (using {method} method)")
+    
+    @property
+    def model(self) -> TfidfSvdModel:
+        """
+        TF-IDF + SVD 模型：优先从磁盘加载，不存在时在当前菜谱目录上拟合并保存
+        模型文件被其他进程（如 init_vector_db）改写后自动重新加载
+        """
+        stat = self._file_stat()
+        if self._model is None or (stat is not None and stat != self._model_stat):
+            with self._lock:
+                stat = self._file_stat()
+                if stat is not None and (self._model is None or stat != self._model_stat):
+                    self._model = TfidfSvdModel.load(self.model_path)
+                    self._model_stat = stat
+                elif self._model is None:
+                    self._fit_and_save(self._catalog_documents())
+        return self._model
+    
+    @property
+    def model_id(self) -> str:
+        """当前模型标识，模型重新拟合或重新加载后随之变化"""
+        if self.method == "hash":
+            return "hash"
+        return self.model.fingerprint
+    
+    def _file_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.model_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def fit(self, documents: List[str]):
+        """在给定语料上重新拟合模型并保存，之前生成的向量需要重新计算"""
+        with self._lock:
+            self._fit_and_save(documents)
+    
+    def _fit_and_save(self, documents: List[str]):
+        print(f"Fitting TF-IDF + SVD embedding model on {len(documents)} documents...")
+        model = TfidfSvdModel.fit(documents)
+        model.save(self.model_path)
+        self._model = model
+        self._model_stat = self._file_stat()
+    
+    def _catalog_documents(self) -> List[str]:
+        """当前菜谱目录的向量文本"""
+        from app.services.recipe_matcher import recipe_service
+        return [
+            self.embed_recipe({
+                'name': r.name,
+                'name_en': r.name_en,
+                'category': r.category,
+                'tags': r.tags,
+                'ingredients': [{'name': name} for name in r.ingredient_names]
+            })
+            for r in recipe_service.summaries
+        ]
     
     def embed_text(self, text: str) -> List[float]:
-        """将文本转换为向量 (简单 hash 方法)"""
-        return self._simple_embedding(text)
-    
-    def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        """批量将文本转换为向量"""
-        return [self.embed_text(text) for text in texts]
-    
-    def _simple_embedding(self, text: str) -> List[float]:
-        """简单的备用嵌入方法 - 基于 hash"""
-        hash_obj = hashlib.sha256(text.encode())
-        hash_bytes = hash_obj.digest()
-        
-        # 生成 384 维向量
-        vector = []
-        for i in range(384):
-            byte_val = hash_bytes[i % len(hash_bytes)]
-            float_val = (byte_val / 128.0) - 1.0
-            # 添加一些基于位置的变换
-            float_val += np.sin(i * 0.1) * 0.1
-            vector.append(float_val)
-        
-        # 归一化
-        norm = np.linalg.norm(vector)
-        if norm > 0:
-            vector = [v / norm for v in vector]
-        
-        return vector
+        """将查询文本转换为向量，按规范化后的文本缓存"""
+        key = normalize_query(text)
+        model_id = self.model_id
+        
+        vector = self.query_cache.get(model_id, key)
+        if vector is None:
+            vector = self._embed_batch([key])[0]
+            self.query_cache.put(model_id, key, vector)
+        return vector.tolist()
+    
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        批量将文本转换为向量
+        
+        Returns:
+            (len(texts), 384) 的 float32 数组，每行已归一化
+        """
+        embeddings = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = texts[start:start + EMBED_BATCH_SIZE]
+            embeddings[start:start + len(batch)] = self._embed_batch(batch)
+        return embeddings
+    
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        if self.method == "hash":
+            return self._simple_embedding(texts)
+        return self.model.transform(texts)
+    
+    def _simple_embedding(self, texts: List[str]) -> np.ndarray:
+        """简单的备用嵌入方法 - 基于 hash，一次处理一批文本"""
+        digests = b"".join(hashlib.sha256(text.encode()).digest() for text in texts)
+        hash_bytes = np.frombuffer(digests, dtype=np.uint8).reshape(len(texts), -1)
+        
+        # 生成 384 维向量：hash 字节循环展开，再加上基于位置的变换
+        vectors = hash_bytes[:, self._byte_index] / 128.0 - 1.0
+        vectors += self._position_offset
+        
+        # 按行归一化
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
     
     def embed_recipe(self, recipe: dict) -> str:
         """将菜谱转换为可向量化的文本"""
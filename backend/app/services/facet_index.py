@@ -0,0 +1,92 @@
+"""
+标签与难度索引 - 目录加载时预先计算 标签 -> 菜谱位置、难度 -> 菜谱位置
+列表接口按索引取出候选，多个条件时求交集，再按游标分页
+"""
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.services.recipe_records import RecipeColumns
+
+
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+
+def _group_positions(keys: np.ndarray, positions: np.ndarray, names) -> Dict[str, np.ndarray]:
+    """按 keys 分组，每组的菜谱位置升序且去重"""
+    if len(keys) == 0:
+        return {}
+    stride = max(int(positions.max()) + 1, 1)
+    encoded = np.unique(keys.astype(np.int64) * stride + positions)
+    groups = (encoded // stride).astype(np.int32)
+    values = (encoded % stride).astype(np.int32)
+
+    boundaries = np.flatnonzero(np.diff(groups)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(values)]))
+    return {
+        names[int(groups[start])]: values[start:end]
+        for start, end in zip(starts.tolist(), ends.tolist())
+    }
+
+
+class FacetIndex:
+    """标签、难度 -> 菜谱位置（升序 int32 数组）"""
+
+    def __init__(self, columns: RecipeColumns):
+        self.size = len(columns)
+        self.tags = _group_positions(
+            columns.column("tag_ids"), columns.tag_positions(), columns.tags
+        )
+        self.difficulties = _group_positions(
+            columns.column("difficulty_ids"),
+            np.arange(self.size, dtype=np.int32),
+            columns.labels
+        )
+
+    def filter(
+        self,
+        tag: Optional[str] = None,
+        difficulty: Optional[str] = None
+    ) -> Optional[np.ndarray]:
+        """
+        返回同时满足所有条件的菜谱位置，升序
+
+        Returns:
+            位置数组；没有任何条件时返回 None，表示整个目录
+        """
+        selected = []
+        if tag:
+            selected.append(self.tags.get(tag, _EMPTY))
+        if difficulty:
+            selected.append(self.difficulties.get(difficulty, _EMPTY))
+
+        if not selected:
+            return None
+        # 从最短的列表开始求交集
+        selected.sort(key=len)
+        positions = selected[0]
+        for other in selected[1:]:
+            positions = np.intersect1d(positions, other, assume_unique=True)
+        return positions
+
+    def page(
+        self,
+        positions: Optional[np.ndarray],
+        after: Optional[int],
+        limit: int
+    ) -> np.ndarray:
+        """
+        从 filter 的结果中取出一页
+
+        Args:
+            positions: filter 返回的位置数组，None 表示整个目录
+            after: 上一页最后一道菜的位置，None 表示第一页
+            limit: 每页数量
+        """
+        if positions is None:
+            start = 0 if after is None else after + 1
+            return np.arange(start, min(start + limit, self.size), dtype=np.int32)
+
+        start = 0 if after is None else int(np.searchsorted(positions, after, side="right"))
+        return positions[start:start + limit]
@@ -0,0 +1,90 @@
+"""
+混合检索 - 向量检索与 BM25 词法检索两路召回，用倒数排名融合（RRF）合并
+两路使用相同的饮食限制、分类、热量条件；RRF 只看名次，不需要对两种分数做归一化或调权重
+两路在同一个检索线程中先后执行：BM25 只有几毫秒且需要持有 GIL，拆开并行几乎没有收益，
+还会让一次请求占用检索线程池的两个线程
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.services.recipe_matcher import recipe_service
+
+
+# RRF 平滑常数，取原论文的 60
+RRF_K = 60
+
+# 每一路召回的候选数下限
+MIN_CANDIDATES = 20
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """
+    倒数排名融合：score(d) = Σ 1 / (k + rank_i(d))，rank 从 1 开始
+
+    Args:
+        rankings: 多个按相关度降序的 ID 列表
+        k: 平滑常数
+
+    Returns:
+        [(ID, 融合分数)]，分数降序；同分时先出现的 ID 在前
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+
+def hybrid_search(
+    store,
+    query: str,
+    lexical_query: Optional[str] = None,
+    top_k: int = 5,
+    restrictions: Optional[List[str]] = None,
+    category: Optional[str] = None,
+    max_calories: Optional[float] = None
+) -> List[Dict]:
+    """
+    向量 + BM25 混合检索，同步执行，async 接口经 search_executor 调用
+
+    Args:
+        store: 向量库（RecipeVectorStore）
+        query: 向量检索的查询文本
+        lexical_query: BM25 的查询文本，默认与 query 相同
+        top_k: 返回数量
+        restrictions / category / max_calories: 两路共用的过滤条件
+
+    Returns:
+        [{"id", "score", "rrf_score", "vector_similarity", "vector_rank", "bm25_score", "bm25_rank"}]，
+        score 为 RRF 分数除以两路都排第一时的分数，落在 [0, 1]
+    """
+    n_candidates = max(top_k * 4, MIN_CANDIDATES)
+
+    filters = recipe_service.vector_filters(restrictions, category, max_calories)
+    vector_results = store.search(query, n_results=n_candidates, filters=filters)
+    lexical_results = recipe_service.lexical_search(
+        lexical_query or query, n_candidates, restrictions, category, max_calories
+    )
+
+    vector_hits = {vr['id']: (rank, vr.get('similarity') or 0.0) for rank, vr in enumerate(vector_results, 1)}
+    lexical_hits = {rid: (rank, score) for rank, (rid, score) in enumerate(lexical_results, 1)}
+
+    fused = reciprocal_rank_fusion([
+        [vr['id'] for vr in vector_results],
+        [rid for rid, _ in lexical_results],
+    ])
+    best = 2.0 / (RRF_K + 1)
+
+    results = []
+    for rid, rrf_score in fused[:top_k]:
+        vector_rank, similarity = vector_hits.get(rid, (None, 0.0))
+        bm25_rank, bm25_score = lexical_hits.get(rid, (None, 0.0))
+        results.append({
+            "id": rid,
+            "score": round(rrf_score / best, 4),
+            "rrf_score": rrf_score,
+            "vector_similarity": similarity,
+            "vector_rank": vector_rank,
+            "bm25_score": round(float(bm25_score), 4),
+            "bm25_rank": bm25_rank
+        })
+    return results
@@ -0,0 +1,159 @@
+"""
+食材倒排索引 - 基于倒排表 (posting list) 的食材检索引擎
+单次查询的开销只与命中的倒排项数量有关，与菜谱总数无关
+批量查询通过稀疏矩阵乘法一次完成计数
+"""
+import heapq
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.services.recipe_records import RecipeColumns
+
+
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+
+class IngredientIndex:
+    """食材倒排索引
+
+    菜谱以其在目录中的位置 (0..n-1) 编号，倒排表为有序的 int32 数组。
+    """
+
+    def __init__(self, columns: RecipeColumns):
+        n = len(columns)
+        # 分母沿用菜谱的食材条目数（与原匹配算法一致）
+        self.ingredient_counts = np.diff(columns.column("ingredient_offsets")).astype(np.int32)
+
+        # 食材ID即矩阵列号，与驻留表一致
+        self.vocabulary: Dict[str, int] = columns.ingredient_names.ids
+        self.matrix = self._build_matrix(columns, n)
+
+        indptr, indices = self.matrix.indptr, self.matrix.indices
+        self.postings: Dict[str, np.ndarray] = {
+            name: indices[indptr[col]:indptr[col + 1]]
+            for name, col in self.vocabulary.items()
+        }
+
+    def _build_matrix(self, columns: RecipeColumns, n_recipes: int) -> sparse.csr_matrix:
+        """构建 食材 x 菜谱 的 0/1 CSR 矩阵（即倒排表的矩阵形式）"""
+        vocab_size = len(self.vocabulary)
+        stride = max(n_recipes, 1)
+
+        # (食材, 菜谱) 编码后去重排序：先按食材、再按菜谱位置，同一菜谱重复的食材只计一次
+        keys = np.unique(
+            columns.column("ingredient_ids").astype(np.int64) * stride
+            + columns.ingredient_positions()
+        )
+        rows = keys // stride
+        indices = (keys % stride).astype(np.int32)
+
+        indptr = np.zeros(vocab_size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=vocab_size), out=indptr[1:])
+        data = np.ones(len(indices), dtype=np.int32)
+        return sparse.csr_matrix(
+            (data, indices, indptr),
+            shape=(vocab_size, n_recipes)
+        )
+
+    def __contains__(self, ingredient: str) -> bool:
+        return ingredient in self.postings
+
+    def get_postings(self, ingredient: str) -> np.ndarray:
+        """获取某个食材的倒排表"""
+        return self.postings.get(ingredient, _EMPTY)
+
+    def match(self, ingredients: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        候选生成与匹配计数
+
+        Returns:
+            (候选菜谱位置, 每个候选命中的食材数)，位置升序排列
+        """
+        lists = [
+            self.postings[name]
+            for name in dict.fromkeys(ingredients)
+            if name in self.postings
+        ]
+        if not lists:
+            return _EMPTY, _EMPTY
+        if len(lists) == 1:
+            return lists[0], np.ones(len(lists[0]), dtype=np.int32)
+
+        # 合并倒排表后排序计数，开销为 O(P log P)，P 为命中的倒排项总数
+        positions, counts = np.unique(np.concatenate(lists), return_counts=True)
+        return positions, counts
+
+    def batch_match(
+        self,
+        queries: Sequence[Sequence[str]]
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        批量候选生成与匹配计数
+
+        查询 x 食材 的 0/1 矩阵与 食材 x 菜谱 矩阵相乘，一次得到所有查询的匹配数。
+        结果与逐个调用 match 相同。
+        """
+        rows, cols = [], []
+        for row, ingredients in enumerate(queries):
+            for name in dict.fromkeys(ingredients):
+                col = self.vocabulary.get(name)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+
+        query_matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(len(queries), len(self.vocabulary))
+        )
+        counts = query_matrix @ self.matrix
+        counts.sort_indices()
+
+        return [
+            (
+                counts.indices[counts.indptr[row]:counts.indptr[row + 1]],
+                counts.data[counts.indptr[row]:counts.indptr[row + 1]]
+            )
+            for row in range(len(queries))
+        ]
+
+    def top_k(
+        self,
+        ingredients: Sequence[str],
+        top_k: int = 5,
+        allowed: Optional[Callable[[int], bool]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        返回匹配分数最高的 top_k 个菜谱
+
+        Args:
+            ingredients: 用户食材
+            top_k: 返回数量
+            allowed: 可选的候选过滤函数，参数为菜谱位置
+
+        Returns:
+            [(菜谱位置, 匹配分数)]，分数降序；同分时按目录顺序
+        """
+        positions, counts = self.match(ingredients)
+        return self.rank(positions, counts, top_k, allowed)
+
+    def rank(
+        self,
+        positions: np.ndarray,
+        counts: np.ndarray,
+        top_k: int = 5,
+        allowed: Optional[Callable[[int], bool]] = None
+    ) -> List[Tuple[int, float]]:
+        """对候选计算匹配分数并用堆选出 top_k，positions 需升序"""
+        if len(positions) == 0:
+            return []
+
+        # 匹配分数 = 匹配食材数 / 所需食材总数
+        scores = counts / self.ingredient_counts[positions]
+        candidates = zip(positions.tolist(), scores.tolist())
+        if allowed is not None:
+            candidates = (c for c in candidates if allowed(c[0]))
+
+        # heapq.nlargest 在同分时保持输入顺序，与稳定排序结果一致
+        return heapq.nlargest(top_k, candidates, key=lambda c: c[1])
@@ -1,51 +1,66 @@
 """
-初始化向量数据库 - 将菜谱数据导入 ChromaDB
-运行一次即可
+初始化向量数据库 - 将菜谱数据导入向量库
+默认增量同步：按内容哈希比对，只为新增或变化的菜谱生成向量，删除已移除的菜谱，可重复运行
+--rebuild：清空向量库、重新拟合向量化模型后全量导入
+
+用法（在 backend 目录下运行）:
+    python -m app.services.init_vector_db [--rebuild] [--data 菜谱文件]
 """
-import json
-import os
+import argparse
+import time
+from app.services.catalog import DEFAULT_DATA_PATH, iter_recipe_records
 from app.services.vector_store import vector_store
+from app.services.embedding_service import embedding_service
 
 
-def init_vector_database():
-    """初始化向量数据库"""
+def init_vector_database(data_path: str = DEFAULT_DATA_PATH, rebuild: bool = False) -> bool:
+    """初始化或增量同步向量数据库"""
     print("=" * 50)
-    print("初始化菜谱向量数据库")
+    print("初始化菜谱向量数据库" if rebuild else "同步菜谱向量数据库")
     print("=" * 50)
     
-    # 加载菜谱数据
-    data_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'recipes.json')
+    start = time.perf_counter()
     
-    with open(data_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        recipes = data['recipes']
+    if not rebuild:
+        report = vector_store.sync_recipes(iter_recipe_records(data_path))
+        print(f"\n新增 {report['added']}，更新 {report['updated']}，"
+              f"删除 {report['deleted']}，未变化 {report['unchanged']}")
+        print(f"比对 {report['diff_ms']}ms，生成向量 {report['embed_ms']}ms，"
+              f"写入 {report['upsert_ms']}ms，删除 {report['delete_ms']}ms")
+        print(f"\n✅ 同步完成，共 {vector_store.count()} 道菜谱，"
+              f"耗时 {time.perf_counter() - start:.2f}s")
+        return True
     
+    # 加载菜谱数据
+    recipes = list(iter_recipe_records(data_path))
     print(f"\n加载了 {len(recipes)} 道菜谱")
     
-    # 清空现有数据（可选）
-    # vector_store.delete_all()
+    vector_store.delete_all()
     
-    # 检查是否已有数据
-    current_count = vector_store.collection.count()
-    if current_count > 0:
-        print(f"\n数据库中已有 {current_count} 条记录")
-        response = input("是否重新导入？(y/n): ").strip().lower()
-        if response == 'y':
-            vector_store.delete_all()
-        else:
-            print("跳过导入")
-            return
+    # 在菜谱语料上重新拟合向量化模型，模型与向量库保持一致
+    if embedding_service.method == "tfidf":
+        print("\n正在拟合向量化模型...")
+        embedding_service.fit([embedding_service.embed_recipe(r) for r in recipes])
+        print(f"模型位置: {embedding_service.model_path}")
     
     # 导入数据
     print("\n正在生成向量并导入数据库...")
     success = vector_store.add_recipes(recipes)
     
     if success:
-        print(f"\n✅ 成功导入 {len(recipes)} 道菜谱到向量数据库")
+        print(f"\n✅ 成功导入 {len(recipes)} 道菜谱到向量数据库，"
+              f"耗时 {time.perf_counter() - start:.2f}s")
         print(f"数据库位置: {vector_store.persist_directory}")
     else:
         print("\n❌ 导入失败")
+    return success
 
 
 if __name__ == "__main__":
-    init_vector_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="初始化或增量同步菜谱向量数据库")
+    parser.add_argument("--rebuild", action="store_true", help="清空向量库并重新拟合模型后全量导入")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH, help="菜谱文件路径")
+    args = parser.parse_args()
+    
+    if not init_vector_database(args.data, args.rebuild):
+        raise SystemExit(1)
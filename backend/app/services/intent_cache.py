@@ -0,0 +1,145 @@
+"""
+意图解析结果缓存 - 放在 LLM 意图 Chain 之前的 TTL + LRU 缓存
+键为规范化消息（全角转半角、转小写、去掉空白与标点符号）的 SHA-256，值为解析出的 JSON；
+不保存原始消息，设置 INTENT_CACHE_PATH 后同时写入本地 SQLite，重启后仍可命中
+
+通过环境变量 INTENT_CACHE_SIZE / INTENT_CACHE_TTL / INTENT_CACHE_PATH 配置
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "4096"))
+INTENT_CACHE_TTL = float(os.getenv("INTENT_CACHE_TTL", "86400"))
+# 为空时只缓存在内存中
+INTENT_CACHE_PATH = os.getenv("INTENT_CACHE_PATH", "")
+
+
+def normalize_message(message: str) -> str:
+    """全角转半角、转小写，去掉空白、标点与符号，如 "我有 番茄，鸡蛋！" -> "我有番茄鸡蛋" """
+    text = unicodedata.normalize("NFKC", message).lower()
+    return "".join(ch for ch in text if unicodedata.category(ch)[0] not in "PSZC")
+
+
+def message_key(message: str) -> str:
+    return hashlib.sha256(normalize_message(message).encode("utf-8")).hexdigest()
+
+
+class IntentCache:
+    """意图解析结果缓存，按条目数限制容量，条目超过 TTL 后失效"""
+
+    def __init__(self, max_entries: int = INTENT_CACHE_SIZE, ttl: float = INTENT_CACHE_TTL, path: str = INTENT_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        # 键 -> (过期时间, JSON 文本)；取出时重新解析，调用方修改结果不会影响缓存
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._open(path)
+
+    def _open(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS intent_cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._db.execute("DELETE FROM intent_cache WHERE expires_at <= ?", (time.time(),))
+        rows = self._db.execute(
+            "SELECT key, value, expires_at FROM intent_cache ORDER BY expires_at DESC LIMIT ?",
+            (max(self.max_entries, 0),)
+        ).fetchall()
+        # 按过期时间从早到晚放入，最近写入的排在 LRU 末尾
+        for key, value, expires_at in reversed(rows):
+            self._entries[key] = (expires_at, value)
+        self._db.execute(
+            "DELETE FROM intent_cache WHERE key NOT IN "
+            "(SELECT key FROM intent_cache ORDER BY expires_at DESC LIMIT ?)",
+            (max(self.max_entries, 0),)
+        )
+        self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, message: str) -> Optional[Dict[str, Any]]:
+        key = message_key(message)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.time():
+                self._delete(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(entry[1])
+
+    def put(self, message: str, result: Dict[str, Any]):
+        if self.max_entries <= 0:
+            return
+        key = message_key(message)
+        value = json.dumps(result, ensure_ascii=False)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO intent_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+            while len(self._entries) > self.max_entries:
+                self._delete(next(iter(self._entries)))
+            if self._db is not None:
+                self._db.commit()
+
+    def _delete(self, key: str):
+        del self._entries[key]
+        if self._db is not None:
+            self._db.execute("DELETE FROM intent_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM intent_cache")
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "persistent": self.path or None
+        }
+
+
+intent_cache = IntentCache()
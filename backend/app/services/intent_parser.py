@@ -0,0 +1,328 @@
+"""
+规则意图解析 - 不调用 LLM 的快速路径
+用菜谱目录中的全部食材名、菜名及常见别名，加上饮食限制、口味、意图提示词构建 Aho-Corasick 自动机，
+一次扫描消息即可找出所有词条，按最左最长原则取不重叠的匹配，再由规则给出意图与置信度；
+置信度低于阈值时由调用方交给 LLM 解析
+自动机作为目录快照的一部分在加载或热加载时构建（见 catalog.CatalogSnapshot），解析时不再构建
+
+通过环境变量 INTENT_CONFIDENCE_THRESHOLD 配置阈值
+"""
+import os
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.services.dietary_index import RESTRICTION_RULES
+from app.services.embedding_service import normalize_query
+
+
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+
+# 超过该长度的消息通常包含规则覆盖不到的信息，降低置信度交给 LLM
+MAX_CONFIDENT_LENGTH = 40
+
+# 食材别名 -> 目录中的标准名
+INGREDIENT_SYNONYMS = {
+    "西红柿": "番茄",
+    "马铃薯": "土豆",
+    "洋芋": "土豆",
+    "大蒜": "蒜",
+    "蒜头": "蒜",
+    "生姜": "姜",
+    "老姜": "姜",
+    "卷心菜": "包菜",
+    "圆白菜": "包菜",
+    "包心菜": "包菜",
+    "青瓜": "黄瓜",
+    "芫荽": "香菜",
+    "红萝卜": "胡萝卜",
+    "菜花": "花菜",
+    "西蓝花": "西兰花",
+    "虾仁": "鲜虾",
+    "鸡子": "鸡蛋",
+}
+
+# 菜名中的常见说法差异，与 INGREDIENT_SYNONYMS 一起用于生成菜名别名
+DISH_SYNONYMS = {
+    "炒鸡蛋": "炒蛋",
+    "鸡蛋汤": "蛋汤",
+}
+
+# 目录之外也要识别的常见食材
+COMMON_INGREDIENTS = [
+    "番茄", "鸡蛋", "土豆", "猪肉", "鸡肉", "牛肉", "鱼", "虾",
+    "豆腐", "茄子", "青椒", "洋葱", "大蒜", "姜", "葱",
+    "胡萝卜", "白菜", "青菜", "黄瓜", "冬瓜", "南瓜",
+    "面条", "米饭", "粉丝", "腐竹"
+]
+
+# 饮食限制提示词 -> 限制名；过敏原另由 RESTRICTION_RULES 中的 "X过敏" 自动加入
+RESTRICTION_PHRASES = {
+    "素食": "素食", "吃素": "素食", "素菜": "素食", "不吃肉": "素食",
+    "纯素": "纯素", "全素": "纯素",
+    "不吃海鲜": "无海鲜", "不要海鲜": "无海鲜", "不能吃海鲜": "无海鲜",
+    "不吃辣": "无辣", "不要辣": "无辣", "不能吃辣": "无辣", "怕辣": "无辣", "不辣": "无辣",
+    "不想吃辣": "无辣", "不要吃辣": "无辣", "不爱吃辣": "无辣", "不喜欢辣": "无辣", "不喜欢吃辣": "无辣",
+    "低碳水": "低碳水", "低碳": "低碳水", "少碳水": "低碳水",
+    "减肥": "减肥", "减脂": "减肥", "瘦身": "减肥", "低卡": "减肥",
+}
+
+# 口味偏好提示词
+PREFERENCE_PHRASES = {
+    "清淡": "清淡", "酸甜": "酸甜", "麻辣": "麻辣", "香辣": "香辣",
+    "爱吃辣": "辣", "喜欢辣": "辣", "吃辣": "辣", "重口味": "重口味",
+}
+
+# 意图提示词 -> 意图；多个意图同时出现时按 INTENT_PRIORITY 取第一个
+INTENT_PHRASES = {
+    "recommend_by_ingredients": [
+        "我有", "家里有", "冰箱里", "冰箱有", "剩下", "剩了", "能做什么", "可以做什么",
+        "做什么菜", "做点什么", "推荐", "吃什么",
+    ],
+    "cooking_guide": ["怎么做", "怎么炒", "怎么煮", "如何做", "做法", "步骤", "教我做", "教我"],
+    "nutrition_query": ["热量", "卡路里", "营养", "蛋白质", "脂肪", "碳水", "多少卡", "大卡"],
+    "substitution": ["代替", "替代", "替换", "换成", "用什么代", "没有的话"],
+}
+INTENT_PRIORITY = ["substitution", "nutrition_query", "cooking_guide", "recommend_by_ingredients"]
+
+# 否定提示词：出现在食材所在分句中食材之前时排除该食材，如"不想吃鸡蛋"、"不要放香菜"
+NEGATION_CUES = ("不吃", "不要", "没有", "不想", "不喜欢", "不爱", "不能", "不加", "不放", "别放", "忌口")
+# 出现在食材之后的否定，如"对虾过敏"
+NEGATION_SUFFIXES = ("过敏",)
+# 分句边界：否定只作用于所在分句
+CLAUSE_BREAKS = set("，,。.;；!！?？\n") | {"但"}
+# 消息中出现规则未作为饮食限制识别的否定时，置信度上限（低于阈值，交给 LLM）
+NEGATION_CONFIDENCE_CAP = 0.5
+
+
+class AhoCorasick:
+    """Aho-Corasick 多模式匹配自动机，每个模式附带任意值"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        # 节点 i：goto[i] 字符 -> 子节点，fail[i] 失配跳转，out[i] 以该节点结尾的模式编号，
+        # link[i] 沿失配链下一个有输出的节点
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[int] = [-1]
+        self.patterns: List[str] = []
+        self.values: List[List[Any]] = []
+
+        index: Dict[str, int] = {}
+        for pattern, value in patterns:
+            if not pattern:
+                continue
+            pid = index.get(pattern)
+            if pid is not None:
+                if value not in self.values[pid]:
+                    self.values[pid].append(value)
+                continue
+            pid = index[pattern] = len(self.patterns)
+            self.patterns.append(pattern)
+            self.values.append([value])
+
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._out.append(-1)
+                node = nxt
+            self._out[node] = pid
+
+        self._fail = [0] * len(self._goto)
+        self._link = [-1] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for ch, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._link[child] = target if self._out[target] >= 0 else self._link[target]
+                queue.append(child)
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def find_all(self, text: str) -> List[Tuple[int, int, int]]:
+        """返回全部匹配 [(起点, 终点, 模式编号)]，可能重叠"""
+        matches = []
+        goto, fail, out, link = self._goto, self._fail, self._out, self._link
+        node = 0
+        for end, ch in enumerate(text, 1):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node if out[node] >= 0 else link[node]
+            while hit > 0:
+                pid = out[hit]
+                matches.append((end - len(self.patterns[pid]), end, pid))
+                hit = link[hit]
+        return matches
+
+    def find_longest(self, text: str) -> List[Tuple[int, int, int]]:
+        """最左最长、互不重叠的匹配"""
+        selected = []
+        covered = 0
+        for start, end, pid in sorted(self.find_all(text), key=lambda m: (m[0], m[0] - m[1])):
+            if start >= covered:
+                selected.append((start, end, pid))
+                covered = end
+        return selected
+
+
+def _build_patterns(ingredient_names: Iterable[str], dish_names: Iterable[str]) -> List[Tuple[str, Any]]:
+    patterns: List[Tuple[str, Any]] = []
+    ingredients = set(ingredient_names) | set(COMMON_INGREDIENTS)
+    for name in ingredients:
+        patterns.append((name, ("ingredient", name)))
+    for alias, canonical in INGREDIENT_SYNONYMS.items():
+        patterns.append((alias, ("ingredient", canonical)))
+
+    synonyms = list(INGREDIENT_SYNONYMS.items()) + list(DISH_SYNONYMS.items())
+    for dish in dish_names:
+        # 菜名中的说法逐一换成别名、两两组合，如 番茄炒蛋 -> 西红柿炒蛋 / 番茄炒鸡蛋 / 西红柿炒鸡蛋
+        variants = {dish}
+        for alias, canonical in synonyms:
+            variants |= {v.replace(canonical, alias) for v in variants if canonical in v}
+        for variant in variants:
+            patterns.append((variant, ("dish", dish)))
+
+    for phrase, restriction in RESTRICTION_PHRASES.items():
+        patterns.append((phrase, ("restriction", restriction)))
+    for restriction in RESTRICTION_RULES:
+        if restriction.endswith("过敏"):
+            patterns.append((restriction, ("restriction", restriction)))
+            patterns.append((restriction[:-2] + "会过敏", ("restriction", restriction)))
+    for phrase, preference in PREFERENCE_PHRASES.items():
+        patterns.append((phrase, ("preference", preference)))
+    for intent, phrases in INTENT_PHRASES.items():
+        for phrase in phrases:
+            patterns.append((phrase, ("intent", intent)))
+    return [(normalize_query(p), v) for p, v in patterns]
+
+
+class RuleIntentParser:
+    """基于词典与规则的意图解析，输出格式与 LLM 意图 Chain 一致，另带 confidence（0~1）"""
+
+    def __init__(self, ingredient_names: Iterable[str] = (), dish_names: Iterable[str] = ()):
+        self.automaton = AhoCorasick(_build_patterns(ingredient_names, dish_names))
+
+    def parse(self, message: str) -> Dict[str, Any]:
+        text = normalize_query(message)
+        matches = self.automaton.find_longest(text)
+
+        # 已识别为饮食限制的片段（如"不吃辣"）中的否定词已被规则理解，判断否定时把它们遮住
+        masked = list(text)
+        for start, end, pid in matches:
+            if any(kind == "restriction" for kind, _ in self.automaton.values[pid]):
+                masked[start:end] = " " * (end - start)
+        masked = "".join(masked)
+
+        ingredients: List[str] = []
+        restrictions: List[str] = []
+        preferences: List[str] = []
+        dishes: List[str] = []
+        negated: List[str] = []
+        intents = set()
+
+        for start, end, pid in matches:
+            for kind, value in self.automaton.values[pid]:
+                if kind == "ingredient":
+                    if self._is_negated(masked, start, end):
+                        negated.append(value)
+                    else:
+                        ingredients.append(value)
+                elif kind == "dish":
+                    dishes.append(value)
+                elif kind == "restriction":
+                    restrictions.append(value)
+                elif kind == "preference":
+                    preferences.append(value)
+                elif kind == "intent":
+                    intents.add(value)
+
+        # 替换类问题里"没有 X"的 X 正是要替换的食材
+        if "substitution" in intents:
+            ingredients += negated
+        ingredients = list(dict.fromkeys(ingredients))
+        target_dish = dishes[0] if dishes else ""
+        intent, confidence = self._classify(intents, ingredients, target_dish, restrictions, preferences)
+        if len(text) > MAX_CONFIDENT_LENGTH:
+            confidence *= 0.7
+        # 否定句式多样（"不想吃"、"除了…都行"等），规则只覆盖常见说法，有否定时交给 LLM
+        if any(cue in masked for cue in NEGATION_CUES + NEGATION_SUFFIXES):
+            confidence = min(confidence, NEGATION_CONFIDENCE_CAP)
+
+        return {
+            "intent": intent,
+            "ingredients": ingredients,
+            "restrictions": list(dict.fromkeys(restrictions)),
+            "preferences": list(dict.fromkeys(preferences)),
+            "target_dish": target_dish,
+            "question_type": "general",
+            "confidence": round(confidence, 2)
+        }
+
+    @staticmethod
+    def _is_negated(text: str, start: int, end: int) -> bool:
+        """食材所在分句中，食材之前有否定词或之后有"过敏"等否定后缀"""
+        clause_start = start
+        while clause_start > 0 and text[clause_start - 1] not in CLAUSE_BREAKS:
+            clause_start -= 1
+        clause_end = end
+        while clause_end < len(text) and text[clause_end] not in CLAUSE_BREAKS:
+            clause_end += 1
+        before, after = text[clause_start:start], text[end:clause_end]
+        return any(cue in before for cue in NEGATION_CUES) or any(cue in after for cue in NEGATION_SUFFIXES)
+
+    @staticmethod
+    def _classify(
+        intents: set,
+        ingredients: List[str],
+        target_dish: str,
+        restrictions: List[str],
+        preferences: List[str]
+    ) -> Tuple[str, float]:
+        """
+        有明确意图提示词且所需信息齐全时置信度最高；
+        只能从识别到的食材或菜名推断意图时置信度中等；什么都没识别到时为 0
+        """
+        explicit = [intent for intent in INTENT_PRIORITY if intent in intents]
+        if explicit:
+            intent = explicit[0]
+            if intent == "recommend_by_ingredients":
+                complete = bool(ingredients) or bool(restrictions) or bool(preferences)
+            elif intent == "substitution":
+                complete = bool(ingredients)
+            else:
+                complete = bool(target_dish)
+            confidence = 0.9 if complete else 0.5
+            # 多种意图同时出现时可能是复合问题
+            if len(explicit) > 1:
+                confidence -= 0.2
+            return intent, confidence
+
+        if target_dish:
+            return "cooking_guide", 0.6
+        if ingredients:
+            return "recommend_by_ingredients", 0.7
+        if restrictions or preferences:
+            return "recommend_by_ingredients", 0.5
+        return "general", 0.0
+
+
+class CatalogIntentParser:
+    """当前目录快照上的 RuleIntentParser；热加载在后台线程中构建好新快照后才替换，替换前继续使用旧词典"""
+
+    @property
+    def parser(self) -> RuleIntentParser:
+        from app.services.recipe_matcher import recipe_service
+
+        return recipe_service.intent_parser
+
+    def parse(self, message: str) -> Dict[str, Any]:
+        return self.parser.parse(message)
+
+
+intent_parser = CatalogIntentParser()
@@ -3,7 +3,7 @@ LangChain 版本的 NLP 服务
 使用 LCEL (LangChain Expression Language) 提供更智能的对话体验
 """
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from langchain_openai import ChatOpenAI
@@ -11,6 +11,10 @@ import json
 
 from app.services.vector_store import vector_store
 from app.services.recipe_matcher import recipe_service
+from app.services.hybrid_search import hybrid_search
+from app.services.search_executor import search_executor
+from app.services.intent_parser import intent_parser, INTENT_CONFIDENCE_THRESHOLD
+from app.services.intent_cache import intent_cache
 
 
 class LangChainNLPService:
@@ -90,7 +94,15 @@ class LangChainNLPService:
         return response_prompt | self.llm | StrOutputParser()
     
     async def parse_user_intent(self, message: str) -> Dict[str, Any]:
-        """解析用户意图 - 使用 LangChain LCEL"""
+        """解析用户意图 - 规则解析置信度足够时直接返回，其次查缓存，最后使用 LangChain LCEL"""
+        parsed = intent_parser.parse(message)
+        if parsed["confidence"] >= INTENT_CONFIDENCE_THRESHOLD:
+            return parsed
+        
+        cached = intent_cache.get(message)
+        if cached is not None:
+            return cached
+        
         try:
             result = await self.intent_chain.ainvoke({"input": message})
             
@@ -103,6 +115,7 @@ class LangChainNLPService:
                 "question_type": "general"
             }
             defaults.update(result)
+            intent_cache.put(message, defaults)
             return defaults
             
         except Exception as e:
@@ -110,38 +123,10 @@ class LangChainNLPService:
             return self._fallback_parse(message)
     
     def _fallback_parse(self, message: str) -> Dict[str, Any]:
-        """备用解析方法"""
-        result = {
-            "intent": "recommend_by_ingredients",
-            "ingredients": [],
-            "restrictions": [],
-            "preferences": [],
-            "target_dish": "",
-            "question_type": "general"
-        }
-        
-        common_ingredients = [
-            "番茄", "鸡蛋", "土豆", "猪肉", "鸡肉", "牛肉", "鱼", "虾",
-            "豆腐", "茄子", "青椒", "洋葱", "大蒜", "姜", "葱",
-            "胡萝卜", "白菜", "青菜", "黄瓜", "冬瓜", "南瓜",
-            "面条", "米饭", "粉丝", "腐竹"
-        ]
-        
-        for ingredient in common_ingredients:
-            if ingredient in message:
-                result["ingredients"].append(ingredient)
-        
-        if any(word in message for word in ["素食", "不吃肉", "素"]):
-            result["restrictions"].append("素食")
-        if "海鲜" in message and "过敏" in message:
-            result["restrictions"].append("无海鲜")
-        if "辣" in message and ("不吃" in message or "不要" in message):
-            result["restrictions"].append("无辣")
-        if "低碳水" in message or "低碳" in message:
-            result["restrictions"].append("低碳水")
-        if "减肥" in message:
-            result["restrictions"].append("减肥")
-        
+        """备用解析方法：LLM 不可用时使用规则解析结果，未识别出意图时按食材推荐处理"""
+        result = intent_parser.parse(message)
+        if result["intent"] == "general":
+            result["intent"] = "recommend_by_ingredients"
         return result
     
     async def search_recipes_with_rag(
@@ -149,27 +134,47 @@ class LangChainNLPService:
         query: str, 
         ingredients: Optional[List[str]] = None,
         restrictions: Optional[List[str]] = None,
-        top_k: int = 5
+        top_k: int = 5,
+        category: Optional[str] = None,
+        max_calories: Optional[float] = None
     ) -> List[Dict[str, Any]]:
-        """使用 RAG 搜索菜谱"""
+        """
+        使用 RAG 搜索菜谱
+        向量检索与 BM25 词法检索两路召回，按倒数排名融合（RRF）排序
+        饮食限制、分类、每份热量上限作为预过滤条件在两路中生效，候选一定满足全部条件
+        """
         if ingredients:
             search_query = f"包含{ '、'.join(ingredients)}的菜"
             if restrictions:
                 search_query += f"，{'、'.join(restrictions)}"
+            # 词法检索只用食材名，避免"包含""的菜"等模板字词参与打分
+            lexical_query = ' '.join(ingredients)
         else:
             search_query = query
+            lexical_query = query
         
         print(f"RAG Search Query: {search_query}")
         
-        vector_results = vector_store.search(search_query, n_results=top_k * 2)
+        # 向量化与检索是同步计算，放到检索线程池中执行
+        hits = await search_executor.run(
+            hybrid_search,
+            vector_store,
+            search_query,
+            lexical_query=lexical_query,
+            top_k=top_k,
+            restrictions=restrictions,
+            category=category,
+            max_calories=max_calories
+        )
+        
+        recipes_by_id = {
+            r.id: r for r in recipe_service.get_recipes_by_ids(hit['id'] for hit in hits)
+        }
         
         enriched_results = []
-        for vr in vector_results:
-            full_recipe = recipe_service.get_recipe_by_id(vr['id'])
+        for hit in hits:
+            full_recipe = recipes_by_id.get(hit['id'])
             if full_recipe:
-                if restrictions and self._check_restrictions(full_recipe, restrictions):
-                    continue
-                
                 matched_ingredients = []
                 ingredient_match_score = 0.0
                 if ingredients:
@@ -179,46 +184,44 @@ class LangChainNLPService:
                     if len(recipe_ingredients) > 0:
                         ingredient_match_score = len(matched_ingredients) / len(recipe_ingredients)
                 
-                # 综合评分：向量相似度 * 0.3 + 食材匹配得分 * 0.7
-                vector_sim = vr['similarity'] if vr.get('similarity') else 0
-                combined_score = vector_sim * 0.3 + ingredient_match_score * 0.7
-                
                 enriched_results.append({
                     "recipe": full_recipe,
-                    "match_score": round(combined_score, 3),
+                    "match_score": hit['score'],
                     "matched_ingredients": matched_ingredients,
                     "missing_ingredients": [],
-                    "vector_similarity": vector_sim,
+                    "vector_similarity": hit['vector_similarity'],
+                    "bm25_score": hit['bm25_score'],
                     "ingredient_match_score": round(ingredient_match_score, 3)
                 })
         
-        # 按综合评分排序
-        enriched_results.sort(key=lambda x: x['match_score'], reverse=True)
-        
-        return enriched_results[:top_k]
+        return enriched_results
     
-    def _check_restrictions(self, recipe, restrictions: List[str]) -> bool:
-        """检查菜谱是否违反饮食限制"""
-        restriction_keywords = {
-            "素食": ["肉类", "水产"],
-            "纯素": ["肉类", "水产", "蛋奶"],
-            "无海鲜": ["水产"],
-            "无辣": ["辣"],
-            "低碳水": ["主食"],
-            "减肥": ["高热量"]
-        }
+    def _response_inputs(
+        self,
+        user_message: str,
+        history: Optional[List[Dict]] = None,
+        recipes: Optional[List[Dict]] = None
+    ) -> Dict[str, str]:
+        """拼接回复 Chain 的输入：最近 5 条历史与前 3 个菜谱摘要"""
+        history_text = ""
+        if history:
+            for msg in history[-5:]:
+                if msg['role'] == 'user':
+                    history_text += f"用户: {msg['content']}\n"
+                else:
+                    history_text += f"助手: {msg['content']}\n"
         
-        for restriction in restrictions:
-            if restriction in restriction_keywords:
-                categories = restriction_keywords[restriction]
-                for ingredient in recipe.ingredients:
-                    if ingredient.category in categories:
-                        return True
-                for category in categories:
-                    if category in recipe.tags:
-                        return True
-                        
-        return False
+        input_text = user_message
+        if recipes:
+            input_text += "\n\n相关菜谱信息：\n"
+            for i, r in enumerate(recipes[:3], 1):
+                recipe = r['recipe']
+                recipe_name = recipe.name if hasattr(recipe, 'name') else recipe.get('name', '未知菜谱')
+                recipe_tags = recipe.tags if hasattr(recipe, 'tags') else recipe.get('tags', [])
+                recipe_difficulty = recipe.difficulty if hasattr(recipe, 'difficulty') else recipe.get('difficulty', '未知')
+                input_text += f"{i}. {recipe_name}：{', '.join(recipe_tags)}，难度{recipe_difficulty}\n"
+        
+        return {"history": history_text, "input": input_text}
     
     async def generate_response(
         self, 
@@ -228,35 +231,31 @@ class LangChainNLPService:
     ) -> str:
         """生成对话回复 - 使用 LangChain LCEL"""
         try:
-            history_text = ""
-            if history:
-                for msg in history[-5:]:
-                    if msg['role'] == 'user':
-                        history_text += f"用户: {msg['content']}\n"
-                    else:
-                        history_text += f"助手: {msg['content']}\n"
-            
-            input_text = user_message
-            if recipes:
-                input_text += "\n\n相关菜谱信息：\n"
-                for i, r in enumerate(recipes[:3], 1):
-                    recipe = r['recipe']
-                    recipe_name = recipe.name if hasattr(recipe, 'name') else recipe.get('name', '未知菜谱')
-                    recipe_tags = recipe.tags if hasattr(recipe, 'tags') else recipe.get('tags', [])
-                    recipe_difficulty = recipe.difficulty if hasattr(recipe, 'difficulty') else recipe.get('difficulty', '未知')
-                    input_text += f"{i}. {recipe_name}：{', '.join(recipe_tags)}，难度{recipe_difficulty}\n"
-            
-            response = await self.response_chain.ainvoke({
-                "history": history_text,
-                "input": input_text
-            })
-            
-            return response
+            return await self.response_chain.ainvoke(self._response_inputs(user_message, history, recipes))
             
         except Exception as e:
             print(f"Error generating response: {e}")
             return "抱歉，我暂时无法回答，请稍后再试。"
     
+    async def stream_response(
+        self,
+        user_message: str,
+        history: Optional[List[Dict]] = None,
+        recipes: Optional[List[Dict]] = None
+    ) -> AsyncIterator[str]:
+        """流式生成对话回复，逐段产出 LLM 输出的文本；尚未产出任何内容就出错时产出兜底回复"""
+        produced = False
+        try:
+            async for chunk in self.response_chain.astream(self._response_inputs(user_message, history, recipes)):
+                if chunk:
+                    produced = True
+                    yield chunk
+                    
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+            if not produced:
+                yield "抱歉，我暂时无法回答，请稍后再试。"
+    
     async def generate_substitution_suggestions(
         self, 
         ingredient: str, 
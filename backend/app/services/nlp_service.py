@@ -1,16 +1,92 @@
 import os
 import httpx
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import json
 
 
+# 共享 HTTP 客户端的连接池与超时配置
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+# HTTP/2 需要安装 httpx[http2]（h2 包），未安装时退回 HTTP/1.1
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").lower() in ("1", "true", "yes")
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+LLM_WRITE_TIMEOUT = float(os.getenv("LLM_WRITE_TIMEOUT", "10"))
+LLM_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "5"))
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
 class NLPService:
-    """DeepSeek AI 自然语言处理服务"""
+    """DeepSeek AI 自然语言处理服务
+    
+    所有请求共用一个 httpx.AsyncClient，连接保持复用，不再每次调用都重新建立 TCP + TLS 连接。
+    客户端在应用 lifespan 中创建和关闭；未经 lifespan 调用时（如脚本、测试）首次请求时创建。
+    """
     
     def __init__(self):
         self.api_key = os.getenv("DEEPSEEK_API_KEY", "sk-5c3ef01a3b5b475bafe94d5051c6ef0b")
-        self.api_base = "https://api.deepseek.com/v1"
+        self.api_base = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com/v1")
         self.model = "deepseek-chat"
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    async def start(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        """创建共享 HTTP 客户端；transport 用于替换底层传输（测试）"""
+        if self._client is not None:
+            return
+        
+        http2 = LLM_HTTP2
+        if http2 and not _http2_available():
+            print("LLM_HTTP2 is enabled but the h2 package is not installed, using HTTP/1.1")
+            http2 = False
+        
+        self._client = httpx.AsyncClient(
+            base_url=self.api_base,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                connect=LLM_CONNECT_TIMEOUT,
+                read=LLM_READ_TIMEOUT,
+                write=LLM_WRITE_TIMEOUT,
+                pool=LLM_POOL_TIMEOUT
+            ),
+            http2=http2,
+            transport=transport
+        )
+    
+    async def close(self):
+        """关闭共享 HTTP 客户端及其连接"""
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+    
+    async def _chat_completion(self, messages: List[Dict], temperature: float, max_tokens: int) -> httpx.Response:
+        """调用 /chat/completions"""
+        if self._client is None:
+            await self.start()
+        return await self._client.post(
+            "/chat/completions",
+            json={
+                "model": self.model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            }
+        )
     
     async def parse_user_intent(self, message: str) -> Dict[str, Any]:
         """
@@ -38,36 +114,23 @@ class NLPService:
         ]
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.api_base}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "temperature": 0.3,
-                        "max_tokens": 500
-                    }
-                )
+            response = await self._chat_completion(messages, temperature=0.3, max_tokens=500)
+            
+            if response.status_code == 200:
+                result = response.json()
+                content = result["choices"][0]["message"]["content"]
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    content = result["choices"][0]["message"]["content"]
-                    
-                    # 尝试解析JSON
-                    try:
-                        parsed = json.loads(content)
-                        return parsed
-                    except json.JSONDecodeError:
-                        # 如果返回的不是纯JSON，尝试提取
-                        return self._fallback_parse(message)
-                else:
-                    print(f"API Error: {response.status_code}")
+                # 尝试解析JSON
+                try:
+                    parsed = json.loads(content)
+                    return parsed
+                except json.JSONDecodeError:
+                    # 如果返回的不是纯JSON，尝试提取
                     return self._fallback_parse(message)
-                    
+            else:
+                print(f"API Error: {response.status_code}")
+                return self._fallback_parse(message)
+                
         except Exception as e:
             print(f"Error calling DeepSeek API: {e}")
             return self._fallback_parse(message)
@@ -158,27 +221,14 @@ class NLPService:
             messages[-1]["content"] += recipe_info
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.api_base}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "temperature": 0.7,
-                        "max_tokens": 1000
-                    }
-                )
+            response = await self._chat_completion(messages, temperature=0.7, max_tokens=1000)
+            
+            if response.status_code == 200:
+                result = response.json()
+                return result["choices"][0]["message"]["content"]
+            else:
+                return "抱歉，我暂时无法回答，请稍后再试。"
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    return result["choices"][0]["message"]["content"]
-                else:
-                    return "抱歉，我暂时无法回答，请稍后再试。"
-                    
         except Exception as e:
             print(f"Error generating response: {e}")
             return "抱歉，我遇到了技术问题，请稍后再试。"
@@ -194,30 +244,21 @@ class NLPService:
         prompt = f"用户在制作{recipe_name}时没有{ingredient}，请提供3-5个可以替代的食材，并简要说明为什么可以替代。"
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.api_base}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [
-                            {"role": "system", "content": "你是食材替代专家，请根据食材的口味、质地和功能提供合适的替代建议。"},
-                            {"role": "user", "content": prompt}
-                        ],
-                        "temperature": 0.7,
-                        "max_tokens": 500
-                    }
-                )
+            response = await self._chat_completion(
+                [
+                    {"role": "system", "content": "你是食材替代专家，请根据食材的口味、质地和功能提供合适的替代建议。"},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=500
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                return result["choices"][0]["message"]["content"]
+            else:
+                return f"建议尝试用相似的食材替代{ingredient}。"
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    return result["choices"][0]["message"]["content"]
-                else:
-                    return f"建议尝试用相似的食材替代{ingredient}。"
-                    
         except Exception as e:
             print(f"Error generating substitution: {e}")
             return f"建议尝试用相似的食材替代{ingredient}。"
@@ -5,6 +5,26 @@ from typing import Dict, List
 class NutritionCalculator:
     """营养计算器"""
     
+    # 饮食标准：热量按每份计算，蛋白质和碳水按整道菜计算
+    DIET_CRITERIA = {
+        "减肥": {
+            "max_calories": 300,
+            "description": "低热量、高纤维"
+        },
+        "增肌": {
+            "min_protein": 20,
+            "description": "高蛋白"
+        },
+        "低碳": {
+            "max_carbs": 10,
+            "description": "低碳水化合物"
+        },
+        "生酮": {
+            "max_carbs": 5,
+            "description": "极低碳水、高脂肪"
+        }
+    }
+    
     @staticmethod
     def calculate_daily_needs(
         weight: float = 60,
@@ -105,24 +125,7 @@ class NutritionCalculator:
         """
         calories_per_serving = nutrition.calories / servings
         
-        diet_criteria = {
-            "减肥": {
-                "max_calories": 300,
-                "description": "低热量、高纤维"
-            },
-            "增肌": {
-                "min_protein": 20,
-                "description": "高蛋白"
-            },
-            "低碳": {
-                "max_carbs": 10,
-                "description": "低碳水化合物"
-            },
-            "生酮": {
-                "max_carbs": 5,
-                "description": "极低碳水、高脂肪"
-            }
-        }
+        diet_criteria = NutritionCalculator.DIET_CRITERIA
         
         if diet_type not in diet_criteria:
             return {
@@ -0,0 +1,82 @@
+"""
+列式营养数据表 - 目录加载时把所有菜谱的营养数据展开为 float32 列
+范围查询与饮食筛选在整张表上做一次向量化比较
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.services.recipe_records import NUTRIENTS, RecipeColumns
+from app.services.nutrition_calc import NutritionCalculator
+
+
+# 可查询的列：总量、份数、每份含量
+COLUMNS = NUTRIENTS + ("servings",) + tuple(f"{n}_per_serving" for n in NUTRIENTS)
+
+
+class NutritionTable:
+    """列式营养数据表
+
+    行号与菜谱在目录中的位置一致。
+    """
+
+    def __init__(self, columns: RecipeColumns):
+        self.ids = columns.column("ids")
+
+        table: Dict[str, np.ndarray] = {}
+        for nutrient in NUTRIENTS:
+            table[nutrient] = columns.nutrition_column(nutrient)
+        table["servings"] = columns.column("servings").astype(np.float32)
+        for nutrient in NUTRIENTS:
+            table[f"{nutrient}_per_serving"] = table[nutrient] / table["servings"]
+
+        self.columns = table
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query(
+        self,
+        ranges: Dict[str, Tuple[Optional[float], Optional[float]]]
+    ) -> np.ndarray:
+        """
+        范围查询
+
+        Args:
+            ranges: {列名: (最小值, 最大值)}，边界包含，None 表示不限
+
+        Returns:
+            每行是否满足全部条件的布尔数组
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for column, (low, high) in ranges.items():
+            if column not in self.columns:
+                raise KeyError(column)
+            values = self.columns[column]
+            if low is not None:
+                mask &= values >= np.float32(low)
+            if high is not None:
+                mask &= values <= np.float32(high)
+        return mask
+
+    def diet_mask(self, diet_type: str) -> np.ndarray:
+        """按 NutritionCalculator 的饮食标准整表筛选"""
+        criteria = NutritionCalculator.DIET_CRITERIA.get(diet_type)
+        if criteria is None:
+            return np.ones(len(self), dtype=bool)
+
+        ranges = {}
+        if "max_calories" in criteria:
+            ranges["calories_per_serving"] = (None, criteria["max_calories"])
+        if "min_protein" in criteria:
+            ranges["protein"] = (criteria["min_protein"], None)
+        if "max_carbs" in criteria:
+            ranges["carbs"] = (None, criteria["max_carbs"])
+        return self.query(ranges)
+
+    def per_serving(self, pos: int) -> Dict[str, float]:
+        """获取某一行的每份营养数据"""
+        return {
+            nutrient: float(self.columns[f"{nutrient}_per_serving"][pos])
+            for nutrient in NUTRIENTS
+        }
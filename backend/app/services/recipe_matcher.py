@@ -1,52 +1,157 @@
-import json
-import os
-from typing import List, Dict, Any
+import asyncio
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple
+import numpy as np
 from app.models.recipe import Recipe, RecipeListItem
+from app.services.catalog import CatalogSnapshot, DEFAULT_DATA_PATH, load_catalog
+from app.services.recipe_records import IdIndex, RecipeColumns
+from app.services.ingredient_index import IngredientIndex
+from app.services.dietary_index import RestrictionIndex, restriction_field
+from app.services.nutrition_table import NutritionTable
+from app.services.facet_index import FacetIndex
+from app.services.bm25_index import BM25Index
+from app.services.intent_parser import RuleIntentParser
+
 
 
 class RecipeService:
-    def __init__(self):
-        self.recipes = self._load_recipes()
-        self.ingredient_index = self._build_ingredient_index()
-    
-    def _load_recipes(self) -> List[Recipe]:
-        """加载菜谱数据"""
-        data_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'recipes.json')
-        with open(data_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return [Recipe(**recipe) for recipe in data['recipes']]
-    
-    def _build_ingredient_index(self) -> Dict[str, List[int]]:
-        """构建食材索引"""
-        index = {}
-        for recipe in self.recipes:
-            for ingredient in recipe.ingredients:
-                ingredient_name = ingredient.name
-                if ingredient_name not in index:
-                    index[ingredient_name] = []
-                if recipe.id not in index[ingredient_name]:
-                    index[ingredient_name].append(recipe.id)
-        return index
+    def __init__(self, data_path: str = DEFAULT_DATA_PATH):
+        self.data_path = data_path
+        self._snapshot = load_catalog(data_path)
+        self._reload_lock = asyncio.Lock()
+    
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        """当前目录快照；需要多次读取时先取出快照，保证前后一致"""
+        return self._snapshot
+    
+    @property
+    def recipes(self) -> Sequence[Recipe]:
+        """完整菜谱序列，元素在首次访问时构建"""
+        return self._snapshot.recipes
+    
+    @property
+    def summaries(self) -> RecipeColumns:
+        """紧凑的菜谱摘要，遍历目录时使用"""
+        return self._snapshot.summaries
+    
+    @property
+    def version(self) -> str:
+        return self._snapshot.version
+    
+    @property
+    def id_to_position(self) -> IdIndex:
+        return self._snapshot.id_to_position
+    
+    @property
+    def ingredient_index(self) -> IngredientIndex:
+        return self._snapshot.ingredient_index
+    
+    @property
+    def restriction_index(self) -> RestrictionIndex:
+        return self._snapshot.restriction_index
+    
+    @property
+    def nutrition_table(self) -> NutritionTable:
+        return self._snapshot.nutrition_table
+    
+    @property
+    def facet_index(self) -> FacetIndex:
+        return self._snapshot.facet_index
+    
+    @property
+    def bm25_index(self) -> BM25Index:
+        return self._snapshot.bm25_index
+    
+    @property
+    def intent_parser(self) -> RuleIntentParser:
+        return self._snapshot.intent_parser
+    
+    async def reload(self, force: bool = False) -> bool:
+        """
+        热加载菜谱目录
+        在线程池中解析文件并构建索引，完成后原子替换快照
+        
+        Returns:
+            是否替换了快照（文件未变化且未强制时返回 False）
+        """
+        async with self._reload_lock:
+            skip_version = None if force else self._snapshot.version
+            snapshot = await asyncio.to_thread(load_catalog, self.data_path, skip_version)
+            if snapshot is None:
+                return False
+            # 旧快照的记录副本在进行中的请求全部释放它之后自动关闭
+            self._snapshot = snapshot
+            return True
     
     def get_all_recipes(self) -> List[RecipeListItem]:
         """获取所有菜谱列表"""
-        return [
-            RecipeListItem(
-                id=r.id,
-                name=r.name,
-                difficulty=r.difficulty,
-                time=r.time,
-                tags=r.tags
-            )
-            for r in self.recipes
-        ]
+        return [self._list_item(r) for r in self._snapshot.summaries]
+    
+    def list_recipes(
+        self,
+        tag: Optional[str] = None,
+        difficulty: Optional[str] = None,
+        cursor: Optional[int] = None,
+        limit: int = 50
+    ) -> Dict[str, Any]:
+        """
+        分页获取菜谱列表
+        通过标签、难度索引取出候选，多个条件时求交集
+        
+        Args:
+            tag: 标签筛选
+            difficulty: 难度筛选
+            cursor: 上一页返回的 next_cursor（即上一页最后一道菜的ID），None 表示第一页
+            limit: 每页数量
+        
+        Returns:
+            {"items": 本页菜谱, "next_cursor": 下一页游标（没有下一页时为 None）, "total": 满足条件的总数}
+        
+        Raises:
+            ValueError: 游标对应的菜谱不在当前目录中
+        """
+        snapshot = self._snapshot
+        after = None
+        if cursor is not None:
+            after = snapshot.id_to_position.get(cursor)
+            if after is None:
+                raise ValueError(f"无效的分页游标: {cursor}")
+        
+        index = snapshot.facet_index
+        positions = index.filter(tag, difficulty)
+        page = index.page(positions, after, limit + 1)
+        has_more = len(page) > limit
+        page = page[:limit].tolist()
+        
+        return {
+            "items": [self._list_item(snapshot.summaries[pos]) for pos in page],
+            "next_cursor": snapshot.summaries.ids[page[-1]] if has_more else None,
+            "total": index.size if positions is None else len(positions)
+        }
+    
+    @staticmethod
+    def _list_item(r) -> RecipeListItem:
+        return RecipeListItem(
+            id=r.id,
+            name=r.name,
+            difficulty=r.difficulty,
+            time=r.time,
+            tags=r.tags
+        )
     
-    def get_recipe_by_id(self, recipe_id: int) -> Recipe:
+    def get_recipe_by_id(self, recipe_id: int) -> Optional[Recipe]:
         """根据ID获取菜谱详情"""
-        for recipe in self.recipes:
-            if recipe.id == recipe_id:
-                return recipe
-        return None
+        snapshot = self._snapshot
+        pos = snapshot.id_to_position.get(recipe_id)
+        if pos is None:
+            return None
+        return snapshot.recipes[pos]
+    
+    def get_recipes_by_ids(self, recipe_ids: Iterable[int]) -> List[Recipe]:
+        """批量获取菜谱详情，保持输入顺序，跳过不存在的ID"""
+        snapshot = self._snapshot
+        positions = (snapshot.id_to_position.get(recipe_id) for recipe_id in recipe_ids)
+        return [snapshot.recipes[pos] for pos in positions if pos is not None]
     
     def search_by_ingredients(
         self, 
@@ -56,62 +161,160 @@ class RecipeService:
     ) -> List[Dict]:
         """
         基于食材匹配菜谱
-        使用简单的交集算法计算匹配分数
+        通过倒排索引生成候选并计数，堆选出 top_k
         """
         if restrictions is None:
             restrictions = []
         
+        snapshot = self._snapshot
+        ranked = snapshot.ingredient_index.top_k(
+            ingredients, top_k, self._restriction_filter(snapshot, restrictions)
+        )
+        return self._build_matches(snapshot, ranked, ingredients)
+    
+    def search_by_ingredients_batch(
+        self,
+        ingredient_lists: List[List[str]],
+        restrictions: Optional[List[List[str]]] = None,
+        top_k: int = 5
+    ) -> List[List[Dict]]:
+        """
+        批量基于食材匹配菜谱
+        所有查询通过一次稀疏矩阵乘法计数，结果与逐个调用 search_by_ingredients 相同
+        """
+        if restrictions is None:
+            restrictions = [[] for _ in ingredient_lists]
+        
+        snapshot = self._snapshot
         results = []
+        candidates = snapshot.ingredient_index.batch_match(ingredient_lists)
+        for ingredients, query_restrictions, (positions, counts) in zip(
+            ingredient_lists, restrictions, candidates
+        ):
+            ranked = snapshot.ingredient_index.rank(
+                positions, counts, top_k, self._restriction_filter(snapshot, query_restrictions)
+            )
+            results.append(self._build_matches(snapshot, ranked, ingredients))
         
-        for recipe in self.recipes:
-            # 检查饮食限制
-            if self._check_restrictions(recipe, restrictions):
-                continue
-            
-            # 计算匹配分数
-            recipe_ingredients = [i.name for i in recipe.ingredients]
-            matched = set(ingredients) & set(recipe_ingredients)
+        return results
+    
+    @staticmethod
+    def _restriction_filter(snapshot: CatalogSnapshot, restrictions: List[str]):
+        """把饮食限制编译为候选过滤函数，无限制时返回 None"""
+        index = snapshot.restriction_index
+        mask = index.query_mask(restrictions)
+        if not mask:
+            return None
+        return lambda pos: not index.violates(pos, mask)
+    
+    @staticmethod
+    def _build_matches(snapshot: CatalogSnapshot, ranked, ingredients: List[str]) -> List[Dict]:
+        """把 (位置, 分数) 列表转换为匹配结果"""
+        results = []
+        for pos, score in ranked:
+            recipe = snapshot.recipes[pos]
+            recipe_ingredients = list(dict.fromkeys(snapshot.summaries[pos].ingredient_names))
+            matched = [name for name in dict.fromkeys(ingredients) if name in recipe_ingredients]
             
-            if len(matched) > 0:
-                # 匹配分数 = 匹配食材数 / 所需食材总数
-                score = len(matched) / len(recipe_ingredients)
-                
-                results.append({
-                    "recipe": recipe,
-                    "match_score": score,
-                    "matched_ingredients": list(matched),
-                    "missing_ingredients": list(set(recipe_ingredients) - matched)
-                })
-        
-        # 按匹配分数排序
-        results.sort(key=lambda x: x["match_score"], reverse=True)
-        
-        return results[:top_k]
-    
-    def _check_restrictions(self, recipe: Recipe, restrictions: List[str]) -> bool:
-        """检查菜谱是否违反饮食限制"""
-        restriction_keywords = {
-            "素食": ["肉类", "水产"],
-            "纯素": ["肉类", "水产", "蛋奶"],
-            "无海鲜": ["水产"],
-            "无辣": ["辣"],
-            "低碳水": ["主食"],
-            "减肥": ["高热量"]
-        }
+            results.append({
+                "recipe": recipe,
+                "match_score": score,
+                "matched_ingredients": matched,
+                "missing_ingredients": [name for name in recipe_ingredients if name not in matched]
+            })
         
-        for restriction in restrictions:
-            if restriction in restriction_keywords:
-                categories = restriction_keywords[restriction]
-                # 检查食材分类
-                for ingredient in recipe.ingredients:
-                    if ingredient.category in categories:
-                        return True
-                # 检查标签
-                for category in categories:
-                    if category in recipe.tags:
-                        return True
-                        
-        return False
+        return results
+    
+    def vector_filters(
+        self,
+        restrictions: Optional[List[str]] = None,
+        category: Optional[str] = None,
+        max_calories: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        把饮食限制、菜谱分类、热量上限编译为向量检索的预过滤条件
+        条件作用在向量元数据上（每种限制一个布尔字段、分类、每份热量，见 RecipeVectorStore._prepare_recipe），
+        条件大小与目录规模无关，检索结果一定满足条件
+        
+        Args:
+            restrictions: 饮食限制
+            category: 菜谱分类
+            max_calories: 每份热量上限
+        
+        Returns:
+            RecipeVectorStore.search 的 filters 参数；没有任何条件时返回 None
+        """
+        conditions = []
+        
+        restriction_mask = self._snapshot.restriction_index.query_mask(restrictions)
+        for bit in range(restriction_mask.bit_length()):
+            if restriction_mask >> bit & 1:
+                conditions.append({restriction_field(bit): {"$eq": False}})
+        
+        if category:
+            conditions.append({"category": {"$eq": category}})
+        
+        if max_calories is not None:
+            conditions.append({"calories_per_serving": {"$lte": float(max_calories)}})
+        
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+    
+    def lexical_search(
+        self,
+        query: str,
+        top_k: int = 10,
+        restrictions: Optional[List[str]] = None,
+        category: Optional[str] = None,
+        max_calories: Optional[float] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        在菜名、食材、标签上做 BM25 检索，条件与 vector_filters 相同
+        
+        Returns:
+            [(菜谱ID, BM25分数)]，分数降序，只包含至少命中一个词项的菜谱
+        """
+        snapshot = self._snapshot
+        mask = self._constraint_mask(snapshot, restrictions, category, max_calories)
+        ids = snapshot.summaries.column("ids")
+        return [
+            (int(ids[pos]), score)
+            for pos, score in snapshot.bm25_index.top_k(query, top_k, mask)
+        ]
+    
+    @staticmethod
+    def _constraint_mask(
+        snapshot: CatalogSnapshot,
+        restrictions: Optional[List[str]],
+        category: Optional[str],
+        max_calories: Optional[float]
+    ) -> Optional[np.ndarray]:
+        """满足全部条件的菜谱（按目录位置的布尔数组），没有任何条件时返回 None"""
+        mask = None
+        
+        restriction_mask = snapshot.restriction_index.query_mask(restrictions)
+        if restriction_mask:
+            mask = snapshot.restriction_index.allowed_mask(restriction_mask)
+        
+        if category:
+            category_id = snapshot.summaries.labels.get_id(category)
+            matches = snapshot.summaries.column("category_ids") == (-1 if category_id is None else category_id)
+            mask = matches if mask is None else mask & matches
+        
+        if max_calories is not None:
+            matches = snapshot.nutrition_table.query({"calories_per_serving": (None, max_calories)})
+            mask = matches if mask is None else mask & matches
+        
+        return mask
+    
+    def violates_restrictions(self, recipe_id: int, mask: int) -> bool:
+        """检查菜谱是否违反饮食限制，mask 由 restriction_index.query_mask 生成"""
+        snapshot = self._snapshot
+        pos = snapshot.id_to_position.get(recipe_id)
+        return pos is not None and snapshot.restriction_index.violates(pos, mask)
     
     def get_substitutions(self, recipe_id: int, ingredient_name: str) -> List[str]:
         """获取食材替代建议"""
@@ -122,17 +325,11 @@ class RecipeService:
     
     def get_recipes_by_tag(self, tag: str) -> List[RecipeListItem]:
         """根据标签筛选菜谱"""
-        filtered = [r for r in self.recipes if tag in r.tags]
-        return [
-            RecipeListItem(
-                id=r.id,
-                name=r.name,
-                difficulty=r.difficulty,
-                time=r.time,
-                tags=r.tags
-            )
-            for r in filtered
-        ]
+        snapshot = self._snapshot
+        positions = snapshot.facet_index.tags.get(tag)
+        if positions is None:
+            return []
+        return [self._list_item(snapshot.summaries[pos]) for pos in positions.tolist()]
 
 
 # 单例模式
@@ -0,0 +1,244 @@
+"""
+紧凑菜谱目录 - 目录常驻内存的列式表示
+重复出现的短字符串（食材名、分类、标签、难度、时间）驻留为整数ID，
+每道菜的字段存放在按列排列的数组中，不为每条记录创建 Pydantic 模型。
+完整的 Recipe 模型（步骤、技巧、替代方案）只在接口返回时按需构建。
+"""
+import operator
+from array import array
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+
+NUTRIENTS = ("calories", "protein", "fat", "carbs", "fiber")
+
+
+class IngredientRef(NamedTuple):
+    name: str
+    category: str
+
+
+class StringTable:
+    """字符串驻留表：字符串 <-> 连续整数ID"""
+
+    __slots__ = ("ids", "values")
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def intern(self, value: str) -> int:
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = len(self.values)
+            self.ids[value] = string_id
+            self.values.append(value)
+        return string_id
+
+    def get_id(self, value: str) -> Optional[int]:
+        return self.ids.get(value)
+
+    def __getitem__(self, string_id: int) -> str:
+        return self.values[string_id]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class RecipeSummary:
+    """菜谱摘要视图，按需从 RecipeColumns 中解码字段"""
+
+    __slots__ = ("_columns", "_pos")
+
+    def __init__(self, columns: "RecipeColumns", pos: int):
+        self._columns = columns
+        self._pos = pos
+
+    @property
+    def id(self) -> int:
+        return self._columns.ids[self._pos]
+
+    @property
+    def name(self) -> str:
+        return self._columns.names[self._pos]
+
+    @property
+    def name_en(self) -> str:
+        return self._columns.names_en[self._pos]
+
+    @property
+    def category(self) -> str:
+        return self._columns.labels[self._columns.category_ids[self._pos]]
+
+    @property
+    def difficulty(self) -> str:
+        return self._columns.labels[self._columns.difficulty_ids[self._pos]]
+
+    @property
+    def time(self) -> str:
+        return self._columns.labels[self._columns.time_ids[self._pos]]
+
+    @property
+    def servings(self) -> int:
+        return self._columns.servings[self._pos]
+
+    @property
+    def ingredient_names(self) -> List[str]:
+        c = self._columns
+        start, end = c.ingredient_offsets[self._pos], c.ingredient_offsets[self._pos + 1]
+        return [c.ingredient_names[i] for i in c.ingredient_ids[start:end]]
+
+    @property
+    def ingredients(self) -> Tuple[IngredientRef, ...]:
+        c = self._columns
+        start, end = c.ingredient_offsets[self._pos], c.ingredient_offsets[self._pos + 1]
+        return tuple(
+            IngredientRef(c.ingredient_names[i], c.ingredient_categories[k])
+            for i, k in zip(c.ingredient_ids[start:end], c.ingredient_category_ids[start:end])
+        )
+
+    @property
+    def tags(self) -> List[str]:
+        c = self._columns
+        start, end = c.tag_offsets[self._pos], c.tag_offsets[self._pos + 1]
+        return [c.tags[t] for t in c.tag_ids[start:end]]
+
+
+class RecipeColumns:
+    """所有菜谱摘要的列式存储
+
+    变长字段（食材、标签）采用 CSR 形式：offsets[pos]..offsets[pos + 1] 为第 pos 道菜的区间。
+    """
+
+    def __init__(self):
+        # 驻留表
+        self.labels = StringTable()                  # 菜谱分类、难度、时间
+        self.ingredient_names = StringTable()
+        self.ingredient_categories = StringTable()
+        self.tags = StringTable()
+
+        # 定长列
+        self.ids = array('q')
+        self.names: List[str] = []
+        self.names_en: List[str] = []
+        self.category_ids = array('i')
+        self.difficulty_ids = array('i')
+        self.time_ids = array('i')
+        self.servings = array('i')
+        self.nutrition: Dict[str, array] = {n: array('f') for n in NUTRIENTS}
+
+        # 变长列
+        self.ingredient_offsets = array('q', [0])
+        self.ingredient_ids = array('i')
+        self.ingredient_category_ids = array('i')
+        self.tag_offsets = array('q', [0])
+        self.tag_ids = array('i')
+
+    def append(self, data: dict):
+        """追加一条原始 JSON 记录"""
+        self.ids.append(int(data['id']))
+        self.names.append(data['name'])
+        self.names_en.append(data.get('name_en', ''))
+        self.category_ids.append(self.labels.intern(data.get('category', '')))
+        self.difficulty_ids.append(self.labels.intern(data['difficulty']))
+        self.time_ids.append(self.labels.intern(data['time']))
+        self.servings.append(int(data['servings']))
+
+        nutrition = data['nutrition']
+        for nutrient in NUTRIENTS:
+            self.nutrition[nutrient].append(float(nutrition[nutrient]))
+
+        for ingredient in data['ingredients']:
+            self.ingredient_ids.append(self.ingredient_names.intern(ingredient['name']))
+            self.ingredient_category_ids.append(
+                self.ingredient_categories.intern(ingredient['category'])
+            )
+        self.ingredient_offsets.append(len(self.ingredient_ids))
+
+        for tag in data['tags']:
+            self.tag_ids.append(self.tags.intern(tag))
+        self.tag_offsets.append(len(self.tag_ids))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, pos: int) -> RecipeSummary:
+        if pos < 0:
+            pos += len(self.ids)
+        if not 0 <= pos < len(self.ids):
+            raise IndexError("recipe position out of range")
+        return RecipeSummary(self, pos)
+
+    def __iter__(self) -> Iterator[RecipeSummary]:
+        return (RecipeSummary(self, pos) for pos in range(len(self.ids)))
+
+    def column(self, name: str) -> np.ndarray:
+        """以 NumPy 数组（零拷贝视图）访问某一列"""
+        values = getattr(self, name)
+        dtype = {'q': np.int64, 'i': np.int32}[values.typecode]
+        return np.frombuffer(values, dtype=dtype)
+
+    def nutrition_column(self, nutrient: str) -> np.ndarray:
+        return np.frombuffer(self.nutrition[nutrient], dtype=np.float32)
+
+    def ingredient_positions(self) -> np.ndarray:
+        """每个食材条目所属的菜谱位置，与 ingredient_ids 等长"""
+        return np.repeat(
+            np.arange(len(self.ids), dtype=np.int32),
+            np.diff(self.column("ingredient_offsets"))
+        )
+
+    def tag_positions(self) -> np.ndarray:
+        """每个标签条目所属的菜谱位置，与 tag_ids 等长"""
+        return np.repeat(
+            np.arange(len(self.ids), dtype=np.int32),
+            np.diff(self.column("tag_offsets"))
+        )
+
+
+class IdIndex:
+    """菜谱ID -> 目录位置
+
+    ID 基本连续时使用直接寻址数组，否则退回字典。
+    ID 重复时取第一次出现的位置；任何整数类型（含 numpy 整数）都可以查找。
+    """
+
+    def __init__(self, ids: np.ndarray):
+        self._dense: Optional[np.ndarray] = None
+        self._map: Optional[Dict[int, int]] = None
+        self._size = len(ids)
+
+        if len(ids) and ids.min() >= 0 and ids.max() < 2 * len(ids) + 1024:
+            dense = np.full(int(ids.max()) + 1, -1, dtype=np.int32)
+            unique_ids, first = np.unique(ids, return_index=True)
+            dense[unique_ids] = first
+            self._dense = dense
+        else:
+            self._map = {}
+            for pos, recipe_id in enumerate(ids.tolist()):
+                self._map.setdefault(recipe_id, pos)
+
+    def get(self, recipe_id: int, default: Optional[int] = None) -> Optional[int]:
+        try:
+            recipe_id = operator.index(recipe_id)
+        except TypeError:
+            return default
+        if self._map is not None:
+            return self._map.get(recipe_id, default)
+        if not 0 <= recipe_id < len(self._dense):
+            return default
+        pos = int(self._dense[recipe_id])
+        return default if pos < 0 else pos
+
+    def __getitem__(self, recipe_id: int) -> int:
+        pos = self.get(recipe_id)
+        if pos is None:
+            raise KeyError(recipe_id)
+        return pos
+
+    def __contains__(self, recipe_id: int) -> bool:
+        return self.get(recipe_id) is not None
+
+    def __len__(self) -> int:
+        return self._size
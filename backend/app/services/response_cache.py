@@ -0,0 +1,109 @@
+"""
+响应缓存 - 静态菜谱接口的响应预先序列化为字节
+带强 ETag，支持 304 Not Modified；目录版本变化时整体失效
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+class CachedResponse:
+    """已编码的响应，headers 为需要随响应返回的附加响应头"""
+
+    __slots__ = ("body", "etag", "headers")
+
+    def __init__(self, body: bytes, headers: Optional[Dict[str, str]] = None):
+        self.body = body
+        self.headers = headers or {}
+        digest = hashlib.blake2b(body, digest_size=16)
+        for name, value in sorted(self.headers.items()):
+            digest.update(f"\n{name}:{value}".encode("utf-8"))
+        self.etag = '"' + digest.hexdigest() + '"'
+
+
+def encode_json(content: Any) -> bytes:
+    """与 FastAPI JSONResponse 相同的编码方式"""
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+class ResponseCache:
+    """按 (路由, 参数) 缓存编码后的响应，容量按条目数限制"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.version: Optional[str] = None
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_version(self, version: str):
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+
+    def get(
+        self,
+        version: str,
+        key: Hashable,
+        build: Callable[[], Any]
+    ) -> CachedResponse:
+        """
+        获取缓存的响应，未命中时调用 build 生成内容并编码
+
+        Args:
+            version: 目录版本，与缓存版本不一致时清空缓存
+            key: 路由与参数组成的缓存键
+            build: 生成响应内容的函数；返回 CachedResponse 时直接缓存（用于需要附加响应头的响应）
+        """
+        self._check_version(version)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+
+        content = build()
+        if isinstance(content, CachedResponse):
+            entry = content
+        else:
+            entry = CachedResponse(encode_json(content))
+        self._entries[key] = entry
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self):
+        """清空缓存"""
+        self._entries.clear()
+        self.version = None
+
+
+def cached_response(request: Request, entry: CachedResponse) -> Response:
+    """返回缓存的响应，If-None-Match 命中时返回 304"""
+    headers = {**entry.headers, "ETag": entry.etag}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        if "*" in tags or entry.etag in tags:
+            return Response(status_code=304, headers=headers)
+
+    return Response(
+        content=entry.body,
+        media_type="application/json",
+        headers=headers
+    )
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,105 @@
+"""
+检索执行器 - 在专用线程池中运行同步的向量检索，避免阻塞事件循环
+查询向量化与 ChromaDB / NumPy 检索都是同步的 CPU 或阻塞调用；
+async 接口把它们交给固定大小的线程池，线程数即并发上限，超出的请求排队等待
+
+通过环境变量 VECTOR_SEARCH_WORKERS 配置并发上限
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+VECTOR_SEARCH_WORKERS = int(os.getenv("VECTOR_SEARCH_WORKERS", "4"))
+
+
+class SearchExecutor:
+    """有界检索线程池，记录排队深度与等待时间"""
+
+    def __init__(self, max_workers: int = VECTOR_SEARCH_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self._wait_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="vector-search"
+                )
+            return self._executor
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """在线程池中执行 fn(*args, **kwargs)，等待期间事件循环继续处理其他请求"""
+        executor = self._get_executor()
+        submitted = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        def task():
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self._wait_seconds += time.perf_counter() - submitted
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self.active -= 1
+            with self._lock:
+                self.completed += 1
+            return result
+
+        def on_done(future):
+            # 调用方被取消（或线程池关闭）时尚未开始的任务不会执行，在这里出队
+            if future.cancelled():
+                with self._lock:
+                    self.queued -= 1
+                    self.cancelled += 1
+
+        future = executor.submit(task)
+        future.add_done_callback(on_done)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait: bool = True):
+        """
+        关闭线程池，尚未开始的任务取消，下次提交任务时重新创建
+        wait 为 True 时阻塞到执行中的任务结束，在事件循环中请用 asyncio.to_thread 调用
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self.completed + self.failed + self.active
+            return {
+                "max_workers": self.max_workers,
+                "active": self.active,
+                "queued": self.queued,
+                "peak_queued": self.peak_queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "avg_wait_ms": round(self._wait_seconds * 1000 / started, 2) if started else 0.0
+            }
+
+
+search_executor = SearchExecutor()
@@ -0,0 +1,704 @@
+"""
+向量索引后端 - RecipeVectorStore 通过统一接口访问底层向量库
+- chroma: ChromaDB 持久化集合
+- numpy: 进程内的 float32 向量矩阵，一次矩阵向量乘积 + argpartition 精确求 top-k，
+         数据保存为单个快照文件
+通过环境变量 VECTOR_BACKEND 选择，默认 chroma
+
+numpy 后端可通过 VECTOR_QUANTIZATION（int8 / pq）只在内存中保留量化向量，
+原始向量存放在快照旁的 .npy 文件中按需映射，只读取粗排候选做精排
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.vector_quantization import QUANTIZERS
+
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "./vector_index.npz")
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+
+# 量化检索时粗排保留 n_results * RERANK_FACTOR 条（至少 RERANK_MIN 条）交给精排
+RERANK_FACTOR = 10
+RERANK_MIN = 100
+
+# 批量查询时每块分数矩阵的元素数上限（float32，约 64MB）
+QUERY_BLOCK_SCORES = 16 * 1024 * 1024
+
+# 重写量化索引的原始向量文件时每块复制的元素数（float32，约 64MB）
+COPY_BLOCK_VALUES = 16 * 1024 * 1024
+
+
+# query 可返回的附加字段，与 ChromaDB 的 include 参数同名
+DEFAULT_INCLUDE = ("metadatas", "documents")
+
+
+class VectorHit(NamedTuple):
+    """一条检索结果，未请求的字段为 None"""
+    id: str
+    similarity: float
+    metadata: Optional[Dict[str, Any]]
+    document: Optional[str]
+
+
+class VectorBackend:
+    """向量库后端接口，相似度均为余弦相似度"""
+
+    location: str = ""
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def add(
+        self,
+        ids: List[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]]
+    ):
+        """写入向量，ID 已存在时覆盖"""
+        raise NotImplementedError
+
+    def query(
+        self,
+        embedding: Sequence[float],
+        n_results: int,
+        where: Optional[Dict] = None,
+        include: Sequence[str] = DEFAULT_INCLUDE
+    ) -> List[VectorHit]:
+        """返回相似度最高的 n_results 条，相似度降序；include 为空时只返回 ID 与相似度"""
+        raise NotImplementedError
+
+    def query_many(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        n_results: int,
+        where: Optional[Dict] = None,
+        include: Sequence[str] = DEFAULT_INCLUDE
+    ) -> List[List[VectorHit]]:
+        """多个查询向量共用同一过滤条件，按顺序返回每个查询的结果"""
+        return [self.query(embedding, n_results, where, include) for embedding in embeddings]
+
+    def get(self, id: str) -> Optional[Dict[str, Any]]:
+        """按 ID 获取元数据"""
+        raise NotImplementedError
+
+    def sample_metadata(self) -> Optional[Dict[str, Any]]:
+        """任取一条元数据，用于检查索引的字段是否为当前版本；向量库为空时返回 None"""
+        raise NotImplementedError
+
+    def list_metadata(self) -> Dict[str, Dict[str, Any]]:
+        """全部 ID -> 元数据，用于增量同步时比对"""
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]):
+        """删除指定 ID，不存在的 ID 忽略"""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class ChromaBackend(VectorBackend):
+    """ChromaDB 后端"""
+
+    def __init__(self, persist_directory: str = CHROMA_PERSIST_DIRECTORY):
+        import chromadb
+        from chromadb.config import Settings
+
+        self.location = persist_directory
+
+        # 初始化 ChromaDB 客户端  本地持久化模式 数据保存在 ./chroma_db
+        self.client = chromadb.PersistentClient(
+            path=persist_directory,
+            settings=Settings(
+                anonymized_telemetry=False
+            )
+        )
+
+        # 获取或创建集合
+        self.collection = self.client.get_or_create_collection(
+            name="recipes",
+            metadata={"hnsw:space": "cosine"}  # 使用余弦相似度
+        )
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def add(self, ids, embeddings, documents, metadatas):
+        # 单次写入条数受 ChromaDB 限制，分批提交
+        batch_size = self.client.get_max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            self.collection.upsert(
+                ids=ids[start:end],
+                embeddings=[list(map(float, e)) for e in embeddings[start:end]],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end]
+            )
+
+    def query(self, embedding, n_results, where=None, include=DEFAULT_INCLUDE):
+        return self.query_many([embedding], n_results, where, include)[0]
+
+    def query_many(self, embeddings, n_results, where=None, include=DEFAULT_INCLUDE):
+        # ChromaDB 不接受空的 $in 列表，这类条件不会有任何结果
+        if len(embeddings) == 0 or (where and _matches_nothing(where)):
+            return [[] for _ in range(len(embeddings))]
+
+        # 全部查询向量一次提交；只取需要的字段，未请求的元数据和文本不会从 ChromaDB 复制出来
+        results = self.collection.query(
+            query_embeddings=[list(map(float, embedding)) for embedding in embeddings],
+            n_results=n_results,
+            where=where,
+            include=list(include) + ["distances"]
+        )
+
+        batch = []
+        for q, ids in enumerate(results['ids']):
+            metadatas = results['metadatas'][q] if "metadatas" in include else None
+            documents = results['documents'][q] if "documents" in include else None
+            # 转换距离为相似度分数 (余弦距离 -> 余弦相似度)
+            batch.append([
+                VectorHit(
+                    recipe_id,
+                    1 - results['distances'][q][i],
+                    None if metadatas is None else metadatas[i],
+                    None if documents is None else documents[i]
+                )
+                for i, recipe_id in enumerate(ids)
+            ])
+        return batch
+
+    def get(self, id):
+        result = self.collection.get(ids=[id], include=["metadatas"])
+        if result['ids']:
+            return result['metadatas'][0]
+        return None
+
+    def sample_metadata(self):
+        result = self.collection.get(limit=1, include=["metadatas"])
+        return result['metadatas'][0] if result['ids'] else None
+
+    def list_metadata(self):
+        result = self.collection.get(include=["metadatas"])
+        return dict(zip(result['ids'], result['metadatas']))
+
+    def delete(self, ids):
+        batch_size = self.client.get_max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            self.collection.delete(ids=ids[start:start + batch_size])
+
+    def clear(self):
+        self.client.delete_collection("recipes")
+        self.collection = self.client.create_collection(
+            name="recipes",
+            metadata={"hnsw:space": "cosine"}
+        )
+
+
+def _matches_nothing(where: Dict) -> bool:
+    """where 中是否有必然不成立的空 $in 条件（只检查顶层与 $and）"""
+    for key, condition in where.items():
+        if key == "$and":
+            if any(_matches_nothing(sub) for sub in condition):
+                return True
+        elif isinstance(condition, dict) and condition.get("$in") == []:
+            return True
+    return False
+
+
+class _MetadataColumns:
+    """元数据按字段展开的列，过滤条件在整列上向量化求值；首次按某字段过滤时构建"""
+
+    def __init__(self, metadatas: List[Dict[str, Any]]):
+        self._metadatas = metadatas
+        self._columns: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def get(self, field: str) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (值, 是否存在)；全部为布尔值时值为 bool 数组，全部为数值时为 float64 数组，否则为 object 数组"""
+        column = self._columns.get(field)
+        if column is None:
+            raw = [m.get(field, _MISSING) for m in self._metadatas]
+            present = np.fromiter((v is not _MISSING for v in raw), dtype=bool, count=len(raw))
+            if present.any() and all(_is_bool(v) for v, p in zip(raw, present) if p):
+                values = np.fromiter((p and bool(v) for v, p in zip(raw, present)), dtype=bool, count=len(raw))
+            elif all(_is_number(v) for v, p in zip(raw, present) if p):
+                values = np.array([v if p else np.nan for v, p in zip(raw, present)], dtype=np.float64)
+            else:
+                values = np.empty(len(raw), dtype=object)
+                values[:] = [v if p else None for v, p in zip(raw, present)]
+            column = (values, present)
+            self._columns[field] = column
+        return column
+
+
+class _IndexState(NamedTuple):
+    """NumpyBackend 的一份不可变数据，写入时整体替换"""
+    ids: List[str]
+    embeddings: np.ndarray          # (n, dim) float32，行已归一化；量化时为磁盘映射
+    documents: List[str]
+    metadatas: List[Dict[str, Any]]
+    rows: Dict[str, int]
+    columns: _MetadataColumns
+    codes: Optional[np.ndarray]     # 量化后的向量，未启用量化时为 None
+    quantizer: Any
+
+
+def _make_state(ids, embeddings, documents, metadatas, rows=None, codes=None, quantizer=None) -> _IndexState:
+    if rows is None:
+        rows = {recipe_id: row for row, recipe_id in enumerate(ids)}
+    return _IndexState(
+        ids, embeddings, documents, metadatas, rows, _MetadataColumns(metadatas), codes, quantizer
+    )
+
+
+def _empty_state(dim: int = 0) -> _IndexState:
+    return _make_state([], np.zeros((0, dim), dtype=np.float32), [], [])
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+_MISSING = object()
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+
+
+def _is_bool(value) -> bool:
+    return isinstance(value, (bool, np.bool_))
+
+
+_COMPARATORS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+
+def _compare(values: np.ndarray, present: np.ndarray, op: str, value) -> np.ndarray:
+    """对一列求值单个比较条件，缺少该字段的行不满足任何条件"""
+    if op not in _COMPARATORS:
+        raise ValueError(f"不支持的过滤运算符: {op}")
+
+    if values.dtype != object:
+        # 布尔列只与布尔值比较、数值列只与数值比较，与 ChromaDB 一致
+        same_type = _is_bool if values.dtype == bool else _is_number
+        if op in ("$in", "$nin"):
+            result = np.isin(values, [v for v in value if same_type(v)])
+            if op == "$nin":
+                result = ~result
+        elif same_type(value):
+            result = _COMPARATORS[op](values, value)
+        else:
+            result = np.full(len(values), op == "$ne")
+        return result & present
+
+    if op in ("$in", "$nin"):
+        value = set(value)
+    rows = np.flatnonzero(present)
+    result = np.zeros(len(values), dtype=bool)
+    result[rows] = [bool(_COMPARATORS[op](values[row], value)) for row in rows.tolist()]
+    return result
+
+
+def _where_mask(columns: _MetadataColumns, where: Dict, size: int) -> np.ndarray:
+    """按 ChromaDB 的 where 语法计算每行是否满足条件"""
+    mask = np.ones(size, dtype=bool)
+    for key, condition in where.items():
+        if key == "$and":
+            for sub in condition:
+                mask &= _where_mask(columns, sub, size)
+        elif key == "$or":
+            any_mask = np.zeros(size, dtype=bool)
+            for sub in condition:
+                any_mask |= _where_mask(columns, sub, size)
+            mask &= any_mask
+        else:
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            values, present = columns.get(key)
+            for op, value in condition.items():
+                mask &= _compare(values, present, op, value)
+    return mask
+
+
+class NumpyBackend(VectorBackend):
+    """进程内向量索引
+
+    全部向量保存在一个连续的 float32 矩阵中，查询是一次矩阵向量乘积，
+    再用 argpartition 选出 top-k，结果与暴力检索完全一致。
+
+    启用量化时内存中只保留量化向量：先在全部（满足过滤条件的）行上用量化向量粗排，
+    再对候选行读取原始向量精确打分。量化参数在第一次写入时拟合，之后的增量写入沿用；
+    clear 后重新拟合。
+    """
+
+    def __init__(self, path: str = VECTOR_INDEX_PATH, quantization: str = VECTOR_QUANTIZATION):
+        if quantization != "none" and quantization not in QUANTIZERS:
+            raise ValueError(f"未知的向量量化方式: {quantization}，可选: none, {', '.join(QUANTIZERS)}")
+        self.location = path
+        self.quantization = quantization
+        self.vectors_path = os.path.splitext(path)[0] + ".vectors.npy"
+        self._lock = threading.Lock()
+        self._state = self._load(path) if os.path.exists(path) else _empty_state()
+
+    def _load(self, path: str) -> _IndexState:
+        with np.load(path, allow_pickle=False) as data:
+            records = json.loads(data["records"].tobytes().decode("utf-8"))
+            if "embeddings" in data:
+                embeddings = np.ascontiguousarray(data["embeddings"], dtype=np.float32)
+                codes, quantizer = None, None
+            else:
+                embeddings = np.load(self.vectors_path, mmap_mode="r")
+                # 增量写入在保存快照前中断时，向量文件末尾可能多出未登记的行
+                embeddings = embeddings[:len(records["ids"])] if len(embeddings) > len(records["ids"]) else embeddings
+                saved = data["quantization"].tobytes().decode("utf-8")
+                quantizer = QUANTIZERS[saved].from_arrays(
+                    {key[len("quantizer_"):]: data[key] for key in data.files if key.startswith("quantizer_")}
+                )
+                codes = np.asarray(data["codes"], order=quantizer.order)
+
+        if codes is not None and saved != self.quantization:
+            # 快照的量化方式与当前配置不同：取回原始向量，按当前配置重新量化
+            embeddings = np.array(embeddings)
+            codes, quantizer = None, None
+        if codes is None and self.quantization != "none" and len(records["ids"]):
+            quantizer = QUANTIZERS[self.quantization].fit(embeddings)
+            codes = quantizer.encode(embeddings)
+
+        return _make_state(
+            records["ids"],
+            embeddings,
+            records["documents"],
+            records["metadatas"],
+            codes=codes,
+            quantizer=quantizer
+        )
+
+    def _save(self, state: _IndexState, write_vectors: bool = True) -> _IndexState:
+        """
+        写入临时文件后替换，读取方不会看到写了一半的快照
+        启用量化时原始向量单独写入 vectors_path，返回改为映射该文件的状态；
+        write_vectors 为 False 表示 vectors_path 已由 _rewrite_vectors 更新
+        """
+        records = json.dumps(
+            {"ids": state.ids, "documents": state.documents, "metadatas": state.metadatas},
+            ensure_ascii=False
+        ).encode("utf-8")
+        arrays = {"records": np.frombuffer(records, dtype=np.uint8)}
+        directory = os.path.dirname(os.path.abspath(self.location))
+        os.makedirs(directory, exist_ok=True)
+
+        if state.codes is None:
+            arrays["embeddings"] = state.embeddings
+        else:
+            if write_vectors:
+                tmp_path = self.vectors_path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, np.ascontiguousarray(state.embeddings, dtype=np.float32))
+                os.replace(tmp_path, self.vectors_path)
+
+            arrays["codes"] = state.codes
+            arrays["quantization"] = np.frombuffer(state.quantizer.name.encode("utf-8"), dtype=np.uint8)
+            for key, value in state.quantizer.arrays().items():
+                arrays["quantizer_" + key] = value
+
+        tmp_path = self.location + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, self.location)
+
+        if state.codes is None or not write_vectors:
+            return state
+        return state._replace(embeddings=np.load(self.vectors_path, mmap_mode="r"))
+
+    def count(self) -> int:
+        return len(self._state.ids)
+
+    def add(self, ids, embeddings, documents, metadatas):
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+
+        with self._lock:
+            state = self._state
+            if len(state.ids) and vectors.shape[1] != state.embeddings.shape[1]:
+                raise ValueError(
+                    f"向量维度不一致: {vectors.shape[1]} != {state.embeddings.shape[1]}"
+                )
+
+            if state.quantizer is not None and self._maps_vectors_file(state):
+                self._add_quantized(state, ids, vectors, documents, metadatas)
+                return
+
+            new_ids = list(state.ids)
+            new_documents = list(state.documents)
+            new_metadatas = list(state.metadatas)
+            rows = dict(state.rows)
+            matrix = np.empty(
+                (len(new_ids) + len(set(ids) - rows.keys()), vectors.shape[1]),
+                dtype=np.float32
+            )
+            if len(state.ids):
+                matrix[:len(state.ids)] = state.embeddings
+
+            written = []
+            for recipe_id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+                row = rows.get(recipe_id)
+                if row is None:
+                    row = len(new_ids)
+                    rows[recipe_id] = row
+                    new_ids.append(recipe_id)
+                    new_documents.append(document)
+                    new_metadatas.append(metadata)
+                else:
+                    new_documents[row] = document
+                    new_metadatas[row] = metadata
+                matrix[row] = vector
+                written.append(row)
+
+            # 只为本次写入的行计算量化向量
+            codes, quantizer = None, state.quantizer
+            if self.quantization != "none":
+                if quantizer is None:
+                    quantizer = QUANTIZERS[self.quantization].fit(matrix)
+                    codes = quantizer.encode(matrix)
+                else:
+                    codes = np.empty(
+                        (len(matrix),) + state.codes.shape[1:], dtype=state.codes.dtype, order=quantizer.order
+                    )
+                    codes[:len(state.ids)] = state.codes
+                    codes[written] = quantizer.encode(matrix[written])
+
+            new_state = _make_state(
+                new_ids, matrix, new_documents, new_metadatas, rows, codes=codes, quantizer=quantizer
+            )
+            self._state = self._save(new_state)
+
+    def _maps_vectors_file(self, state: _IndexState) -> bool:
+        """state 的原始向量是否就是 vectors_path 的磁盘映射"""
+        return (
+            isinstance(state.embeddings, np.memmap)
+            and os.path.exists(self.vectors_path)
+            and os.path.samefile(state.embeddings.filename, self.vectors_path)
+        )
+
+    def _add_quantized(self, state: _IndexState, ids, vectors, documents, metadatas):
+        """
+        量化索引的增量写入：原始向量按块从旧文件复制到新文件，再写入变化的行与新行，
+        不把整个向量文件读入内存；量化向量与记录仍整体写入快照
+        """
+        new_ids = list(state.ids)
+        new_documents = list(state.documents)
+        new_metadatas = list(state.metadatas)
+        rows = dict(state.rows)
+
+        updated: Dict[int, np.ndarray] = {}
+        for recipe_id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+            row = rows.get(recipe_id)
+            if row is None:
+                row = len(new_ids)
+                rows[recipe_id] = row
+                new_ids.append(recipe_id)
+                new_documents.append(document)
+                new_metadatas.append(metadata)
+            else:
+                new_documents[row] = document
+                new_metadatas[row] = metadata
+            updated[row] = vector
+
+        embeddings = self._rewrite_vectors(
+            state.embeddings, np.arange(len(state.ids)), len(new_ids), updated
+        )
+
+        written = sorted(updated)
+        codes = np.empty(
+            (len(new_ids),) + state.codes.shape[1:], dtype=state.codes.dtype, order=state.quantizer.order
+        )
+        codes[:len(state.ids)] = state.codes
+        codes[written] = state.quantizer.encode(np.stack([updated[row] for row in written]))
+
+        new_state = _make_state(
+            new_ids, embeddings, new_documents, new_metadatas, rows, codes=codes, quantizer=state.quantizer
+        )
+        self._state = self._save(new_state, write_vectors=False)
+
+    def _rewrite_vectors(
+        self,
+        source: np.ndarray,
+        keep: np.ndarray,
+        count: int,
+        updated: Dict[int, np.ndarray]
+    ) -> np.ndarray:
+        """
+        写出新的 vectors_path 并返回它的磁盘映射：前 len(keep) 行依次取 source 的 keep 行，
+        再按新行号写入 updated（len(keep) 之后的行必须全部在 updated 中）
+
+        先写临时文件再替换，进行中的查询继续映射旧文件，不会读到写了一半的行；
+        按块复制，内存占用与向量总数无关。快照写入前中断时，加载会忽略多出的行，
+        改写的行由下一次同步按内容哈希修正。
+        """
+        dim = source.shape[1]
+        tmp_path = self.vectors_path + ".tmp"
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(count, dim))
+        block = max(1, COPY_BLOCK_VALUES // max(dim, 1))
+        for start in range(0, len(keep), block):
+            stop = min(start + block, len(keep))
+            out[start:stop] = source[keep[start:stop]]
+        for row, vector in updated.items():
+            out[row] = vector
+        out.flush()
+        del out
+        os.replace(tmp_path, self.vectors_path)
+        return np.load(self.vectors_path, mmap_mode="r")
+
+    def query(self, embedding, n_results, where=None, include=DEFAULT_INCLUDE):
+        state = self._state
+        if not state.ids or n_results <= 0:
+            return []
+
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+
+        # 过滤条件在打分之前求值，候选只来自满足条件的行
+        rows = np.flatnonzero(_where_mask(state.columns, where, len(state.ids))) if where else None
+
+        # 量化向量粗排，只保留候选行
+        if state.codes is not None:
+            codes = state.codes if rows is None else state.codes[rows]
+            shortlist = max(n_results * RERANK_FACTOR, RERANK_MIN)
+            if shortlist < len(codes):
+                candidates = np.sort(np.argpartition(-state.quantizer.scores(codes, query), shortlist - 1)[:shortlist])
+                rows = candidates if rows is None else rows[candidates]
+
+        scores = (state.embeddings if rows is None else state.embeddings[rows]) @ query
+
+        k = min(n_results, len(scores))
+        if k == 0:
+            return []
+
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        # 按相似度降序，同分按写入顺序
+        top = top[np.lexsort((top, -scores[top]))]
+        top_rows = top if rows is None else rows[top]
+
+        with_metadata = "metadatas" in include
+        with_document = "documents" in include
+        return [
+            VectorHit(
+                state.ids[row],
+                float(score),
+                state.metadatas[row] if with_metadata else None,
+                state.documents[row] if with_document else None
+            )
+            for row, score in zip(top_rows.tolist(), scores[top].tolist())
+        ]
+
+    def query_many(self, embeddings, n_results, where=None, include=DEFAULT_INCLUDE):
+        state = self._state
+        queries = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        # 量化索引的粗排按单个查询进行
+        if state.codes is not None or not state.ids or n_results <= 0 or len(queries) == 0:
+            return [self.query(q, n_results, where, include) for q in queries]
+
+        rows = np.flatnonzero(_where_mask(state.columns, where, len(state.ids))) if where else None
+        matrix = state.embeddings if rows is None else state.embeddings[rows]
+        k = min(n_results, len(matrix))
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        with_metadata = "metadatas" in include
+        with_document = "documents" in include
+        batch = []
+        # 分块做矩阵乘积，限制 查询数 x 行数 的分数矩阵大小
+        chunk = max(1, QUERY_BLOCK_SCORES // len(matrix))
+        for start in range(0, len(queries), chunk):
+            scores = queries[start:start + chunk] @ matrix.T
+            if k < scores.shape[1]:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+            for row_scores, row_top in zip(scores, top):
+                # 按相似度降序，同分按写入顺序
+                row_top = row_top[np.lexsort((row_top, -row_scores[row_top]))]
+                top_rows = row_top if rows is None else rows[row_top]
+                batch.append([
+                    VectorHit(
+                        state.ids[row],
+                        float(score),
+                        state.metadatas[row] if with_metadata else None,
+                        state.documents[row] if with_document else None
+                    )
+                    for row, score in zip(top_rows.tolist(), row_scores[row_top].tolist())
+                ])
+        return batch
+
+    def get(self, id):
+        state = self._state
+        row = state.rows.get(id)
+        return None if row is None else state.metadatas[row]
+
+    def sample_metadata(self):
+        state = self._state
+        return state.metadatas[0] if state.metadatas else None
+
+    def list_metadata(self):
+        state = self._state
+        return dict(zip(state.ids, state.metadatas))
+
+    def delete(self, ids):
+        with self._lock:
+            state = self._state
+            removed = {state.rows[i] for i in ids if i in state.rows}
+            if not removed:
+                return
+
+            keep = np.array([row for row in range(len(state.ids)) if row not in removed], dtype=np.int64)
+            # 量化索引的原始向量按块复制到新文件，不整体读入内存
+            incremental = state.codes is not None and len(keep) > 0 and self._maps_vectors_file(state)
+            if incremental:
+                embeddings = self._rewrite_vectors(state.embeddings, keep, len(keep), {})
+            else:
+                embeddings = np.ascontiguousarray(state.embeddings[keep])
+            keep_rows = keep.tolist()
+            new_state = _make_state(
+                [state.ids[row] for row in keep_rows],
+                embeddings,
+                [state.documents[row] for row in keep_rows],
+                [state.metadatas[row] for row in keep_rows],
+                codes=None if state.codes is None else np.asarray(state.codes[keep], order=state.quantizer.order),
+                quantizer=state.quantizer
+            )
+            self._state = self._save(new_state, write_vectors=not incremental)
+
+    def clear(self):
+        with self._lock:
+            self._state = _empty_state()
+            for path in (self.location, self.vectors_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+BACKENDS = {
+    "chroma": ChromaBackend,
+    "numpy": NumpyBackend,
+}
+
+
+def create_backend(name: str = VECTOR_BACKEND) -> VectorBackend:
+    """按名称创建向量库后端"""
+    if name not in BACKENDS:
+        raise ValueError(f"未知的向量库后端: {name}，可选: {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
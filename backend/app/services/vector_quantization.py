@@ -0,0 +1,127 @@
+"""
+向量量化 - 压缩 NumpyBackend 常驻内存的向量，查询时先用压缩向量粗排，再用原始 float32 向量精排
+- int8: 每一维按该维最大绝对值线性映射到 [-127, 127]，每条向量 dim 字节（float32 的 1/4）
+- pq: 乘积量化，向量切成 PQ_SUBSPACES 段，每段用 256 个中心之一的编号表示，每条向量 PQ_SUBSPACES 字节
+"""
+from typing import Dict
+
+import numpy as np
+
+
+# 乘积量化的分段数，需整除向量维度；384 维时每段 8 维、每条向量 48 字节
+PQ_SUBSPACES = 48
+PQ_CENTROIDS = 256
+
+# 训练乘积量化中心时最多使用的样本数（每个中心约 64 个样本）
+PQ_TRAIN_SAMPLES = 16384
+
+# int8 粗排时每批反量化的行数，批缓冲区保持在 CPU 缓存附近
+SCORE_CHUNK_ROWS = 8192
+
+
+class ScalarQuantizer:
+    """int8 标量量化"""
+
+    name = "int8"
+    # 量化向量的内存布局：按行存放
+    order = "C"
+
+    def __init__(self, scale: np.ndarray):
+        self.scale = np.asarray(scale, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray) -> "ScalarQuantizer":
+        scale = np.abs(vectors).max(axis=0) / 127 if len(vectors) else np.ones(vectors.shape[1])
+        scale[scale == 0] = 1
+        return cls(scale)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """近似内积：code · (query * scale)"""
+        weights = query * self.scale
+        out = np.empty(len(codes), dtype=np.float32)
+        buffer = np.empty((min(len(codes), SCORE_CHUNK_ROWS), codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_CHUNK_ROWS):
+            chunk = codes[start:start + SCORE_CHUNK_ROWS]
+            block = buffer[:len(chunk)]
+            np.copyto(block, chunk, casting="unsafe")
+            out[start:start + len(chunk)] = block @ weights
+        return out
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {"scale": self.scale}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "ScalarQuantizer":
+        return cls(arrays["scale"])
+
+
+class ProductQuantizer:
+    """乘积量化，用查询与各段中心的内积查表求近似内积"""
+
+    name = "pq"
+    # 按列存放，查表时每一段的编号连续读取
+    order = "F"
+
+    def __init__(self, codebooks: np.ndarray):
+        # (分段数, 中心数, 每段维数)
+        self.codebooks = np.asarray(codebooks, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, subspaces: int = PQ_SUBSPACES) -> "ProductQuantizer":
+        from sklearn.cluster import KMeans
+
+        n, dim = vectors.shape
+        if dim % subspaces:
+            raise ValueError(f"向量维度 {dim} 不能被乘积量化分段数 {subspaces} 整除")
+        if n > PQ_TRAIN_SAMPLES:
+            sample = np.random.default_rng(0).choice(n, PQ_TRAIN_SAMPLES, replace=False)
+            vectors = vectors[np.sort(sample)]
+
+        codebooks = np.zeros((subspaces, PQ_CENTROIDS, dim // subspaces), dtype=np.float32)
+        for j, part in enumerate(np.split(vectors, subspaces, axis=1)):
+            distinct = np.unique(part, axis=0)
+            if len(distinct) == 0:
+                continue
+            if len(distinct) <= PQ_CENTROIDS:
+                # 不同取值不超过中心数（如语料小、SVD 维度补零）时直接作为中心，无损；
+                # 多余的中心重复第一个，编码时 argmin 取第一个，不会被用到
+                codebooks[j, :len(distinct)] = distinct
+                codebooks[j, len(distinct):] = distinct[0]
+            else:
+                kmeans = KMeans(n_clusters=PQ_CENTROIDS, n_init=1, max_iter=20, random_state=0)
+                codebooks[j] = kmeans.fit(part).cluster_centers_
+        return cls(codebooks)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), len(self.codebooks)), dtype=np.uint8, order=self.order)
+        for j, (part, centroids) in enumerate(zip(np.split(vectors, len(self.codebooks), axis=1), self.codebooks)):
+            # 最近中心：|x - c|² 中与 c 有关的部分为 |c|² - 2 x·c
+            distances = (centroids ** 2).sum(axis=1) - 2 * part @ centroids.T
+            codes[:, j] = distances.argmin(axis=1)
+        return codes
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """近似内积：Σ_j query_j · centroid[j, code_j]"""
+        parts = np.stack(np.split(query, len(self.codebooks)))
+        table = np.einsum("jkd,jd->jk", self.codebooks, parts).astype(np.float32)
+        codes = np.asarray(codes, order=self.order)
+        out = np.zeros(len(codes), dtype=np.float32)
+        for j in range(len(self.codebooks)):
+            out += np.take(table[j], codes[:, j])
+        return out
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "ProductQuantizer":
+        return cls(arrays["codebooks"])
+
+
+QUANTIZERS = {
+    "int8": ScalarQuantizer,
+    "pq": ProductQuantizer,
+}
@@ -1,43 +1,61 @@
 """
-向量数据库服务 - 使用 ChromaDB 存储和检索菜谱向量
-提供语义搜索能力
+向量数据库服务 - 存储和检索菜谱向量
+提供语义搜索能力，底层向量库见 vector_backends（ChromaDB 或进程内 NumPy 索引）
 """
-import chromadb
-from chromadb.config import Settings
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+import hashlib
 import json
-import os
-from app.services.embedding_service import embedding_service
+import time
+from app.services.embedding_service import embedding_service, normalize_query
+from app.services.dietary_index import RESTRICTION_RULES, recipe_restriction_mask, restriction_field
+from app.services.vector_backends import VectorBackend, create_backend
+from app.services.search_executor import search_executor
+
+
+# recipe_service.vector_filters 生成的条件用到的元数据字段；旧版本建立的索引中没有，需要重新同步
+FILTER_FIELDS = ('category', 'calories_per_serving') + tuple(
+    restriction_field(bit) for bit in range(len(RESTRICTION_RULES))
+)
 
 
 class RecipeVectorStore:
     """菜谱向量数据库"""
     
-    def __init__(self, persist_directory: str = "./chroma_db"):
+    def __init__(self, backend: Optional[VectorBackend] = None):
         """
         初始化向量数据库
         
         Args:
-            persist_directory: 数据持久化目录
+            backend: 向量库后端，默认按 VECTOR_BACKEND 配置创建
         """
-        self.persist_directory = persist_directory
-        
-        # 初始化 ChromaDB 客户端  本地持久化模式 数据保存在 ./chroma_db
-        self.client = chromadb.PersistentClient(
-            path=persist_directory,
-            settings=Settings(
-                anonymized_telemetry=False
-            )
-        )
+        self.backend = backend or create_backend()
+        self.persist_directory = self.backend.location
         
-        # 获取或创建集合
-        self.collection = self.client.get_or_create_collection(
-            name="recipes",
-            metadata={"hnsw:space": "cosine"}  # 使用余弦相似度
-        )
+        # 解码后的元数据缓存：ID -> (内容哈希, 元数据)，内容哈希变化时重新解码
+        self._decoded: Dict[str, Tuple[Optional[str], Dict[str, Any]]] = {}
+        # 索引缺少的过滤字段，首次检查时计算，写入后重新检查
+        self._missing_fields: Optional[List[str]] = None
         
-        print(f"Vector store initialized. Collection: recipes")
-        print(f"Current document count: {self.collection.count()}")
+        print(f"Vector store initialized. Backend: {type(self.backend).__name__}")
+        print(f"Current document count: {self.count()}")
+    
+    def count(self) -> int:
+        """向量库中的菜谱数量"""
+        return self.backend.count()
+    
+    def missing_filter_fields(self) -> List[str]:
+        """索引元数据中缺少的过滤字段；不为空时按条件过滤不会有任何结果，需要重新同步"""
+        if self._missing_fields is None:
+            metadata = self.backend.sample_metadata()
+            self._missing_fields = [] if metadata is None else [f for f in FILTER_FIELDS if f not in metadata]
+        return self._missing_fields
+    
+    def _check_filters(self, filters: Optional[Dict]):
+        if filters and self.missing_filter_fields():
+            raise RuntimeError(
+                f"向量索引缺少过滤字段 {', '.join(self._missing_fields[:3])} 等，"
+                "请运行 python -m app.services.init_vector_db 重新同步"
+            )
     
     def add_recipes(self, recipes: List[Dict[str, Any]]) -> bool:
         """
@@ -58,24 +76,9 @@ class RecipeVectorStore:
             documents = []
             metadatas = []
             
+            model_id = embedding_service.model_id
             for recipe in recipes:
-                recipe_id = str(recipe['id'])
-                
-                # 生成向量文本
-                doc_text = embedding_service.embed_recipe(recipe)
-                
-                # 准备元数据
-                metadata = {
-                    'id': recipe['id'],
-                    'name': recipe['name'],
-                    'category': recipe.get('category', ''),
-                    'difficulty': recipe.get('difficulty', ''),
-                    'time': recipe.get('time', ''),
-                    'tags': json.dumps(recipe.get('tags', [])),
-                    'ingredients': json.dumps([i['name'] for i in recipe.get('ingredients', [])]),
-                    'calories': recipe.get('nutrition', {}).get('calories', 0)
-                }
-                
+                recipe_id, doc_text, metadata = self._prepare_recipe(recipe, model_id)
                 ids.append(recipe_id)
                 documents.append(doc_text)
                 metadatas.append(metadata)
@@ -85,12 +88,8 @@ class RecipeVectorStore:
             embeddings = embedding_service.embed_texts(documents)
             
             # 添加到数据库
-            self.collection.add(
-                ids=ids,
-                embeddings=embeddings,
-                documents=documents,
-                metadatas=metadatas
-            )
+            self.backend.add(ids, embeddings, documents, metadatas)
+            self._missing_fields = None
             
             print(f"Added {len(recipes)} recipes to vector store")
             return True
@@ -99,11 +98,111 @@ class RecipeVectorStore:
             print(f"Error adding recipes to vector store: {e}")
             return False
     
+    @staticmethod
+    def _prepare_recipe(recipe: Dict[str, Any], model_id: str) -> Tuple[str, str, Dict[str, Any]]:
+        """生成 (ID, 向量文本, 元数据)，元数据中带有内容哈希"""
+        # 生成向量文本
+        doc_text = embedding_service.embed_recipe(recipe)
+        
+        # 准备元数据
+        metadata = {
+            'id': recipe['id'],
+            'name': recipe['name'],
+            'category': recipe.get('category', ''),
+            'difficulty': recipe.get('difficulty', ''),
+            'time': recipe.get('time', ''),
+            'tags': json.dumps(recipe.get('tags', [])),
+            'ingredients': json.dumps([i['name'] for i in recipe.get('ingredients', [])]),
+            'calories': recipe.get('nutrition', {}).get('calories', 0),
+            # 以下字段供 recipe_service.vector_filters 生成的预过滤条件使用
+            'calories_per_serving': recipe.get('nutrition', {}).get('calories', 0) / (recipe.get('servings') or 1)
+        }
+        restriction_mask = recipe_restriction_mask(recipe)
+        for bit in range(len(RESTRICTION_RULES)):
+            metadata[restriction_field(bit)] = bool(restriction_mask >> bit & 1)
+        
+        # 内容哈希覆盖向量文本、元数据和向量化模型，任何一项变化都需要重新写入
+        content = json.dumps(
+            {'model': model_id, 'document': doc_text, 'metadata': metadata},
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        metadata['content_hash'] = hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+        
+        return str(recipe['id']), doc_text, metadata
+    
+    def sync_recipes(self, recipes: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        增量同步：与向量库中的内容哈希比对，只为新增或变化的菜谱生成向量，并删除已移除的菜谱
+        耗时与变化的菜谱数成正比
+        
+        Args:
+            recipes: 菜谱目录中的全部菜谱
+            
+        Returns:
+            同步报告：新增、更新、删除、未变化的数量与各阶段耗时（毫秒）
+        """
+        timings = {}
+        start = time.perf_counter()
+        
+        stored = {
+            recipe_id: metadata.get('content_hash')
+            for recipe_id, metadata in self.backend.list_metadata().items()
+        }
+        
+        model_id = embedding_service.model_id
+        ids, documents, metadatas = [], [], []
+        seen = set()
+        added = updated = unchanged = 0
+        for recipe in recipes:
+            recipe_id, doc_text, metadata = self._prepare_recipe(recipe, model_id)
+            seen.add(recipe_id)
+            if recipe_id not in stored:
+                added += 1
+            elif stored[recipe_id] == metadata['content_hash']:
+                unchanged += 1
+                continue
+            else:
+                updated += 1
+            ids.append(recipe_id)
+            documents.append(doc_text)
+            metadatas.append(metadata)
+        removed = [recipe_id for recipe_id in stored if recipe_id not in seen]
+        timings['diff_ms'] = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        if ids:
+            embeddings = embedding_service.embed_texts(documents)
+        timings['embed_ms'] = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        if ids:
+            self.backend.add(ids, embeddings, documents, metadatas)
+            self._missing_fields = None
+        timings['upsert_ms'] = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        if removed:
+            self.backend.delete(removed)
+            for recipe_id in removed:
+                self._decoded.pop(recipe_id, None)
+        timings['delete_ms'] = (time.perf_counter() - start) * 1000
+        
+        return {
+            'added': added,
+            'updated': updated,
+            'deleted': len(removed),
+            'unchanged': unchanged,
+            **{name: round(value, 1) for name, value in timings.items()}
+        }
+    
     def search(
         self, 
         query: str, 
         n_results: int = 5,
-        filters: Optional[Dict] = None
+        filters: Optional[Dict] = None,
+        include_metadata: bool = False,
+        include_document: bool = False
     ) -> List[Dict[str, Any]]:
         """
         语义搜索菜谱
@@ -111,57 +210,132 @@ class RecipeVectorStore:
         Args:
             query: 搜索查询（自然语言）
             n_results: 返回结果数量
-            filters: 过滤条件，如 {"category": "川菜"}
+            filters: ChromaDB where 语法的过滤条件，如 {"category": "川菜"}，
+                     在向量库内先过滤再取 top-k；饮食限制等条件可用 recipe_service.vector_filters 生成
+            include_metadata: 是否附带菜名、分类、标签、食材等元数据（来自解码缓存）
+            include_document: 是否附带向量文本 vector_text
             
         Returns:
-            匹配的菜谱列表
+            [{"id", "similarity", ...}]，默认只有 ID 与相似度，完整菜谱从 recipe_service 获取
+            
+        Raises:
+            RuntimeError: 带过滤条件查询、但索引由旧版本建立而缺少过滤字段时
         """
+        self._check_filters(filters)
         try:
             # 生成查询向量
             query_embedding = embedding_service.embed_text(query)
             
-            # 构建 where 条件
-            where_clause = None
-            if filters:
-                where_clause = filters
-            
-            # 执行搜索
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                where=where_clause,
-                include=["metadatas", "documents", "distances"]
+            hits = self.backend.query(
+                query_embedding, n_results, filters, self._include(include_metadata, include_document)
             )
-            
-            # 格式化结果
-            formatted_results = []
-            if results['ids'] and results['ids'][0]:
-                for i, recipe_id in enumerate(results['ids'][0]):
-                    metadata = results['metadatas'][0][i]
-                    distance = results['distances'][0][i]
-                    
-                    # 转换距离为相似度分数 (余弦距离 -> 余弦相似度)
-                    similarity = 1 - distance
-                    
-                    formatted_results.append({
-                        'id': int(metadata['id']),
-                        'name': metadata['name'],
-                        'category': metadata['category'],
-                        'difficulty': metadata['difficulty'],
-                        'time': metadata['time'],
-                        'tags': json.loads(metadata['tags']),
-                        'ingredients': json.loads(metadata['ingredients']),
-                        'calories': metadata['calories'],
-                        'similarity': round(similarity, 3),
-                        'vector_text': results['documents'][0][i]
-                    })
-            
-            return formatted_results
+            return self._format_hits(hits, include_metadata, include_document)
             
         except Exception as e:
             print(f"Error searching vector store: {e}")
             return []
     
+    def search_many(
+        self,
+        queries: List[str],
+        n_results: int = 5,
+        filters: Optional[Dict] = None,
+        include_metadata: bool = False,
+        include_document: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量语义搜索：全部查询一次向量化、一次提交给向量库，结果与逐个调用 search 相同
+        
+        Args:
+            queries: 查询列表
+            n_results / filters / include_metadata / include_document: 同 search，所有查询共用
+            
+        Returns:
+            与 queries 一一对应的结果列表
+        """
+        if not queries:
+            return []
+        self._check_filters(filters)
+        try:
+            embeddings = embedding_service.embed_texts([normalize_query(q) for q in queries])
+            batch = self.backend.query_many(
+                embeddings, n_results, filters, self._include(include_metadata, include_document)
+            )
+            return [self._format_hits(hits, include_metadata, include_document) for hits in batch]
+            
+        except Exception as e:
+            print(f"Error searching vector store: {e}")
+            return [[] for _ in queries]
+    
+    @staticmethod
+    def _include(include_metadata: bool, include_document: bool) -> List[str]:
+        include = []
+        if include_metadata:
+            include.append("metadatas")
+        if include_document:
+            include.append("documents")
+        return include
+    
+    def _format_hits(self, hits, include_metadata: bool, include_document: bool) -> List[Dict[str, Any]]:
+        formatted_results = []
+        for hit in hits:
+            result = {'id': int(hit.id), 'similarity': round(hit.similarity, 3)}
+            if include_metadata:
+                result.update(self._decode_metadata(hit.id, hit.metadata))
+            if include_document:
+                result['vector_text'] = hit.document
+            formatted_results.append(result)
+        return formatted_results
+    
+    async def asearch(
+        self,
+        query: str,
+        n_results: int = 5,
+        filters: Optional[Dict] = None,
+        include_metadata: bool = False,
+        include_document: bool = False
+    ) -> List[Dict[str, Any]]:
+        """search 的异步版本，在检索线程池中执行，供 async 接口调用"""
+        return await search_executor.run(
+            self.search, query, n_results, filters, include_metadata, include_document
+        )
+    
+    async def asearch_many(
+        self,
+        queries: List[str],
+        n_results: int = 5,
+        filters: Optional[Dict] = None,
+        include_metadata: bool = False,
+        include_document: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """search_many 的异步版本，在检索线程池中执行"""
+        return await search_executor.run(
+            self.search_many, queries, n_results, filters, include_metadata, include_document
+        )
+    
+    def _decode_metadata(self, recipe_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        把向量库中的元数据转换为结构化字段，tags、ingredients 的 JSON 每个版本只解析一次
+        返回的字典为缓存中的对象，调用方不要修改
+        """
+        content_hash = metadata.get('content_hash')
+        cached = self._decoded.get(recipe_id)
+        if cached is not None and content_hash is not None and cached[0] == content_hash:
+            return cached[1]
+        
+        decoded = {
+            'id': int(metadata['id']),
+            'name': metadata['name'],
+            'category': metadata['category'],
+            'difficulty': metadata['difficulty'],
+            'time': metadata['time'],
+            'tags': json.loads(metadata['tags']),
+            'ingredients': json.loads(metadata['ingredients']),
+            'calories': metadata['calories']
+        }
+        self._decoded[recipe_id] = (content_hash, decoded)
+        return decoded
+    
     def search_by_ingredients(
         self, 
         ingredients: List[str], 
@@ -180,7 +354,7 @@ class RecipeVectorStore:
         # 构建语义查询
         query = f"包含{ '、'.join(ingredients)}的菜"
         
-        return self.search(query, n_results=n_results)
+        return self.search(query, n_results=n_results, include_metadata=True)
     
     def get_recipe_by_id(self, recipe_id: int) -> Optional[Dict]:
         """
@@ -193,23 +367,10 @@ class RecipeVectorStore:
             菜谱信息
         """
         try:
-            result = self.collection.get(
-                ids=[str(recipe_id)],
-                include=["metadatas"]
-            )
+            metadata = self.backend.get(str(recipe_id))
             
-            if result['ids']:
-                metadata = result['metadatas'][0]
-                return {
-                    'id': int(metadata['id']),
-                    'name': metadata['name'],
-                    'category': metadata['category'],
-                    'difficulty': metadata['difficulty'],
-                    'time': metadata['time'],
-                    'tags': json.loads(metadata['tags']),
-                    'ingredients': json.loads(metadata['ingredients']),
-                    'calories': metadata['calories']
-                }
+            if metadata:
+                return dict(self._decode_metadata(str(recipe_id), metadata))
             return None
             
         except Exception as e:
@@ -218,11 +379,9 @@ class RecipeVectorStore:
     
     def delete_all(self):
         """清空所有数据（谨慎使用）"""
-        self.client.delete_collection("recipes")
-        self.collection = self.client.create_collection(
-            name="recipes",
-            metadata={"hnsw:space": "cosine"}
-        )
+        self.backend.clear()
+        self._decoded.clear()
+        self._missing_fields = None
         print("Vector store cleared")
 
 
@@ -0,0 +1,70 @@
+"""
+批量检索吞吐评测 - 比较 RecipeVectorStore.search_many 与逐个调用 search 的每秒查询数
+
+查询为随机抽取的菜名文本；向量化模型与向量库建在临时目录中，不改动已有数据
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.batch_search --data /path/to/catalog.jsonl --backend numpy --queries 1000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.catalog import DEFAULT_DATA_PATH, iter_recipe_records
+from app.services.embedding_service import embedding_service
+from app.services.vector_backends import ChromaBackend, NumpyBackend
+from app.services.vector_store import RecipeVectorStore
+
+
+# 拟合向量化模型时最多使用的菜谱数
+FIT_SAMPLE = 10000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data', default=DEFAULT_DATA_PATH)
+    parser.add_argument('--backend', choices=['numpy', 'chroma'], default='numpy')
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    recipes = list(iter_recipe_records(args.data))
+    rng = np.random.default_rng(0)
+    queries = [r['name'] + f" {i}" for i, r in enumerate(rng.choice(recipes, args.queries))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        embedding_service.method = 'tfidf'
+        embedding_service.model_path = os.path.join(tmp, 'model.npz')
+        sample = rng.choice(len(recipes), min(FIT_SAMPLE, len(recipes)), replace=False)
+        embedding_service.fit([embedding_service.embed_recipe(recipes[i]) for i in sample])
+
+        if args.backend == 'numpy':
+            backend = NumpyBackend(os.path.join(tmp, 'index.npz'))
+        else:
+            backend = ChromaBackend(os.path.join(tmp, 'chroma'))
+        store = RecipeVectorStore(backend)
+        store.add_recipes(recipes)
+
+        # 两种方式都从空的查询向量缓存开始
+        embedding_service.query_cache.clear()
+        start = time.perf_counter()
+        single = [store.search(q, n_results=args.k) for q in queries]
+        single_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = store.search_many(queries, n_results=args.k)
+        batch_time = time.perf_counter() - start
+
+        same = np.mean([[r['id'] for r in a] == [r['id'] for r in b] for a, b in zip(single, batch)])
+        print(f"\n{args.backend}, {len(recipes)} recipes, {len(queries)} queries, top {args.k}\n")
+        print(f"{'method':14}{'total s':>10}{'queries/s':>12}")
+        print(f"{'search loop':14}{single_time:>10.2f}{len(queries) / single_time:>12.0f}")
+        print(f"{'search_many':14}{batch_time:>10.2f}{len(queries) / batch_time:>12.0f}")
+        print(f"\nidentical results: {same:.1%}")
+
+
+if __name__ == "__main__":
+    main()
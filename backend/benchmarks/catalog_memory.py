@@ -0,0 +1,97 @@
+"""
+菜谱目录内存报告 - 在合成的大规模目录上比较两种内存表示
+
+before: 原实现，每道菜一个完整的 Pydantic Recipe 模型（按样本测量后线性外推）
+after:  紧凑列式目录 (RecipeColumns) 与全部索引
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.catalog_memory --recipes 500000
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from app.models.recipe import Recipe
+from app.services.catalog import DEFAULT_DATA_PATH, load_catalog
+
+
+def generate_catalog(path: str, n: int, seed: int = 0):
+    """以内置菜谱为模板生成 n 道菜的 JSON Lines 目录"""
+    with open(DEFAULT_DATA_PATH, encoding='utf-8') as f:
+        templates = json.load(f)['recipes']
+
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(n):
+            recipe = dict(rng.choice(templates))
+            other = rng.choice(templates)
+            recipe['id'] = i + 1
+            recipe['name'] = f"{recipe['name']}{i}"
+            recipe['name_en'] = f"{recipe['name_en']} #{i}"
+            # 混入另一道菜的部分食材和标签，避免记录完全重复
+            recipe['ingredients'] = recipe['ingredients'] + other['ingredients'][:2]
+            recipe['tags'] = list(dict.fromkeys(recipe['tags'] + other['tags'][:1]))
+            f.write(json.dumps(recipe, ensure_ascii=False) + '\n')
+
+
+def measure(fn):
+    """返回 (结果, 常驻内存字节, 峰值内存字节, 耗时秒)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak, elapsed
+
+
+def load_pydantic(path: str, limit: int):
+    recipes = []
+    with open(path, 'rb') as f:
+        for i, line in enumerate(f):
+            if i >= limit:
+                break
+            recipes.append(Recipe(**json.loads(line)))
+    return recipes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=500000)
+    parser.add_argument('--sample', type=int, default=20000,
+                        help='before 方案实际构建的菜谱数，结果线性外推')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'recipes.jsonl')
+        print(f"Generating {args.recipes} recipes...")
+        generate_catalog(path, args.recipes)
+        print(f"Catalog file: {os.path.getsize(path) / 1e6:.1f} MB")
+
+        sample = min(args.sample, args.recipes)
+        recipes, current, peak, elapsed = measure(lambda: load_pydantic(path, sample))
+        scale = args.recipes / sample
+        before = current * scale
+        del recipes
+
+        snapshot, after, after_peak, after_elapsed = measure(lambda: load_catalog(path))
+        assert len(snapshot.summaries) == args.recipes
+
+        print()
+        print(f"{'':28}{'retained':>12}{'peak':>12}{'bytes/recipe':>14}{'load':>10}")
+        print(f"{'before (Pydantic, extrap.)':28}{before / 1e6:>10.0f}MB{peak * scale / 1e6:>10.0f}MB"
+              f"{before / args.recipes:>14.0f}{elapsed * scale:>9.1f}s")
+        print(f"{'after (columns + indexes)':28}{after / 1e6:>10.0f}MB{after_peak / 1e6:>10.0f}MB"
+              f"{after / args.recipes:>14.0f}{after_elapsed:>9.1f}s")
+        print(f"\nReduction: {before / after:.1f}x")
+        print("(load times are measured under tracemalloc and are slower than normal)")
+
+
+if __name__ == "__main__":
+    main()
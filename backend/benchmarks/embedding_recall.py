@@ -0,0 +1,72 @@
+"""
+向量检索召回评测 - 在标注查询集上比较各向量化方法的 recall@k
+
+查询集: benchmarks/embedding_queries.json（查询 -> 相关菜谱ID）
+recall@k: 前 k 个结果中命中的相关菜谱数 / min(k, 相关菜谱数)，对全部查询取平均
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.embedding_recall --k 1 5 10
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.catalog import DEFAULT_DATA_PATH
+from app.services.embedding_service import EmbeddingService
+
+
+QUERIES_PATH = os.path.join(os.path.dirname(__file__), 'embedding_queries.json')
+
+
+def recall_at_k(service: EmbeddingService, documents, ids, queries, ks):
+    """返回 {k: recall@k}"""
+    doc_vectors = service.embed_texts(documents)
+    query_vectors = service.embed_texts([q['query'] for q in queries])
+    ranking = np.argsort(-(query_vectors @ doc_vectors.T), axis=1, kind='stable')
+
+    recalls = {}
+    for k in ks:
+        total = 0.0
+        for q, row in zip(queries, ranking):
+            relevant = set(q['relevant'])
+            hits = sum(1 for pos in row[:k] if ids[pos] in relevant)
+            total += hits / min(k, len(relevant))
+        recalls[k] = total / len(queries)
+    return recalls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 5, 10])
+    args = parser.parse_args()
+
+    with open(DEFAULT_DATA_PATH, encoding='utf-8') as f:
+        recipes = json.load(f)['recipes']
+    with open(QUERIES_PATH, encoding='utf-8') as f:
+        queries = json.load(f)['queries']
+
+    ids = [r['id'] for r in recipes]
+    with tempfile.TemporaryDirectory() as tmp:
+        services = {
+            'hash': EmbeddingService('hash'),
+            'tfidf': EmbeddingService('tfidf', os.path.join(tmp, 'model.npz')),
+        }
+        documents = [services['hash'].embed_recipe(r) for r in recipes]
+
+        start = time.perf_counter()
+        services['tfidf'].fit(documents)
+        fit_time = time.perf_counter() - start
+
+        print(f"\n{len(queries)} queries, {len(recipes)} recipes (tfidf fit: {fit_time:.2f}s)\n")
+        print(f"{'method':10}" + ''.join(f"{f'recall@{k}':>12}" for k in args.k))
+        for name, service in services.items():
+            recalls = recall_at_k(service, documents, ids, queries, args.k)
+            print(f"{name:10}" + ''.join(f"{recalls[k]:>12.3f}" for k in args.k))
+
+
+if __name__ == "__main__":
+    main()
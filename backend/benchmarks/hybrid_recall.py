@@ -0,0 +1,73 @@
+"""
+混合检索评测 - 在标注查询集上比较向量、BM25、RRF 混合三种检索的 recall@k 与单次查询耗时
+
+查询集与 recall@k 的定义同 benchmarks/embedding_recall.py；
+向量检索使用临时目录中的 TF-IDF 模型和 numpy 向量索引，不改动已有的模型与向量库
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.hybrid_recall --k 1 5 10
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from app.services.embedding_service import embedding_service
+from app.services.hybrid_search import hybrid_search
+from app.services.recipe_matcher import recipe_service
+from app.services.vector_backends import NumpyBackend
+from app.services.vector_store import RecipeVectorStore
+from benchmarks.embedding_recall import QUERIES_PATH
+
+
+def evaluate(search, queries, ks):
+    """search(query, k) -> 菜谱ID列表；返回 ({k: recall@k}, 平均耗时 ms)"""
+    k_max = max(ks)
+    totals = dict.fromkeys(ks, 0.0)
+    elapsed = 0.0
+    for q in queries:
+        start = time.perf_counter()
+        ranking = search(q['query'], k_max)
+        elapsed += time.perf_counter() - start
+
+        relevant = set(q['relevant'])
+        for k in ks:
+            hits = sum(1 for rid in ranking[:k] if rid in relevant)
+            totals[k] += hits / min(k, len(relevant))
+    return {k: v / len(queries) for k, v in totals.items()}, elapsed * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 5, 10])
+    args = parser.parse_args()
+
+    with open(QUERIES_PATH, encoding='utf-8') as f:
+        queries = json.load(f)['queries']
+    recipes = [r.model_dump() for r in recipe_service.recipes]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        embedding_service.method = 'tfidf'
+        embedding_service.model_path = os.path.join(tmp, 'model.npz')
+        embedding_service.fit([embedding_service.embed_recipe(r) for r in recipes])
+        store = RecipeVectorStore(NumpyBackend(os.path.join(tmp, 'index.npz')))
+        store.add_recipes(recipes)
+
+        methods = {
+            'vector': lambda q, k: [r['id'] for r in store.search(q, n_results=k)],
+            'bm25': lambda q, k: [rid for rid, _ in recipe_service.lexical_search(q, k)],
+            'hybrid': lambda q, k: [r['id'] for r in hybrid_search(store, q, top_k=k)],
+        }
+
+        print(f"\n{len(queries)} queries, {len(recipes)} recipes\n")
+        print(f"{'method':10}" + ''.join(f"{f'recall@{k}':>12}" for k in args.k) + f"{'ms/query':>12}")
+        for name, search in methods.items():
+            # 每种方法都从空的查询向量缓存开始计时
+            embedding_service.query_cache.clear()
+            recalls, latency = evaluate(search, queries, args.k)
+            print(f"{name:10}" + ''.join(f"{recalls[k]:>12.3f}" for k in args.k) + f"{latency:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+规则意图解析评测 - 自动机构建耗时、单条消息解析耗时与快速路径命中率
+
+消息为常见的对话开场句式；命中率即置信度达到 INTENT_CONFIDENCE_THRESHOLD、无需调用 LLM 的比例
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.intent_parser --data /path/to/catalog.jsonl --repeat 2000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.catalog import DEFAULT_DATA_PATH, iter_recipe_records
+from app.services.intent_parser import INTENT_CONFIDENCE_THRESHOLD, RuleIntentParser
+
+
+MESSAGES = [
+    "我有番茄和鸡蛋",
+    "冰箱里有土豆和猪肉，能做什么",
+    "家里有豆腐、青椒，推荐几个菜",
+    "西红柿炒鸡蛋怎么做",
+    "麻婆豆腐的做法",
+    "番茄炒蛋的热量是多少",
+    "我没有鸡蛋，用什么代替",
+    "我不吃辣，推荐几道素菜",
+    "花生过敏，推荐点菜",
+    "减肥期间吃什么",
+    "你好",
+    "今天天气不错，想吃点清淡的",
+    "周末要招待朋友，六个人，有老人和小孩，有什么荤素搭配、做起来不太费时间的菜单建议吗",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data', default=DEFAULT_DATA_PATH)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    recipes = list(iter_recipe_records(args.data))
+    ingredient_names = {i['name'] for r in recipes for i in r.get('ingredients', [])}
+    dish_names = [r['name'] for r in recipes]
+
+    start = time.perf_counter()
+    rules = RuleIntentParser(ingredient_names, dish_names)
+    build_time = time.perf_counter() - start
+
+    latencies = []
+    for message in MESSAGES:
+        rules.parse(message)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            rules.parse(message)
+        latencies.append((time.perf_counter() - start) / args.repeat * 1e6)
+
+    print(f"\n{len(recipes)} recipes, {len(rules.automaton)} patterns, build {build_time * 1000:.0f} ms\n")
+    print(f"{'message':50}{'intent':>26}{'conf':>6}{'us':>8}")
+    fast = 0
+    for message, latency in zip(MESSAGES, latencies):
+        result = rules.parse(message)
+        fast += result['confidence'] >= INTENT_CONFIDENCE_THRESHOLD
+        print(f"{message[:24]:50}{result['intent']:>26}{result['confidence']:>6.2f}{latency:>8.1f}")
+    print(f"\nmean {np.mean(latencies):.1f} us, fast path {fast}/{len(MESSAGES)} "
+          f"(threshold {INTENT_CONFIDENCE_THRESHOLD})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+LLM HTTP 客户端延迟评测 - 在本地 OpenAI 兼容桩服务上比较每次新建客户端与共享连接池客户端
+
+桩服务监听 127.0.0.1 的随机端口，/v1/chat/completions 立即返回固定回复，
+测得的差异只包含建立连接与客户端初始化的开销；本地回环没有 TLS 握手和网络往返，真实 API 上差距更大
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.llm_client_latency --requests 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import socket
+import threading
+import time
+
+import httpx
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+
+from app.services.nlp_service import NLPService
+
+
+def create_stub_app() -> FastAPI:
+    stub = FastAPI()
+
+    @stub.post("/v1/chat/completions")
+    async def chat_completions(body: dict):
+        return {
+            "id": "stub",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "{}"}, "finish_reason": "stop"}]
+        }
+
+    return stub
+
+
+def start_stub_server() -> str:
+    """在后台线程启动桩服务，返回 API 根地址"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    server = uvicorn.Server(uvicorn.Config(create_stub_app(), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+MESSAGES = [{"role": "user", "content": "我有番茄和鸡蛋"}]
+
+
+async def fresh_client_call(api_base: str):
+    """原来的做法：每次调用新建并关闭客户端"""
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        response = await client.post(
+            f"{api_base}/chat/completions",
+            json={"model": "deepseek-chat", "messages": MESSAGES, "temperature": 0.3, "max_tokens": 500}
+        )
+        response.raise_for_status()
+
+
+async def measure(call, requests: int, concurrency: int):
+    """返回每次调用的耗时（ms）与总耗时（s）"""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    return np.array(latencies), time.perf_counter() - start
+
+
+async def run(api_base: str, requests: int, concurrency: int):
+    service = NLPService()
+    service.api_base = api_base
+    await service.start()
+
+    async def shared_client_call():
+        response = await service._chat_completion(MESSAGES, temperature=0.3, max_tokens=500)
+        response.raise_for_status()
+
+    print(f"\n{requests} requests per run against {api_base}\n")
+    print(f"{'client':10}{'concurrency':>12}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for level in sorted({1, concurrency}):
+        for name, call in (("fresh", lambda: fresh_client_call(api_base)), ("shared", shared_client_call)):
+            await measure(call, min(requests, 20), level)  # 预热
+            latencies, total = await measure(call, requests, level)
+            print(f"{name:10}{level:>12}{latencies.mean():>10.2f}{np.percentile(latencies, 50):>10.2f}"
+                  f"{np.percentile(latencies, 99):>10.2f}{requests / total:>10.0f}")
+
+    await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(run(start_stub_server(), args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
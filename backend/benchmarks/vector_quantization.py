@@ -0,0 +1,74 @@
+"""
+向量量化评测 - 比较 NumpyBackend 不同量化方式的常驻内存、写入耗时、查询耗时与 recall@k
+
+recall@k: 量化检索的前 k 条与 float32 精确检索前 k 条的重合比例，对全部查询取平均
+查询为随机抽取的菜名文本；向量化模型在临时目录中拟合，不改动已有的模型与向量库
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.vector_quantization --data /path/to/catalog.jsonl --k 10
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.catalog import DEFAULT_DATA_PATH, iter_recipe_records
+from app.services.embedding_service import EmbeddingService
+from app.services.vector_backends import NumpyBackend
+
+
+def resident_bytes(backend: NumpyBackend) -> int:
+    """常驻内存的向量数据：未量化时为 float32 矩阵，量化时为量化向量与量化参数"""
+    state = backend._state
+    if state.codes is None:
+        return state.embeddings.nbytes
+    return state.codes.nbytes + sum(a.nbytes for a in state.quantizer.arrays().values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data', default=DEFAULT_DATA_PATH)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    recipes = list(iter_recipe_records(args.data))
+    ids = [str(r['id']) for r in recipes]
+    rng = np.random.default_rng(0)
+    query_texts = [recipes[i]['name'] for i in rng.choice(len(recipes), min(args.queries, len(recipes)), replace=False)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        service = EmbeddingService('tfidf', os.path.join(tmp, 'model.npz'))
+        documents = [service.embed_recipe(r) for r in recipes]
+        service.fit(documents)
+        vectors = service.embed_texts(documents)
+        queries = service.embed_texts(query_texts)
+        metadatas = [{} for _ in ids]
+
+        print(f"\n{len(recipes)} recipes, {len(queries)} queries, dim {vectors.shape[1]}\n")
+        print(f"{'quantization':14}{'memory MB':>12}{'bytes/vec':>12}{'build s':>10}{'ms/query':>10}{f'recall@{args.k}':>12}")
+
+        exact = None
+        for quantization in ('none', 'int8', 'pq'):
+            backend = NumpyBackend(os.path.join(tmp, f'{quantization}.npz'), quantization)
+            start = time.perf_counter()
+            backend.add(ids, vectors, [''] * len(ids), metadatas)
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            results = [[hit.id for hit in backend.query(q, args.k)] for q in queries]
+            latency = (time.perf_counter() - start) * 1000 / len(queries)
+
+            if exact is None:
+                exact = results
+            recall = np.mean([len(set(r) & set(e)) / len(e) for r, e in zip(results, exact)])
+
+            memory = resident_bytes(backend)
+            print(f"{quantization:14}{memory / 1e6:>12.1f}{memory / len(ids):>12.1f}"
+                  f"{build:>10.2f}{latency:>10.2f}{recall:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,10 @@ from app.services.nlp_service import nlp_service
 
 client = TestClient(app)
 
+# 管理接口需要配置 ADMIN_TOKEN 并在请求头中携带
+ADMIN_TOKEN = "test-admin-token"
+ADMIN_HEADERS = {"X-Admin-Token": ADMIN_TOKEN}
+
 
 class TestRecipeMatcher:
     """测试菜谱匹配功能"""
@@ -46,6 +50,12 @@ class TestRecipeMatcher:
         assert len(recipe.ingredients) > 0
         assert len(recipe.steps) > 0
     
+    def test_get_recipes_by_ids(self):
+        """测试批量获取菜谱详情"""
+        recipes = recipe_service.get_recipes_by_ids([3, 9999, 1])
+        assert [r.id for r in recipes] == [3, 1]
+        assert recipe_service.get_recipe_by_id(9999) is None
+    
     def test_get_substitutions(self):
         """测试获取食材替代建议"""
         subs = recipe_service.get_substitutions(3, "花生米")
@@ -53,6 +63,69 @@ class TestRecipeMatcher:
         assert "腰果" in subs or "杏仁" in subs
 
 
+class TestIngredientIndex:
+    """测试食材倒排索引"""
+    
+    def test_postings(self):
+        """测试倒排表只包含含有该食材的菜谱"""
+        index = recipe_service.ingredient_index
+        for pos in index.get_postings("鸡蛋").tolist():
+            names = [i.name for i in recipe_service.recipes[pos].ingredients]
+            assert "鸡蛋" in names
+        assert len(index.get_postings("不存在的食材")) == 0
+    
+    def test_top_k_matches_full_scan(self):
+        """测试倒排检索结果与全量扫描一致"""
+        ingredients = ["番茄", "鸡蛋", "豆腐"]
+        expected = []
+        for recipe in recipe_service.recipes:
+            names = [i.name for i in recipe.ingredients]
+            matched = set(ingredients) & set(names)
+            if matched:
+                expected.append((recipe.id, len(matched) / len(names)))
+        expected.sort(key=lambda x: x[1], reverse=True)
+        
+        results = recipe_service.search_by_ingredients(ingredients, top_k=10)
+        assert [(r["recipe"].id, r["match_score"]) for r in results] == expected[:10]
+    
+    def test_batch_matches_single(self):
+        """测试批量检索与逐个检索结果一致"""
+        queries = [["番茄", "鸡蛋"], ["豆腐"], [], ["不存在的食材"], ["猪肉", "青椒", "大葱"]]
+        restrictions = [[], ["素食"], [], [], ["无辣"]]
+        batch = recipe_service.search_by_ingredients_batch(queries, restrictions, top_k=5)
+        assert len(batch) == len(queries)
+        for ingredients, query_restrictions, results in zip(queries, restrictions, batch):
+            assert results == recipe_service.search_by_ingredients(
+                ingredients, query_restrictions, top_k=5
+            )
+    
+    def test_unknown_ingredients(self):
+        """测试未知食材返回空结果"""
+        assert recipe_service.search_by_ingredients(["不存在的食材"]) == []
+
+
+class TestRestrictionIndex:
+    """测试饮食限制位图索引"""
+    
+    def test_vegetarian_mask(self):
+        """测试素食限制排除含肉类、水产的菜谱"""
+        index = recipe_service.restriction_index
+        mask = index.query_mask(["素食"])
+        allowed = index.allowed_mask(mask)
+        for pos, recipe in enumerate(recipe_service.recipes):
+            has_meat = any(i.category in ("肉类", "水产") for i in recipe.ingredients)
+            assert allowed[pos] == (not has_meat and "水产" not in recipe.tags and "肉类" not in recipe.tags)
+            assert index.violates(pos, mask) == (not allowed[pos])
+    
+    def test_allergy_flags(self):
+        """测试过敏原标记"""
+        index = recipe_service.restriction_index
+        mask = index.query_mask(["花生过敏"])
+        # 宫保鸡丁含花生米
+        assert recipe_service.violates_restrictions(3, mask)
+        assert index.query_mask(["未知限制"]) == 0
+
+
 class TestNutritionCalculator:
     """测试营养计算功能"""
     
@@ -103,6 +176,32 @@ class TestNutritionCalculator:
         assert result["suitable"] is False
 
 
+class TestNutritionTable:
+    """测试列式营养数据表"""
+    
+    def test_diet_mask_matches_scalar_check(self):
+        """测试向量化饮食筛选与逐个判断结果一致"""
+        from app.services.nutrition_calc import nutrition_calculator
+        
+        table = recipe_service.nutrition_table
+        for diet_type in ["减肥", "增肌", "低碳", "生酮"]:
+            mask = table.diet_mask(diet_type)
+            for pos, recipe in enumerate(recipe_service.recipes):
+                result = nutrition_calculator.is_suitable_for_diet(
+                    recipe.nutrition, diet_type, recipe.servings
+                )
+                assert bool(mask[pos]) == result["suitable"]
+    
+    def test_range_query(self):
+        """测试营养范围查询"""
+        table = recipe_service.nutrition_table
+        mask = table.query({"calories_per_serving": (None, 150), "protein": (10, None)})
+        for pos, recipe in enumerate(recipe_service.recipes):
+            expected = (recipe.nutrition.calories / recipe.servings <= 150
+                        and recipe.nutrition.protein >= 10)
+            assert bool(mask[pos]) == expected
+
+
 class TestAPI:
     """测试API端点"""
     
@@ -144,6 +243,22 @@ class TestAPI:
         assert "results" in data
         assert len(data["results"]) > 0
     
+    def test_search_recipes_batch(self):
+        """测试批量搜索菜谱"""
+        response = client.post(
+            "/api/recipes/search/batch",
+            json={"queries": [{"ingredients": ["番茄", "鸡蛋"]}, {"ingredients": ["豆腐"], "restrictions": ["素食"]}], "top_k": 3}
+        )
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert len(results) == 2
+        single = client.post(
+            "/api/recipes/search",
+            params={"top_k": 3},
+            json={"ingredients": ["番茄", "鸡蛋"]}
+        ).json()["results"]
+        assert results[0] == single
+    
     def test_get_nutrition(self):
         """测试获取营养信息"""
         response = client.get("/api/nutrition/recipe/1")
@@ -151,6 +266,774 @@ class TestAPI:
         data = response.json()
         assert "nutrition_per_serving" in data
         assert "health_tips" in data
+    
+    def test_query_nutrition(self):
+        """测试营养范围查询接口"""
+        response = client.post(
+            "/api/nutrition/query",
+            json={"ranges": {"calories_per_serving": {"max": 300}, "protein": {"min": 20}}}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == len(data["results"])
+        for item in data["results"]:
+            assert item["nutrition_per_serving"]["calories"] <= 300
+        
+        response = client.post("/api/nutrition/query", json={"ranges": {"sugar": {"max": 1}}})
+        assert response.status_code == 400
+        
+        response = client.post("/api/nutrition/query", json={"diet_type": "未知饮食"})
+        assert response.status_code == 400
+        
+        for limit in (0, 501):
+            response = client.post("/api/nutrition/query", json={"limit": limit})
+            assert response.status_code == 422
+        
+        data = client.post("/api/nutrition/query", json={"diet_type": "减肥", "limit": 1}).json()
+        assert len(data["results"]) <= 1
+        for item in data["results"]:
+            assert item["recipe_name"] == recipe_service.get_recipe_by_id(item["recipe_id"]).name
+
+
+class TestResponseCache:
+    """测试静态接口响应缓存"""
+    
+    def test_etag_not_modified(self):
+        """测试 ETag 与 304 响应"""
+        response = client.get("/api/recipes/1")
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        
+        response = client.get("/api/recipes/1", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        
+        response = client.get("/api/recipes/tags/素食", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+    
+    def test_payload_matches_model(self):
+        """测试缓存响应与模型序列化结果一致"""
+        response = client.get("/api/recipes/list", params={"difficulty": "简单"})
+        expected = [
+            r.model_dump() for r in recipe_service.get_all_recipes()
+            if r.difficulty == "简单"
+        ]
+        assert response.json() == expected
+    
+    def test_version_invalidates(self):
+        """测试目录版本变化时缓存整体失效"""
+        from app.services.response_cache import ResponseCache
+        
+        cache = ResponseCache()
+        first = cache.get("v1", ("recipe", 1), lambda: {"name": "旧"})
+        assert cache.get("v1", ("recipe", 1), lambda: {"name": "新"}) is first
+        second = cache.get("v2", ("recipe", 1), lambda: {"name": "新"})
+        assert second.etag != first.etag
+        assert len(cache) == 1
+
+
+class TestCatalogReload:
+    """测试菜谱目录热加载"""
+    
+    def test_reload_swaps_snapshot(self, tmp_path):
+        """测试热加载替换快照，旧快照保持不变"""
+        import asyncio
+        import json
+        from app.services.catalog import DEFAULT_DATA_PATH
+        from app.services.recipe_matcher import RecipeService
+        
+        with open(DEFAULT_DATA_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+        path = tmp_path / "recipes.json"
+        path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        
+        service = RecipeService(str(path))
+        old_snapshot = service.snapshot
+        assert asyncio.run(service.reload()) is False
+        
+        data["recipes"] = data["recipes"][:10]
+        path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        assert asyncio.run(service.reload()) is True
+        
+        assert len(service.recipes) == 10
+        assert service.version != old_snapshot.version
+        assert len(old_snapshot.recipes) == 50
+        assert service.get_recipe_by_id(11) is None
+    
+    def test_file_rewritten_in_place(self, tmp_path):
+        """测试文件被原地改写后，当前快照仍从自己的副本读取；旧快照在引用全部释放后才关闭副本"""
+        import asyncio
+        import gc
+        import json
+        from app.services.catalog import DEFAULT_DATA_PATH
+        from app.services.recipe_matcher import RecipeService
+        
+        with open(DEFAULT_DATA_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+        path = tmp_path / "recipes.json"
+        path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        
+        service = RecipeService(str(path))
+        old_snapshot = service.snapshot
+        copy = old_snapshot._close.__self__._f
+        expected = data["recipes"][29]["name"]
+        uncached = data["recipes"][10]["name"]
+        
+        data["recipes"] = list(reversed(data["recipes"]))
+        for r in data["recipes"]:
+            r["name"] += "（新）"
+        path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        assert service.get_recipe_by_id(30).name == expected
+        
+        assert asyncio.run(service.reload()) is True
+        assert service.get_recipe_by_id(30).name == expected + "（新）"
+        
+        # 进行中的请求仍持有旧快照或其 recipes 序列时，副本保持可读
+        old_recipes = old_snapshot.recipes
+        del old_snapshot
+        gc.collect()
+        assert not copy.closed
+        assert old_recipes[10].name == uncached
+        
+        del old_recipes
+        gc.collect()
+        assert copy.closed
+    
+    def test_reload_endpoint(self, monkeypatch):
+        """测试热加载接口"""
+        monkeypatch.setenv("ADMIN_TOKEN", ADMIN_TOKEN)
+        response = client.post("/api/admin/reload", headers=ADMIN_HEADERS)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["reloaded"] is False
+        assert data["version"] == recipe_service.version
+    
+    def test_admin_requires_token(self, monkeypatch):
+        """测试未配置 ADMIN_TOKEN 或令牌不符时管理接口拒绝请求"""
+        monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+        assert client.post("/api/admin/reload").status_code == 403
+        assert client.get("/api/admin/stats", headers=ADMIN_HEADERS).status_code == 403
+        
+        monkeypatch.setenv("ADMIN_TOKEN", ADMIN_TOKEN)
+        assert client.post("/api/admin/reload").status_code == 403
+        assert client.get("/api/admin/stats", headers={"X-Admin-Token": "wrong"}).status_code == 403
+        assert client.get("/api/admin/stats", headers=ADMIN_HEADERS).status_code == 200
+
+
+class TestCatalogLoader:
+    """测试流式菜谱加载"""
+    
+    def _write_jsonl(self, tmp_path):
+        import json
+        from app.services.catalog import DEFAULT_DATA_PATH
+        
+        with open(DEFAULT_DATA_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+        path = tmp_path / "recipes.jsonl"
+        path.write_text(
+            "\n".join(json.dumps(r, ensure_ascii=False) for r in data["recipes"]) + "\n",
+            encoding="utf-8"
+        )
+        return str(path), data["recipes"]
+    
+    def test_jsonl_matches_json(self, tmp_path):
+        """测试 JSON Lines 与 JSON 文件加载结果一致"""
+        from app.services.catalog import load_catalog
+        
+        path, raw = self._write_jsonl(tmp_path)
+        snapshot = load_catalog(path)
+        assert len(snapshot.recipes) == len(raw)
+        assert list(snapshot.recipes) == list(recipe_service.recipes)
+    
+    def test_small_chunks(self, tmp_path, monkeypatch):
+        """测试记录跨越数据块边界时的增量解析"""
+        from app.services import catalog
+        
+        monkeypatch.setattr(catalog, "CHUNK_SIZE", 7)
+        snapshot = catalog.load_catalog(catalog.DEFAULT_DATA_PATH)
+        assert snapshot.version == recipe_service.version
+        assert snapshot.recipes[-1] == recipe_service.recipes[-1]
+    
+    def test_lazy_materialization(self, tmp_path):
+        """测试完整菜谱模型在首次访问时才构建"""
+        from app.services.catalog import load_catalog
+        
+        path, _ = self._write_jsonl(tmp_path)
+        snapshot = load_catalog(path)
+        load = snapshot.recipes._load
+        assert load.cache_info().currsize == 0
+        
+        recipe = snapshot.recipes[snapshot.id_to_position[3]]
+        assert recipe.name == "宫保鸡丁"
+        assert snapshot.recipes[snapshot.id_to_position[3]] is recipe
+        assert load.cache_info().currsize == 1
+
+
+class TestCompactCatalog:
+    """测试紧凑目录表示"""
+    
+    def test_summary_matches_recipe(self):
+        """测试摘要视图解码结果与完整菜谱一致"""
+        for pos, summary in enumerate(recipe_service.summaries):
+            recipe = recipe_service.recipes[pos]
+            assert summary.id == recipe.id
+            assert summary.name == recipe.name
+            assert summary.difficulty == recipe.difficulty
+            assert summary.time == recipe.time
+            assert summary.tags == recipe.tags
+            assert [(i.name, i.category) for i in summary.ingredients] == \
+                [(i.name, i.category) for i in recipe.ingredients]
+    
+    def test_strings_interned(self):
+        """测试重复字符串只存一份"""
+        columns = recipe_service.summaries
+        assert len(columns.ingredient_categories) < 20
+        assert columns.ingredient_categories.get_id("调料") is not None
+        assert len(columns.labels) < len(columns)
+    
+    def test_sparse_id_index(self):
+        """测试稀疏ID退回字典查找"""
+        import numpy as np
+        from app.services.recipe_records import IdIndex
+        
+        index = IdIndex(np.array([5, 10 ** 9, 7], dtype=np.int64))
+        assert index.get(10 ** 9) == 1
+        assert index.get(6) is None
+        assert 7 in index
+        
+        dense = IdIndex(np.array([3, 1, 2], dtype=np.int64))
+        assert dense[1] == 1
+        assert dense.get(0) is None
+        assert dense.get(-1) is None
+    
+    def test_id_index_integral_and_duplicates(self):
+        """测试 numpy 整数ID可以查找，重复ID取第一次出现的位置"""
+        import numpy as np
+        from app.services.recipe_records import IdIndex
+        
+        for ids in ([4, 2, 4, 3], [4, 10 ** 9, 4, 3]):
+            index = IdIndex(np.array(ids, dtype=np.int64))
+            assert index.get(np.int64(4)) == 0
+            assert index[np.int32(3)] == 3
+            assert index.get(np.int64(1)) is None
+            assert index.get("4") is None
+            assert index.get(4.0) is None
+
+
+class TestPagination:
+    """测试标签、难度索引与游标分页"""
+    
+    def test_facet_index_matches_scan(self):
+        """测试标签、难度索引与全量筛选结果一致"""
+        index = recipe_service.facet_index
+        summaries = recipe_service.summaries
+        positions = index.filter(tag="素食", difficulty="简单").tolist()
+        expected = [
+            pos for pos, r in enumerate(summaries)
+            if "素食" in r.tags and r.difficulty == "简单"
+        ]
+        assert positions == expected
+        assert index.filter() is None
+        assert len(index.filter(tag="不存在的标签")) == 0
+    
+    def test_cursor_pages(self):
+        """测试按游标翻页能完整遍历列表且不重复"""
+        ids = []
+        cursor = None
+        while True:
+            params = {"limit": 7}
+            if cursor is not None:
+                params["cursor"] = cursor
+            response = client.get("/api/recipes/list", params=params)
+            assert response.status_code == 200
+            assert response.headers["x-total-count"] == "50"
+            page = response.json()
+            assert len(page) <= 7
+            ids.extend(r["id"] for r in page)
+            cursor = response.headers.get("x-next-cursor")
+            if cursor is None:
+                break
+        assert ids == [r.id for r in recipe_service.summaries]
+    
+    def test_tag_pages(self):
+        """测试标签接口分页"""
+        expected = [r.model_dump() for r in recipe_service.get_recipes_by_tag("素食")]
+        first = client.get("/api/recipes/tags/素食", params={"limit": 2})
+        assert first.json() == expected[:2]
+        second = client.get(
+            "/api/recipes/tags/素食",
+            params={"limit": 2, "cursor": first.headers["x-next-cursor"]}
+        )
+        assert second.json() == expected[2:4]
+    
+    def test_invalid_cursor(self):
+        """测试无效游标与超出范围的分页大小"""
+        response = client.get("/api/recipes/list", params={"cursor": 99999})
+        assert response.status_code == 400
+        response = client.get("/api/recipes/list", params={"limit": 100000})
+        assert response.status_code == 422
+
+
+class TestEmbeddingService:
+    """测试文本向量化"""
+    
+    def test_batch_matches_single(self):
+        """测试批量向量化与逐条结果一致"""
+        import numpy as np
+        from app.services import embedding_service as module
+        from app.services.embedding_service import embedding_service
+        
+        texts = ["番茄炒蛋", "麻婆豆腐", "红烧肉", "宫保鸡丁"] * 3
+        module.EMBED_BATCH_SIZE, batch_size = 5, module.EMBED_BATCH_SIZE
+        try:
+            embeddings = embedding_service.embed_texts(texts)
+        finally:
+            module.EMBED_BATCH_SIZE = batch_size
+        
+        assert embeddings.shape == (12, 384)
+        assert embeddings.dtype == np.float32
+        np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1, rtol=1e-5)
+        for text, row in zip(texts, embeddings):
+            np.testing.assert_allclose(row, embedding_service.embed_text(text), atol=1e-6)
+        assert embedding_service.embed_texts([]).shape == (0, 384)
+    
+    def test_tfidf_semantic_neighbors(self, tmp_path):
+        """测试 TF-IDF + SVD 向量能找到语义相近的菜谱，模型可从磁盘加载"""
+        import numpy as np
+        from app.services.embedding_service import EmbeddingService
+        
+        path = str(tmp_path / "model.npz")
+        service = EmbeddingService("tfidf", path)
+        recipes = [r.model_dump() for r in recipe_service.recipes]
+        documents = [service.embed_recipe(r) for r in recipes]
+        service.fit(documents)
+        
+        doc_vectors = service.embed_texts(documents)
+        for query, expected in [("西红柿炒蛋", 1), ("麻辣豆腐", 2), ("可乐鸡翅", 26)]:
+            scores = doc_vectors @ np.asarray(service.embed_text(query))
+            top3 = [recipes[i]["id"] for i in np.argsort(-scores)[:3]]
+            assert expected in top3
+        
+        loaded = EmbeddingService("tfidf", path)
+        np.testing.assert_allclose(loaded.embed_texts(documents[:5]), doc_vectors[:5], atol=1e-6)
+
+
+class TestQueryEmbeddingCache:
+    """测试查询向量缓存"""
+    
+    def test_hits_and_normalization(self, monkeypatch):
+        """测试规范化后相同的查询命中缓存，结果与直接计算一致"""
+        from app.services.embedding_service import EmbeddingService
+        
+        service = EmbeddingService("hash")
+        first = service.embed_text("包含番茄、鸡蛋的菜")
+        second = service.embed_text("  包含番茄、鸡蛋的菜 ")
+        assert first == second
+        assert first == pytest.approx(service.embed_texts(["包含番茄、鸡蛋的菜"])[0].tolist(), abs=1e-6)
+        
+        stats = service.query_cache.stats()
+        assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+        
+        monkeypatch.setenv("ADMIN_TOKEN", ADMIN_TOKEN)
+        response = client.get("/api/admin/stats", headers=ADMIN_HEADERS)
+        assert response.status_code == 200
+        assert "hit_rate" in response.json()["embedding_cache"]
+    
+    def test_bounded_lru(self):
+        """测试缓存按条目数淘汰最久未使用的查询"""
+        from app.services.embedding_service import EmbeddingService
+        
+        service = EmbeddingService("hash")
+        service.query_cache.max_entries = 2
+        for text in ["番茄", "鸡蛋", "番茄", "豆腐"]:
+            service.embed_text(text)
+        
+        assert len(service.query_cache) == 2
+        service.embed_text("番茄")
+        service.embed_text("鸡蛋")
+        assert service.query_cache.hits == 2
+        assert service.query_cache.misses == 4
+    
+    def test_invalidated_on_model_change(self, tmp_path):
+        """测试重新拟合或模型文件被改写后缓存失效"""
+        import os
+        from app.services.embedding_service import EmbeddingService
+        
+        path = str(tmp_path / "model.npz")
+        service = EmbeddingService("tfidf", path)
+        service.fit(["番茄炒蛋 番茄 鸡蛋", "麻婆豆腐 豆腐 辣椒", "红烧肉 五花肉"])
+        service.embed_text("番茄")
+        old_id = service.model_id
+        
+        service.fit(["番茄炒蛋 番茄 鸡蛋", "宫保鸡丁 鸡肉 花生", "清蒸鲈鱼 鲈鱼"])
+        assert service.model_id != old_id
+        service.embed_text("番茄")
+        assert service.query_cache.hits == 0
+        assert len(service.query_cache) == 1
+        
+        # 其他进程改写模型文件
+        other = EmbeddingService("tfidf", path)
+        other.fit(["凉拌黄瓜 黄瓜", "炒饭 米饭 鸡蛋", "白灼虾 鲜虾"])
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        service.embed_text("番茄")
+        assert service.model_id == other.model_id
+        assert service.query_cache.hits == 0
+
+
+class TestVectorBackends:
+    """测试向量库后端"""
+    
+    def _records(self):
+        from app.services.embedding_service import embedding_service
+        recipes = [r.model_dump() for r in recipe_service.recipes]
+        documents = [embedding_service.embed_recipe(r) for r in recipes]
+        metadatas = [
+            {"id": r["id"], "name": r["name"], "category": r["category"], "calories": r["nutrition"]["calories"]}
+            for r in recipes
+        ]
+        return [str(r["id"]) for r in recipes], embedding_service.embed_texts(documents), documents, metadatas
+    
+    def test_numpy_exact_top_k(self, tmp_path):
+        """测试进程内索引的 top-k 与暴力检索一致"""
+        import numpy as np
+        from app.services.vector_backends import NumpyBackend
+        
+        ids, embeddings, documents, metadatas = self._records()
+        backend = NumpyBackend(str(tmp_path / "index.npz"))
+        backend.add(ids, embeddings, documents, metadatas)
+        assert backend.count() == 50
+        
+        query = embeddings[3]
+        hits = backend.query(query, 5)
+        scores = np.asarray(embeddings) @ np.asarray(query)
+        expected = [ids[i] for i in np.argsort(-scores, kind="stable")[:5]]
+        assert [h.id for h in hits] == expected
+        assert hits[0].id == ids[3]
+        assert abs(hits[0].similarity - 1) < 1e-5
+        
+        hits = backend.query(query, 50, where={"category": "川菜"})
+        assert hits and all(h.metadata["category"] == "川菜" for h in hits)
+        hits = backend.query(query, 50, where={"$and": [{"category": "川菜"}, {"calories": {"$lt": 400}}]})
+        assert all(h.metadata["calories"] < 400 for h in hits)
+    
+    def test_numpy_snapshot_persists(self, tmp_path):
+        """测试快照文件的保存、加载与覆盖写入"""
+        from app.services.vector_backends import NumpyBackend
+        
+        path = str(tmp_path / "index.npz")
+        ids, embeddings, documents, metadatas = self._records()
+        NumpyBackend(path).add(ids, embeddings, documents, metadatas)
+        
+        backend = NumpyBackend(path)
+        assert backend.count() == 50
+        assert backend.get("1")["name"] == "番茄炒蛋"
+        
+        backend.add(["1"], [embeddings[0]], ["新文本"], [dict(metadatas[0], name="新名字")])
+        backend = NumpyBackend(path)
+        assert backend.count() == 50
+        assert backend.get("1")["name"] == "新名字"
+        
+        backend.clear()
+        assert NumpyBackend(path).count() == 0
+    
+    @pytest.mark.parametrize("quantization", ["int8", "pq"])
+    def test_numpy_quantized(self, tmp_path, monkeypatch, quantization):
+        """测试量化索引粗排后精排的结果与精确检索一致，且可保存、加载、增删"""
+        import numpy as np
+        from app.services import vector_backends
+        from app.services.vector_backends import NumpyBackend
+    
+        # 缩小粗排候选，使粗排真正生效
+        monkeypatch.setattr(vector_backends, "RERANK_FACTOR", 2)
+        monkeypatch.setattr(vector_backends, "RERANK_MIN", 0)
+    
+        path = str(tmp_path / "index.npz")
+        ids, embeddings, documents, metadatas = self._records()
+        NumpyBackend(path, quantization).add(ids, embeddings, documents, metadatas)
+    
+        backend = NumpyBackend(path, quantization)
+        assert backend._state.codes is not None
+        scores = np.asarray(embeddings) @ np.asarray(embeddings[3])
+        expected = [ids[i] for i in np.argsort(-scores, kind="stable")[:5]]
+        hits = backend.query(embeddings[3], 5)
+        assert [h.id for h in hits] == expected
+        assert abs(hits[0].similarity - 1) < 1e-5
+    
+        hits = backend.query(embeddings[3], 50, where={"category": "川菜"})
+        assert hits and all(h.metadata["category"] == "川菜" for h in hits)
+    
+        backend.delete([ids[3]])
+        backend.add(["999"], [embeddings[3]], ["新文本"], [dict(metadatas[3], name="新名字")])
+        assert backend.query(embeddings[3], 1)[0].id == "999"
+    
+        # 关闭量化后从原始向量加载
+        backend = NumpyBackend(path)
+        assert backend._state.codes is None
+        assert backend.count() == 50
+        assert backend.query(embeddings[3], 1)[0].id == "999"
+    
+    def test_quantized_incremental_add(self, tmp_path):
+        """测试量化索引增量写入与删除换用新的向量文件，进行中的查询仍读取旧文件"""
+        import numpy as np
+        from app.services.vector_backends import NumpyBackend
+        
+        path = str(tmp_path / "index.npz")
+        ids, embeddings, documents, metadatas = self._records()
+        backend = NumpyBackend(path, "int8")
+        backend.add(ids[:40], embeddings[:40], documents[:40], metadatas[:40])
+        old_state = backend._state
+        old_vectors = np.array(old_state.embeddings)
+        
+        # 更新一条已有记录并追加新记录
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        backend.add(
+            [ids[0]] + ids[40:],
+            np.vstack([embeddings[1:2], embeddings[40:]]),
+            documents[:1] + documents[40:],
+            metadatas[:1] + metadatas[40:]
+        )
+        assert np.array_equal(old_state.embeddings, old_vectors)
+        assert isinstance(backend._state.embeddings, np.memmap)
+        assert backend.count() == 50
+        
+        reloaded = NumpyBackend(path, "int8")
+        expected = embeddings.copy()
+        expected[0] = expected[1]
+        expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+        assert np.allclose(reloaded._state.embeddings, expected, atol=1e-6)
+        assert np.array_equal(reloaded._state.codes, backend._state.codes)
+        assert [h.id for h in reloaded.query(embeddings[45], 1)] == [ids[45]]
+        
+        old_state = backend._state
+        backend.delete(ids[10:20])
+        assert np.allclose(old_state.embeddings, expected, atol=1e-6)
+        assert isinstance(backend._state.embeddings, np.memmap)
+        kept = np.r_[0:10, 20:50]
+        reloaded = NumpyBackend(path, "int8")
+        assert reloaded.count() == 40
+        assert np.allclose(reloaded._state.embeddings, expected[kept], atol=1e-6)
+        assert np.array_equal(reloaded._state.codes, backend._state.codes)
+        
+        # 向量文件多出未登记的行（写入中断）时加载忽略多出的部分
+        state = backend._state
+        backend._rewrite_vectors(state.embeddings, np.arange(40), 42, {40: expected[0], 41: expected[1]})
+        assert NumpyBackend(path, "int8").count() == 40
+        assert len(NumpyBackend(path, "int8")._state.embeddings) == 40
+    
+    def test_store_with_numpy_backend(self, tmp_path):
+        """测试 RecipeVectorStore 使用进程内后端"""
+        from app.services.vector_backends import NumpyBackend
+        from app.services.vector_store import RecipeVectorStore
+        
+        store = RecipeVectorStore(NumpyBackend(str(tmp_path / "index.npz")))
+        assert store.add_recipes([r.model_dump() for r in recipe_service.recipes])
+        results = store.search("番茄炒蛋", n_results=3)
+        assert len(results) == 3
+        assert store.get_recipe_by_id(1)["name"] == "番茄炒蛋"
+    
+    def test_search_include_flags(self, tmp_path):
+        """测试检索默认只返回 ID 与相似度，元数据解码后缓存，内容变化时重新解码"""
+        from app.services.vector_backends import NumpyBackend
+        from app.services.vector_store import RecipeVectorStore
+    
+        store = RecipeVectorStore(NumpyBackend(str(tmp_path / "index.npz")))
+        recipes = [r.model_dump() for r in recipe_service.recipes]
+        store.add_recipes(recipes)
+    
+        results = store.search("番茄炒蛋", n_results=3)
+        assert all(set(r) == {"id", "similarity"} for r in results)
+    
+        first = store.search("番茄炒蛋", n_results=3, include_metadata=True)
+        second = store.search("番茄炒蛋", n_results=3, include_metadata=True, include_document=True)
+        assert [r["id"] for r in first] == [r["id"] for r in results]
+        assert isinstance(first[0]["tags"], list) and isinstance(first[0]["ingredients"], list)
+        assert first[0]["tags"] is second[0]["tags"]
+        assert "vector_text" not in first[0] and second[0]["vector_text"]
+    
+        store.add_recipes([dict(recipes[0], tags=["新标签"])])
+        assert store.get_recipe_by_id(1)["tags"] == ["新标签"]
+
+
+class TestVectorFilters:
+    """测试向量检索预过滤"""
+    
+    def _store(self, tmp_path):
+        from app.services.vector_backends import NumpyBackend
+        from app.services.vector_store import RecipeVectorStore
+        
+        store = RecipeVectorStore(NumpyBackend(str(tmp_path / "index.npz")))
+        store.add_recipes([r.model_dump() for r in recipe_service.recipes])
+        return store
+    
+    def test_filters_inside_index(self, tmp_path):
+        """测试过滤后的结果全部满足条件，且满足条件的菜谱足够时返回恰好 top_k 条"""
+        store = self._store(tmp_path)
+        mask = recipe_service.restriction_index.query_mask(["纯素", "无辣"])
+        filters = recipe_service.vector_filters(["纯素", "无辣"])
+        allowed = recipe_service.summaries.column("ids")[recipe_service.restriction_index.allowed_mask(mask)].tolist()
+        assert len(allowed) >= 5
+        
+        results = store.search("肉", n_results=5, filters=filters)
+        assert len(results) == 5
+        assert not any(recipe_service.violates_restrictions(r["id"], mask) for r in results)
+        
+        results = store.search("肉", n_results=100, filters=filters)
+        assert sorted(r["id"] for r in results) == sorted(allowed)
+        
+        filters = recipe_service.vector_filters(category="川菜", max_calories=300)
+        for r in store.search("辣", n_results=10, filters=filters):
+            recipe = recipe_service.get_recipe_by_id(r["id"])
+            assert recipe.category == "川菜"
+            assert recipe.nutrition.calories / recipe.servings <= 300
+        
+        assert recipe_service.vector_filters() is None
+        assert store.search("肉", filters=recipe_service.vector_filters(category="不存在")) == []
+    
+    def test_large_allowed_set(self, tmp_path):
+        """测试允许集合很大时条件大小不变，结果与整表过滤一致"""
+        import json
+        import numpy as np
+        from app.services.vector_backends import NumpyBackend
+        from app.services.vector_store import RecipeVectorStore
+        
+        filters = recipe_service.vector_filters(["花生过敏", "无辣"], max_calories=500)
+        assert len(json.dumps(filters)) < 200
+        
+        # 把 50 道菜的元数据复制成 50000 条，允许集合超过 SQLite 单条语句的变量数上限
+        base = [RecipeVectorStore._prepare_recipe(r.model_dump(), "test")[2] for r in recipe_service.recipes]
+        n = 50000
+        metadatas = [dict(base[i % len(base)], id=i + 1) for i in range(n)]
+        embeddings = np.random.default_rng(0).standard_normal((n, 16)).astype(np.float32)
+        backend = NumpyBackend(str(tmp_path / "index.npz"))
+        backend.add([str(i + 1) for i in range(n)], embeddings, [""] * n, metadatas)
+        
+        snapshot = recipe_service.snapshot
+        allowed = recipe_service._constraint_mask(snapshot, ["花生过敏", "无辣"], None, 500)
+        expected = int(np.tile(allowed, n // len(base)).sum())
+        assert expected > 32766
+        assert len(backend.query(embeddings[0], n, filters)) == expected
+    
+    def test_bool_columns_vectorized(self, tmp_path):
+        """测试饮食限制字段展开为 bool 列，只与布尔值比较"""
+        import numpy as np
+        from app.services.dietary_index import restriction_field
+        from app.services.vector_backends import _where_mask
+        
+        store = self._store(tmp_path)
+        state = store.backend._state
+        field = restriction_field(0)
+        values, present = state.columns.get(field)
+        assert values.dtype == bool and present.all()
+        
+        expected = np.array([m[field] for m in state.metadatas])
+        size = len(state.ids)
+        assert (_where_mask(state.columns, {field: {"$eq": True}}, size) == expected).all()
+        assert (_where_mask(state.columns, {field: {"$in": [True]}}, size) == expected).all()
+        assert (_where_mask(state.columns, {field: {"$ne": True}}, size) == ~expected).all()
+        assert not _where_mask(state.columns, {field: {"$eq": 1}}, size).any()
+    
+    def test_stale_index_detected(self, tmp_path):
+        """测试旧版本索引缺少过滤字段时带条件查询报错，重新同步后恢复"""
+        from app.services.vector_backends import NumpyBackend
+        from app.services.vector_store import RecipeVectorStore
+        
+        store = RecipeVectorStore(NumpyBackend(str(tmp_path / "index.npz")))
+        recipes = [r.model_dump() for r in recipe_service.recipes]
+        store.add_recipes(recipes)
+        # 模拟旧版本写入的元数据
+        for metadata in store.backend._state.metadatas:
+            for field in [f for f in metadata if f.startswith("violates_")]:
+                del metadata[field]
+            metadata["content_hash"] = "old"
+        store._missing_fields = None
+        
+        filters = recipe_service.vector_filters(["纯素"])
+        assert store.missing_filter_fields()
+        with pytest.raises(RuntimeError):
+            store.search("菜", filters=filters)
+        assert store.search("菜")
+        
+        assert store.sync_recipes(recipes)["updated"] == len(recipes)
+        assert store.missing_filter_fields() == []
+        assert store.search("菜", filters=filters)
+    
+    def test_chroma_filters(self, tmp_path):
+        """测试 ChromaDB 后端对同一条件返回与 NumPy 后端相同的菜谱"""
+        from app.services.vector_backends import ChromaBackend
+        from app.services.vector_store import RecipeVectorStore
+        
+        chroma = RecipeVectorStore(ChromaBackend(str(tmp_path / "chroma")))
+        chroma.add_recipes([r.model_dump() for r in recipe_service.recipes])
+        numpy_store = self._store(tmp_path)
+        
+        for filters in (
+            recipe_service.vector_filters(["纯素", "无辣"]),
+            recipe_service.vector_filters(["素食"], category="家常菜", max_calories=400),
+        ):
+            expected = sorted(r["id"] for r in numpy_store.search("菜", n_results=100, filters=filters))
+            assert expected
+            assert sorted(r["id"] for r in chroma.search("菜", n_results=100, filters=filters)) == expected
+    
+    def test_rag_returns_top_k(self, tmp_path, monkeypatch):
+        """测试 RAG 检索在严格限制下仍返回 top_k 条且全部满足限制"""
+        import asyncio
+        from app.services import langchain_nlp
+        
+        monkeypatch.setattr(langchain_nlp, "vector_store", self._store(tmp_path))
+        restrictions = ["素食", "无辣", "鸡蛋过敏"]
+        mask = recipe_service.restriction_index.query_mask(restrictions)
+        
+        results = asyncio.run(langchain_nlp.langchain_nlp_service.search_recipes_with_rag(
+            query="", ingredients=["猪肉", "鸡蛋"], restrictions=restrictions, top_k=5
+        ))
+        assert len(results) == 5
+        assert not any(recipe_service.violates_restrictions(r["recipe"].id, mask) for r in results)
+
+
+class TestVectorSync:
+    """测试向量库增量同步"""
+    
+    def test_sync_only_changed(self, tmp_path):
+        """测试只写入新增或变化的菜谱，并删除已移除的菜谱"""
+        from app.services.vector_backends import NumpyBackend
+        from app.services.vector_store import RecipeVectorStore
+        
+        store = RecipeVectorStore(NumpyBackend(str(tmp_path / "index.npz")))
+        recipes = [r.model_dump() for r in recipe_service.recipes]
+        
+        report = store.sync_recipes(recipes)
+        assert (report["added"], report["updated"], report["deleted"]) == (50, 0, 0)
+        
+        report = store.sync_recipes(recipes)
+        assert (report["added"], report["updated"], report["deleted"], report["unchanged"]) == (0, 0, 0, 50)
+        
+        recipes[0] = dict(recipes[0], name="番茄炒鸡蛋")
+        new_recipe = dict(recipes[1], id=999, name="新菜")
+        recipes = recipes[:-1] + [new_recipe]
+        report = store.sync_recipes(recipes)
+        assert (report["added"], report["updated"], report["deleted"], report["unchanged"]) == (1, 1, 1, 48)
+        assert "embed_ms" in report
+        
+        assert store.count() == 50
+        assert store.get_recipe_by_id(1)["name"] == "番茄炒鸡蛋"
+        assert store.get_recipe_by_id(50) is None
+        assert store.get_recipe_by_id(999)["name"] == "新菜"
+    
+    def test_init_vector_db_non_interactive(self, tmp_path, monkeypatch):
+        """测试初始化脚本默认增量同步，不等待输入"""
+        from app.services import init_vector_db
+        from app.services.vector_backends import NumpyBackend
+        from app.services.vector_store import RecipeVectorStore
+        
+        store = RecipeVectorStore(NumpyBackend(str(tmp_path / "index.npz")))
+        monkeypatch.setattr(init_vector_db, "vector_store", store)
+        monkeypatch.setattr("builtins.input", lambda *args: pytest.fail("不应等待输入"))
+        
+        assert init_vector_db.init_vector_database()
+        assert store.count() == 50
+        assert init_vector_db.init_vector_database()
+        assert store.count() == 50
 
 
 class TestConversationManager:
@@ -196,6 +1079,492 @@ class TestConversationManager:
         assert context[-1]["content"] == "我想吃番茄炒蛋"
 
 
+class TestHybridSearch:
+    """测试 BM25 索引与混合检索"""
+    
+    def test_tokenize(self):
+        """测试中文切为单字和二字，英文按单词切分"""
+        from app.services.bm25_index import tokenize
+        
+        assert tokenize("番茄炒蛋") == ["番", "茄", "炒", "蛋", "番茄", "茄炒", "炒蛋"]
+        assert tokenize("Kung Pao 鸡丁") == ["kung", "pao", "鸡", "丁", "鸡丁"]
+        assert tokenize("，。!") == []
+    
+    def test_lexical_search(self):
+        """测试 BM25 按菜名、食材命中排序，并遵守过滤条件"""
+        results = recipe_service.lexical_search("西红柿 鸡蛋", 5)
+        assert results[0][0] in (1, 13)
+        assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+        
+        mask = recipe_service.restriction_index.query_mask(["鸡蛋过敏"])
+        results = recipe_service.lexical_search("鸡蛋", 10, restrictions=["鸡蛋过敏"])
+        assert not any(recipe_service.violates_restrictions(rid, mask) for rid, _ in results)
+        assert recipe_service.lexical_search("不存在的词xyz", 5) == []
+    
+    def test_reciprocal_rank_fusion(self):
+        """测试 RRF 按名次融合，两路都靠前的结果排在最前"""
+        from app.services.hybrid_search import reciprocal_rank_fusion
+        
+        fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60)
+        assert [item for item, _ in fused] == [1, 3, 2]
+        assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+    
+    def test_hybrid_search(self, tmp_path):
+        """测试混合检索合并两路结果，分数落在 [0, 1] 且满足过滤条件"""
+        from app.services.hybrid_search import hybrid_search
+        from app.services.vector_backends import NumpyBackend
+        from app.services.vector_store import RecipeVectorStore
+        
+        store = RecipeVectorStore(NumpyBackend(str(tmp_path / "index.npz")))
+        store.add_recipes([r.model_dump() for r in recipe_service.recipes])
+        
+        results = hybrid_search(store, "番茄鸡蛋", top_k=5)
+        assert len(results) == 5
+        assert {r["id"] for r in results[:2]} == {1, 13}
+        assert all(0 < r["score"] <= 1 for r in results)
+        assert results[0]["vector_rank"] is not None and results[0]["bm25_rank"] is not None
+        
+        results = hybrid_search(store, "肉", top_k=10, category="川菜")
+        assert results
+        assert all(recipe_service.get_recipe_by_id(r["id"]).category == "川菜" for r in results)
+
+
+
+class TestSearchExecutor:
+    """测试检索线程池与异步检索接口"""
+    
+    def test_bounded_concurrency(self):
+        """测试并发不超过线程数，超出的任务排队并计入排队深度"""
+        import asyncio
+        import threading
+        import time
+        from app.services.search_executor import SearchExecutor
+        
+        executor = SearchExecutor(max_workers=2)
+        running = []
+        peak = []
+        lock = threading.Lock()
+        
+        def work():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.1)
+            with lock:
+                running.pop()
+        
+        async def main():
+            await asyncio.gather(*[executor.run(work) for _ in range(5)])
+        
+        asyncio.run(main())
+        executor.shutdown()
+        
+        stats = executor.stats()
+        assert max(peak) == 2
+        assert stats["completed"] == 5
+        assert stats["peak_queued"] >= 3
+        assert (stats["active"], stats["queued"]) == (0, 0)
+        assert stats["avg_wait_ms"] > 0
+    
+    def test_cancelled_while_queued(self):
+        """测试排队中的调用被取消后出队，任务不再执行"""
+        import asyncio
+        import threading
+        from app.services.search_executor import SearchExecutor
+        
+        executor = SearchExecutor(max_workers=1)
+        release = threading.Event()
+        ran = []
+        
+        async def main():
+            blocker = asyncio.create_task(executor.run(release.wait))
+            queued = asyncio.create_task(executor.run(ran.append, 1))
+            await asyncio.sleep(0.05)
+            assert executor.stats()["queued"] == 1
+            queued.cancel()
+            await asyncio.sleep(0)
+            release.set()
+            await blocker
+            with pytest.raises(asyncio.CancelledError):
+                await queued
+        
+        asyncio.run(main())
+        executor.shutdown()
+        
+        stats = executor.stats()
+        assert ran == []
+        assert (stats["queued"], stats["active"], stats["cancelled"], stats["completed"]) == (0, 0, 1, 1)
+    
+    def test_other_requests_progress(self, monkeypatch):
+        """测试慢速检索执行期间，其他请求照常完成"""
+        import asyncio
+        import time
+        import httpx
+        from app.routers import chat
+        
+        def slow_search(*args, **kwargs):
+            time.sleep(0.5)
+            return []
+        
+        monkeypatch.setattr(chat.vector_store, "search", slow_search)
+        
+        async def main():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                start = time.perf_counter()
+                searches = [
+                    asyncio.create_task(http.post("/api/chat/search", params={"query": "辣"}))
+                    for _ in range(2)
+                ]
+                await asyncio.sleep(0.05)
+                health = await http.get("/health")
+                health_elapsed = time.perf_counter() - start
+                responses = await asyncio.gather(*searches)
+                return health, health_elapsed, responses
+        
+        health, health_elapsed, responses = asyncio.run(main())
+        assert health.status_code == 200
+        assert health_elapsed < 0.4
+        assert all(r.status_code == 200 and r.json()["results"] == [] for r in responses)
+        
+        monkeypatch.setenv("ADMIN_TOKEN", ADMIN_TOKEN)
+        response = client.get("/api/admin/stats", headers=ADMIN_HEADERS)
+        assert "peak_queued" in response.json()["vector_search"]
+
+
+class TestBatchSearch:
+    """测试批量语义搜索"""
+    
+    def _store(self, tmp_path):
+        from app.services.vector_backends import NumpyBackend
+        from app.services.vector_store import RecipeVectorStore
+        
+        store = RecipeVectorStore(NumpyBackend(str(tmp_path / "index.npz")))
+        store.add_recipes([r.model_dump() for r in recipe_service.recipes])
+        return store
+    
+    def test_matches_single_search(self, tmp_path):
+        """测试批量结果与逐个搜索一致，过滤条件对每个查询生效"""
+        store = self._store(tmp_path)
+        queries = ["番茄鸡蛋", "麻辣豆腐", "  红烧肉  ", "甜点"]
+        filters = recipe_service.vector_filters(["素食"])
+        
+        for query_filters in (None, filters):
+            batch = store.search_many(queries, n_results=5, filters=query_filters)
+            assert len(batch) == len(queries)
+            for query, results in zip(queries, batch):
+                expected = store.search(query, n_results=5, filters=query_filters)
+                assert [r["id"] for r in results] == [r["id"] for r in expected]
+        
+        mask = recipe_service.restriction_index.query_mask(["素食"])
+        assert not any(recipe_service.violates_restrictions(r["id"], mask) for results in batch for r in results)
+        assert store.search_many([]) == []
+    
+    def test_batch_endpoint(self, tmp_path, monkeypatch):
+        """测试批量搜索接口按查询顺序返回结果"""
+        from app.routers import chat
+        
+        monkeypatch.setattr(chat, "vector_store", self._store(tmp_path))
+        response = client.post("/api/chat/search/batch", json={
+            "queries": ["番茄鸡蛋", "麻辣豆腐"],
+            "top_k": 3,
+            "category": "川菜"
+        })
+        assert response.status_code == 200
+        data = response.json()["results"]
+        assert [d["query"] for d in data] == ["番茄鸡蛋", "麻辣豆腐"]
+        assert all(len(d["results"]) == 3 for d in data)
+        assert all(r["category"] == "川菜" for d in data for r in d["results"])
+        
+        monkeypatch.setattr(chat, "MAX_BATCH_QUERIES", 1)
+        response = client.post("/api/chat/search/batch", json={"queries": ["a", "b"]})
+        assert response.status_code == 400
+
+
+class TestNLPServiceClient:
+    """测试 DeepSeek 调用共用一个 HTTP 客户端"""
+    
+    def test_shared_client(self):
+        """测试多次调用复用同一客户端，关闭后可重新创建"""
+        import asyncio
+        import json
+        import httpx
+        from app.services.nlp_service import NLPService
+        
+        requests = []
+        
+        def handler(request):
+            requests.append(request)
+            content = json.dumps({"intent": "recommend_by_ingredients", "ingredients": ["番茄"]})
+            return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+        
+        async def main():
+            service = NLPService()
+            await service.start(transport=httpx.MockTransport(handler))
+            client_before = service._client
+            intent = await service.parse_user_intent("我有番茄")
+            suggestion = await service.generate_substitution_suggestions("花生米", "宫保鸡丁")
+            reused = service._client is client_before
+            await service.close()
+            return intent, suggestion, reused, service._client
+        
+        intent, suggestion, reused, client_after = asyncio.run(main())
+        assert intent["ingredients"] == ["番茄"]
+        assert suggestion
+        assert reused and client_after is None
+        assert len(requests) == 2
+        assert all(r.url.path.endswith("/chat/completions") for r in requests)
+        assert requests[0].headers["Authorization"].startswith("Bearer ")
+
+
+class TestIntentParser:
+    """测试规则意图解析快速路径"""
+    
+    def test_aho_corasick_matches(self):
+        """测试自动机找出的匹配与逐个子串查找一致，最左最长选择互不重叠"""
+        from app.services.intent_parser import AhoCorasick
+        
+        words = ["番茄", "番茄炒蛋", "炒蛋", "蛋", "鸡蛋", "茄"]
+        automaton = AhoCorasick((w, w) for w in words)
+        text = "我想做番茄炒蛋和鸡蛋汤"
+        
+        expected = sorted(
+            (i, i + len(w), w) for w in words for i in range(len(text)) if text.startswith(w, i)
+        )
+        found = sorted((s, e, automaton.patterns[p]) for s, e, p in automaton.find_all(text))
+        assert found == expected
+        
+        longest = [automaton.patterns[p] for _, _, p in automaton.find_longest(text)]
+        assert longest == ["番茄炒蛋", "鸡蛋"]
+    
+    def test_rule_parse(self):
+        """测试同义词、菜名、饮食限制、否定与意图识别"""
+        from app.services.intent_parser import intent_parser, INTENT_CONFIDENCE_THRESHOLD
+        
+        result = intent_parser.parse("我有西红柿和鸡蛋")
+        assert result["intent"] == "recommend_by_ingredients"
+        assert result["ingredients"] == ["番茄", "鸡蛋"]
+        assert result["confidence"] >= INTENT_CONFIDENCE_THRESHOLD
+        
+        result = intent_parser.parse("西红柿炒鸡蛋怎么做")
+        assert result["intent"] == "cooking_guide"
+        assert result["target_dish"] == "番茄炒蛋"
+        
+        result = intent_parser.parse("不吃辣，也不吃香菜，冰箱里有土豆")
+        assert result["restrictions"] == ["无辣"]
+        assert result["ingredients"] == ["土豆"]
+        
+        result = intent_parser.parse("我没有鸡蛋，用什么代替")
+        assert result["intent"] == "substitution"
+        assert result["ingredients"] == ["鸡蛋"]
+        
+        assert intent_parser.parse("我不吃辣，推荐几道素菜")["confidence"] >= INTENT_CONFIDENCE_THRESHOLD
+    
+    @pytest.mark.parametrize("message, expected", [
+        ("我有番茄，但是不想吃鸡蛋，能做什么", ["番茄"]),
+        ("我有番茄，不要吃鸡蛋", ["番茄"]),
+        ("家里有土豆，不喜欢吃洋葱", ["土豆"]),
+        ("我有牛肉，不能吃香菜", ["牛肉"]),
+        ("我对虾过敏，冰箱里有猪肉", ["猪肉"]),
+    ])
+    def test_negation_defers_to_llm(self, message, expected):
+        """测试分句内的否定食材被排除，且有否定时置信度低于阈值，交给 LLM"""
+        from app.services.intent_parser import intent_parser, INTENT_CONFIDENCE_THRESHOLD
+        
+        result = intent_parser.parse(message)
+        assert result["ingredients"] == expected
+        assert result["confidence"] < INTENT_CONFIDENCE_THRESHOLD
+        
+        assert intent_parser.parse("你好")["confidence"] == 0
+    
+    def test_parser_built_with_snapshot(self, tmp_path):
+        """测试词典随快照在热加载时构建，替换前旧快照的词典继续可用"""
+        import asyncio
+        import json
+        from app.services.catalog import DEFAULT_DATA_PATH
+        from app.services.recipe_matcher import RecipeService
+        
+        with open(DEFAULT_DATA_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+        path = tmp_path / "recipes.json"
+        path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        service = RecipeService(str(path))
+        old_parser = service.intent_parser
+        assert old_parser.parse("火山飘雪怎么做")["target_dish"] == ""
+        
+        data["recipes"][0]["name"] = "火山飘雪"
+        path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        assert asyncio.run(service.reload()) is True
+        assert service.intent_parser is service.snapshot.intent_parser
+        assert service.intent_parser.parse("火山飘雪怎么做")["target_dish"] == "火山飘雪"
+        assert old_parser.parse("火山飘雪怎么做")["target_dish"] == ""
+    
+    def test_fast_path_skips_llm(self, monkeypatch):
+        """测试置信度足够时不调用 LLM，置信度低时调用"""
+        import asyncio
+        from app.services.intent_cache import IntentCache
+        from app.services.langchain_nlp import langchain_nlp_service
+        
+        calls = []
+        
+        class StubChain:
+            async def ainvoke(self, inputs):
+                calls.append(inputs["input"])
+                return {"intent": "general"}
+        
+        monkeypatch.setattr(langchain_nlp_service, "intent_chain", StubChain())
+        monkeypatch.setattr("app.services.langchain_nlp.intent_cache", IntentCache(path=""))
+        
+        fast = asyncio.run(langchain_nlp_service.parse_user_intent("我有番茄和鸡蛋"))
+        assert fast["ingredients"] == ["番茄", "鸡蛋"]
+        assert calls == []
+        
+        slow = asyncio.run(langchain_nlp_service.parse_user_intent("你好"))
+        assert slow["intent"] == "general"
+        assert calls == ["你好"]
+
+
+class TestIntentCache:
+    """测试意图解析结果缓存"""
+    
+    def test_normalized_key(self):
+        """测试空白、标点与全角差异的消息共用一个缓存条目"""
+        from app.services.intent_cache import IntentCache, normalize_message
+        
+        assert normalize_message(" 你好，ＡＢＣ ! ") == "你好abc"
+        
+        cache = IntentCache(path="")
+        cache.put("你好，帮我看看", {"intent": "general"})
+        assert cache.get("你好 帮我看看！") == {"intent": "general"}
+        assert cache.get("你好帮我看") is None
+        assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    
+    def test_ttl_and_capacity(self, monkeypatch):
+        """测试条目过期失效，超过容量时淘汰最久未用的条目"""
+        import time
+        from app.services.intent_cache import IntentCache
+        
+        now = [1000.0]
+        monkeypatch.setattr(time, "time", lambda: now[0])
+        
+        cache = IntentCache(max_entries=2, ttl=60, path="")
+        cache.put("a", {"intent": "a"})
+        cache.put("b", {"intent": "b"})
+        assert cache.get("a") is not None
+        cache.put("c", {"intent": "c"})
+        assert cache.get("b") is None
+        assert len(cache) == 2
+        
+        now[0] += 61
+        assert cache.get("a") is None
+        assert cache.stats()["expired"] == 1
+    
+    def test_sqlite_persistence(self, tmp_path):
+        """测试重启后从 SQLite 恢复，且只保存解析结果不保存原始消息"""
+        import sqlite3
+        from app.services.intent_cache import IntentCache
+        
+        path = str(tmp_path / "intent_cache.sqlite3")
+        cache = IntentCache(path=path)
+        cache.put("周末想请朋友吃饭", {"intent": "general", "ingredients": []})
+        cache.close()
+        
+        restored = IntentCache(path=path)
+        assert restored.get("周末想请朋友吃饭") == {"intent": "general", "ingredients": []}
+        restored.close()
+        
+        rows = sqlite3.connect(path).execute("SELECT key, value FROM intent_cache").fetchall()
+        assert len(rows) == 1
+        assert "朋友" not in rows[0][0] and "朋友" not in rows[0][1]
+    
+    def test_llm_called_once(self, monkeypatch):
+        """测试规范化后相同的消息只调用一次 LLM"""
+        import asyncio
+        from app.services.intent_cache import IntentCache
+        from app.services.langchain_nlp import langchain_nlp_service
+        
+        calls = []
+        
+        class StubChain:
+            async def ainvoke(self, inputs):
+                calls.append(inputs["input"])
+                return {"intent": "general", "question_type": "greeting"}
+        
+        monkeypatch.setattr(langchain_nlp_service, "intent_chain", StubChain())
+        monkeypatch.setattr("app.services.langchain_nlp.intent_cache", IntentCache(path=""))
+        
+        first = asyncio.run(langchain_nlp_service.parse_user_intent("你好呀"))
+        second = asyncio.run(langchain_nlp_service.parse_user_intent("你好呀！！"))
+        assert first == second
+        assert second["question_type"] == "greeting"
+        assert calls == ["你好呀"]
+
+
+class TestChatStream:
+    """测试流式对话接口"""
+    
+    def _events(self, response):
+        import json
+        events = []
+        for block in response.text.strip().split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in block.split("\n"))
+            events.append((lines["event"], json.loads(lines["data"])))
+        return events
+    
+    def test_stream_events(self, monkeypatch):
+        """测试先发送检索结果，再逐段发送回复，结束后写入对话记录"""
+        from app.services.langchain_nlp import langchain_nlp_service
+        from app.services.enhanced_conversation import enhanced_conversation_manager
+        
+        recipe = recipe_service.get_recipe_by_id(1)
+        
+        async def fake_rag(**kwargs):
+            return [{
+                "recipe": recipe, "match_score": 0.9,
+                "matched_ingredients": ["番茄", "鸡蛋"], "missing_ingredients": []
+            }]
+        
+        class StubChain:
+            async def astream(self, inputs):
+                assert recipe.name in inputs["input"]
+                for chunk in ["推荐", "番茄炒蛋", "。"]:
+                    yield chunk
+        
+        monkeypatch.setattr(langchain_nlp_service, "search_recipes_with_rag", fake_rag)
+        monkeypatch.setattr(langchain_nlp_service, "response_chain", StubChain())
+        
+        response = client.post("/api/chat/stream", json={"message": "我有番茄和鸡蛋"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        
+        events = self._events(response)
+        assert [name for name, _ in events] == ["context", "token", "token", "token", "done"]
+        context = events[0][1]
+        assert context["detected_ingredients"] == ["番茄", "鸡蛋"]
+        assert context["suggested_recipes"][0]["recipe"]["id"] == recipe.id
+        assert events[-1][1]["message"] == "推荐番茄炒蛋。"
+        
+        conversation = enhanced_conversation_manager.get_conversation(context["conversation_id"])
+        assert [m.role for m in conversation.messages] == ["user", "assistant"]
+        assert conversation.messages[-1].content == "推荐番茄炒蛋。"
+    
+    def test_stream_llm_error(self, monkeypatch):
+        """测试 LLM 出错时发送兜底回复"""
+        from app.services.langchain_nlp import langchain_nlp_service
+        
+        class FailingChain:
+            async def astream(self, inputs):
+                raise RuntimeError("llm unavailable")
+                yield
+        
+        monkeypatch.setattr(langchain_nlp_service, "response_chain", FailingChain())
+        
+        response = client.post("/api/chat/stream", json={"message": "我不吃辣，推荐几道素菜"})
+        events = self._events(response)
+        assert events[0][0] == "context"
+        assert events[-1][0] == "done"
+        assert "抱歉" in events[-1][1]["message"]
+
 # 运行测试
 if __name__ == "__main__":
-    pytest.main([__file__, "-v"])
\ No newline at end of file
+    pytest.main([__file__, "-v"])